@@ -0,0 +1,38 @@
+from typing import Dict, List
+
+
+def determine_main_role(agents: List[Dict]) -> str:
+    """Определить основную роль игрока"""
+    if not agents:
+        return "Unknown"
+
+    role_games = {}
+    for agent in agents:
+        role = agent.get('role', 'Unknown')
+        games = agent.get('matches_played', 0)
+        role_games[role] = role_games.get(role, 0) + games
+
+    return max(role_games, key=role_games.get) if role_games else "Unknown"
+
+
+def analyze_play_style(season_stats: Dict, clutch_stats: Dict) -> str:
+    """Анализ стиля игры"""
+    if not season_stats:
+        return "Unknown"
+
+    kd = season_stats.get('kd_ratio', 0) or 0
+    clutch_rate = clutch_stats.get('clutch_percentage', 0) or 0
+    headshot_pct = season_stats.get('headshot_percentage', 0) or 0
+
+    if clutch_rate > 60:
+        return "🔥 Clutch God"
+    elif kd > 1.3 and headshot_pct > 25:
+        return "🎯 Precision Killer"  
+    elif kd > 1.1:
+        return "⚔️ Aggressive Fragger"
+    elif clutch_rate > 40:
+        return "🧠 Clutch Player"
+    elif headshot_pct > 30:
+        return "🔫 Aim Master"
+    else:
+        return "🎮 Balanced Player"
@@ -0,0 +1,303 @@
+import time
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from api.analytics.roles import determine_main_role, analyze_play_style
+from api.models.agents import get_agent_role_by_name
+
+# Числовые колонки строки игрока в матче и их типы
+NUMERIC_COLUMNS = {
+    'started_at': np.int64,
+    'tier': np.int16,
+    'won': np.int8,
+    'rounds_played': np.int16,
+    'rounds_won': np.int16,
+    'score': np.int32,
+    'kills': np.int16,
+    'deaths': np.int16,
+    'assists': np.int16,
+    'headshots': np.int32,
+    'bodyshots': np.int32,
+    'legshots': np.int32,
+    'damage_made': np.int32,
+    'attack_kills': np.int16,
+    'attack_deaths': np.int16,
+    'defense_kills': np.int16,
+    'defense_deaths': np.int16,
+}
+
+# Строковые колонки хранятся кодами в словаре значений
+CATEGORICAL_COLUMNS = ('agent', 'map', 'season_id', 'mode')
+
+TIER_NAMES = ['Iron', 'Bronze', 'Silver', 'Gold', 'Platinum', 'Diamond', 'Ascendant', 'Immortal']
+
+
+def tier_name(tier: int) -> str:
+    """Название ранга по номеру тира Riot (3 - Iron 1, 27 - Radiant)"""
+    if tier >= 27:
+        return "Radiant"
+    if tier < 3:
+        return "Unranked"
+    division, level = divmod(tier - 3, 3)
+    return f"{TIER_NAMES[division]} {level + 1}"
+
+
+class LazyColumns(Mapping):
+    """Колонки, загружаемые при первом обращении (например, из np.memmap)"""
+
+    def __init__(self, names: Iterable[str], loader: Callable[[str], np.ndarray]):
+        self._names = list(names)
+        self._loader = loader
+        self._loaded: Dict[str, np.ndarray] = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._loaded:
+            if name not in self._names:
+                raise KeyError(name)
+            self._loaded[name] = self._loader(name)
+        return self._loaded[name]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class MatchArrays:
+    """Колонки матчей одного игрока в виде NumPy-массивов.
+
+    Категориальные колонки - целочисленные коды в dictionaries[name], поэтому
+    массивы можно брать как из SQLite, так и напрямую из np.memmap архива.
+    """
+
+    def __init__(self, columns: Mapping, dictionaries: Dict[str, List[str]]):
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict]) -> "MatchArrays":
+        """Собрать массивы из строк MatchStore.player_matches"""
+        columns = {
+            name: np.fromiter((row.get(name) or 0 for row in rows), dtype=dtype, count=len(rows))
+            for name, dtype in NUMERIC_COLUMNS.items()
+        }
+        dictionaries = {}
+        for name in CATEGORICAL_COLUMNS:
+            labels, codes = np.unique(np.array([row.get(name) or '' for row in rows], dtype=object).astype(str),
+                                      return_inverse=True)
+            columns[name] = codes.astype(np.int32)
+            dictionaries[name] = labels.tolist()
+        return cls(columns, dictionaries)
+
+    def __len__(self) -> int:
+        return len(self.columns['started_at'])
+
+    def select(self, mask: np.ndarray) -> "MatchArrays":
+        """Подмножество строк по булевой маске; колонки фильтруются по мере обращения"""
+        columns = self.columns
+        return MatchArrays(LazyColumns(columns, lambda name: columns[name][mask]), self.dictionaries)
+
+    def code_of(self, column: str, label: str) -> int:
+        try:
+            return self.dictionaries[column].index(label)
+        except ValueError:
+            return -1
+
+
+def _ratio(numerator, denominator):
+    """Поэлементное деление с нулем там, где знаменатель равен нулю"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def _kd(kills, deaths):
+    """K/D как на tracker.gg: при нуле смертей равен числу убийств"""
+    kills = np.asarray(kills, dtype=np.float64)
+    return _ratio(kills, np.maximum(np.asarray(deaths, dtype=np.float64), 1))
+
+
+class StatsEngine:
+    """Расчет статистики игрока по локальным матчам сгруппированными редукциями NumPy"""
+
+    SUM_COLUMNS = ('won', 'rounds_played', 'score', 'kills', 'deaths', 'assists', 'headshots',
+                   'bodyshots', 'legshots', 'damage_made', 'attack_kills', 'attack_deaths',
+                   'defense_kills', 'defense_deaths')
+
+    def grouped(self, arrays: MatchArrays, by: str) -> Dict[str, np.ndarray]:
+        """Суммы числовых колонок по группам колонки by (bincount по кодам)"""
+        codes = arrays.columns[by]
+        size = len(arrays.dictionaries[by])
+        result = {'matches': np.bincount(codes, minlength=size)}
+        for name in self.SUM_COLUMNS:
+            result[name] = np.bincount(codes, weights=arrays.columns[name], minlength=size)
+        return result
+
+    def totals(self, arrays: MatchArrays) -> Dict[str, float]:
+        """Суммы числовых колонок по всем матчам"""
+        result = {'matches': len(arrays)}
+        for name in self.SUM_COLUMNS:
+            result[name] = int(arrays.columns[name].sum(dtype=np.int64))
+        return result
+
+    @staticmethod
+    def _derived(sums: Dict) -> Dict[str, np.ndarray]:
+        """Производные метрики из сумм (работает и для скаляров, и для групп)"""
+        shots = np.asarray(sums['headshots']) + np.asarray(sums['bodyshots']) + np.asarray(sums['legshots'])
+        return {
+            'win_rate': _ratio(sums['won'], sums['matches']) * 100,
+            'kd_ratio': _kd(sums['kills'], sums['deaths']),
+            'average_score': _ratio(sums['score'], sums['matches']),
+            'headshot_percentage': _ratio(sums['headshots'], shots) * 100,
+            'damage_per_round': _ratio(sums['damage_made'], sums['rounds_played']),
+            'attack_kd': _kd(sums['attack_kills'], sums['attack_deaths']),
+            'defense_kd': _kd(sums['defense_kills'], sums['defense_deaths']),
+        }
+
+    def group_stats(self, arrays: MatchArrays, by: str) -> List[Dict]:
+        """Статистика по агентам или картам, отсортированная по числу матчей"""
+        sums = self.grouped(arrays, by)
+        derived = self._derived(sums)
+        order = np.argsort(-sums['matches'], kind='stable')
+        labels = arrays.dictionaries[by]
+        result = []
+        for index in order:
+            matches = int(sums['matches'][index])
+            if not matches:
+                continue
+            result.append({
+                'name': labels[index],
+                'matches_played': matches,
+                'matches_won': int(sums['won'][index]),
+                'win_rate': float(derived['win_rate'][index]),
+                'kd_ratio': float(derived['kd_ratio'][index]),
+                'average_score': float(derived['average_score'][index]),
+                'headshot_percentage': float(derived['headshot_percentage'][index]),
+                'damage_per_round': float(derived['damage_per_round'][index]),
+                'attack_kd': float(derived['attack_kd'][index]),
+                'defense_kd': float(derived['defense_kd'][index]),
+            })
+        return result
+
+    def season_stats(self, arrays: MatchArrays, season_name: str = '', rank: Optional[str] = None) -> Dict:
+        """Словарь в формате TrackerGGAPI.extract_current_season_stats"""
+        sums = self.totals(arrays)
+        derived = {name: float(value) for name, value in self._derived(sums).items()}
+        if rank is None and len(arrays):
+            latest = int(np.argmax(arrays.columns['started_at']))
+            rank = tier_name(int(arrays.columns['tier'][latest]))
+        return {
+            'season_name': season_name,
+            'matches_played': sums['matches'],
+            'matches_won': sums['won'],
+            'win_rate': derived['win_rate'],
+            'kd_ratio': derived['kd_ratio'],
+            'average_score': derived['average_score'],
+            'headshot_percentage': derived['headshot_percentage'],
+            'clutches_won': 0,
+            'clutch_percentage': 0,
+            'aces': 0,
+            'rank': rank or "Не определен",
+            'attack_kd': derived['attack_kd'],
+            'defense_kd': derived['defense_kd'],
+            'econ_rating': 0,
+            # Дополнительно к полям tracker.gg
+            'kills': sums['kills'],
+            'deaths': sums['deaths'],
+            'assists': sums['assists'],
+            'damage_per_round': derived['damage_per_round'],
+        }
+
+    def summarize(self, arrays: MatchArrays, riot_id: str = '', region: str = '', account_level: int = 0,
+                  season: Optional[str] = 'current', rank: Optional[str] = None) -> Dict:
+        """Сводка в формате TrackerGGAPI.get_player_summary.
+
+        season='current' - только последний сезон, None - вся история,
+        иначе - конкретный season_id.
+        """
+        season_arrays = arrays
+        season_name = ''
+        if season is not None and len(arrays):
+            if season == 'current':
+                latest = int(np.argmax(arrays.columns['started_at']))
+                code = int(arrays.columns['season_id'][latest])
+            else:
+                code = arrays.code_of('season_id', season)
+            season_arrays = arrays.select(arrays.columns['season_id'] == code)
+            season_name = arrays.dictionaries['season_id'][code] if code >= 0 else season
+
+        current_stats = self.season_stats(season_arrays, season_name, rank)
+        agents = self.group_stats(season_arrays, 'agent')
+        for agent in agents:
+            agent['role'] = get_agent_role_by_name(agent['name'])
+        top_agents = agents[:3]
+        clutch_stats = {}
+
+        return {
+            'riot_id': riot_id,
+            'avatar_url': '',
+            'account_level': account_level,
+            'region': region,
+            'profile_views': 0,
+            'badges_count': 0,
+            'current_season': current_stats,
+            'top_agents': top_agents,
+            'maps': self.group_stats(season_arrays, 'map'),
+            'clutch_master': clutch_stats,
+            'is_clutch_god': False,
+            'main_role': determine_main_role(top_agents),
+            'play_style': analyze_play_style(current_stats, clutch_stats),
+        }
+
+
+def synthetic_arrays(size: int, seed: int = 0) -> MatchArrays:
+    """Случайная история матчей для бенчмарка"""
+    rng = np.random.default_rng(seed)
+    columns = {
+        'started_at': np.sort(rng.integers(1_600_000_000, 1_700_000_000, size)).astype(np.int64),
+        'tier': rng.integers(3, 28, size).astype(np.int16),
+        'won': rng.integers(0, 2, size).astype(np.int8),
+        'rounds_played': rng.integers(13, 26, size).astype(np.int16),
+        'rounds_won': rng.integers(0, 14, size).astype(np.int16),
+        'score': rng.integers(1000, 8000, size).astype(np.int32),
+        'kills': rng.integers(0, 35, size).astype(np.int16),
+        'deaths': rng.integers(0, 25, size).astype(np.int16),
+        'assists': rng.integers(0, 12, size).astype(np.int16),
+        'headshots': rng.integers(0, 40, size).astype(np.int32),
+        'bodyshots': rng.integers(0, 90, size).astype(np.int32),
+        'legshots': rng.integers(0, 10, size).astype(np.int32),
+        'damage_made': rng.integers(1000, 6000, size).astype(np.int32),
+        'attack_kills': rng.integers(0, 18, size).astype(np.int16),
+        'attack_deaths': rng.integers(0, 13, size).astype(np.int16),
+        'defense_kills': rng.integers(0, 18, size).astype(np.int16),
+        'defense_deaths': rng.integers(0, 13, size).astype(np.int16),
+    }
+    dictionaries = {
+        'agent': ['Jett', 'Sova', 'Omen', 'Killjoy', 'Raze', 'Sage', 'Clove', 'Fade'],
+        'map': ['Ascent', 'Bind', 'Haven', 'Lotus', 'Split', 'Sunset', 'Icebox'],
+        'season_id': [f"season-{i}" for i in range(10)],
+        'mode': ['Competitive'],
+    }
+    for name, labels in dictionaries.items():
+        columns[name] = rng.integers(0, len(labels), size).astype(np.int32)
+    return MatchArrays(columns, dictionaries)
+
+
+def benchmark(sizes: Iterable[int] = (1_000, 10_000, 100_000), repeats: int = 20):
+    """Замер времени summarize на синтетической истории"""
+    engine = StatsEngine()
+    for size in sizes:
+        arrays = synthetic_arrays(size)
+        engine.summarize(arrays, season=None)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            engine.summarize(arrays, season=None)
+        elapsed = (time.perf_counter() - started) / repeats
+        print(f"⏱️ {size:>7} матчей: {elapsed * 1000:.2f} мс на сводку")
+
+
+if __name__ == "__main__":
+    benchmark()
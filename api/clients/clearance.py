@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from decouple import config
+
+from api.clients.rate_limit import get_rate_limiter, Priority
+
+# Cookies, которые Cloudflare выдает после прохождения проверки
+CLEARANCE_COOKIES = ('cf_clearance', '__cf_bm', '_cfuvid')
+TRACKER_SITE_URL = config('TRACKER_SITE_URL', default='https://tracker.gg')
+WARMUP_URL = f"{TRACKER_SITE_URL}/valorant"
+
+
+class ClearanceJar:
+    """Сохраняемые на диск clearance-cookies Cloudflare для tracker.gg.
+
+    Cookies снимаются один раз после прогрева и переиспользуются сессией
+    CloudScraper до истечения срока, поэтому обычному запросу не нужно
+    открывать HTML-страницу перед API.
+    """
+
+    def __init__(self, path: str, default_ttl: float = 1800, refresh_margin: float = 300):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self.cookies: Dict[str, Dict] = {}
+        self.user_agent: Optional[str] = None
+        self.expires_at = 0.0
+        self.captured = 0
+        self.reused = 0
+        self.load()
+
+    def load(self):
+        """Загрузить cookies с диска"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"⚠️ Не удалось прочитать clearance cookies {self.path}: {e}")
+            return
+
+        with self._lock:
+            self.cookies = data.get('cookies', {})
+            self.user_agent = data.get('user_agent')
+            self.expires_at = data.get('expires_at', 0.0)
+        if self.is_valid():
+            print(f"🍪 Clearance cookies загружены, действительны еще {self.ttl():.0f}s")
+
+    def save(self):
+        """Атомарно сохранить cookies на диск"""
+        with self._lock:
+            data = {
+                'cookies': self.cookies,
+                'user_agent': self.user_agent,
+                'expires_at': self.expires_at,
+            }
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить clearance cookies {self.path}: {e}")
+
+    def ttl(self) -> float:
+        return self.expires_at - time.time()
+
+    def is_valid(self) -> bool:
+        return bool(self.cookies) and self.ttl() > 0
+
+    def needs_refresh(self) -> bool:
+        return self.ttl() < self.refresh_margin
+
+    def capture(self, session) -> bool:
+        """Снять clearance-cookies с сессии после прохождения проверки"""
+        now = time.time()
+        cookies = {}
+        expiry = now + self.default_ttl
+        for cookie in session.cookies:
+            cookies[cookie.name] = {
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path or '/',
+            }
+            if cookie.name in CLEARANCE_COOKIES and cookie.expires:
+                expiry = min(expiry, cookie.expires)
+
+        if not cookies:
+            return False
+
+        with self._lock:
+            self.cookies = cookies
+            self.user_agent = session.headers.get('User-Agent')
+            self.expires_at = expiry
+            self.captured += 1
+        self.save()
+        print(f"🍪 Clearance cookies обновлены, действительны {expiry - now:.0f}s")
+        return True
+
+    def apply(self, session) -> bool:
+        """Подставить сохраненные cookies в сессию. False, если cookies нет или они истекли"""
+        if not self.is_valid():
+            return False
+        with self._lock:
+            cookies = dict(self.cookies)
+            self.reused += 1
+        for name, cookie in cookies.items():
+            session.cookies.set(name, cookie['value'], domain=cookie['domain'], path=cookie['path'])
+        return True
+
+    def request_headers(self) -> Dict[str, str]:
+        """Заголовки, к которым привязан cf_clearance"""
+        return {"User-Agent": self.user_agent} if self.user_agent else {}
+
+    def invalidate(self):
+        """Сбросить cookies, например после 403 от Cloudflare"""
+        with self._lock:
+            self.cookies = {}
+            self.expires_at = 0.0
+        self.save()
+
+    def metrics(self) -> Dict:
+        return {
+            'valid': self.is_valid(),
+            'ttl': max(0.0, self.ttl()),
+            'captured': self.captured,
+            'reused': self.reused,
+        }
+
+
+def warm_up(session, jar: ClearanceJar, loop: asyncio.AbstractEventLoop, cancel_event: threading.Event,
+            priority: int = Priority.INTERACTIVE, timeout: float = 10) -> bool:
+    """Открыть страницу tracker.gg, пройти проверку Cloudflare и сохранить cookies.
+
+    Выполняется в потоке пула CloudScraper. Токен tracker_pages берется только
+    здесь и уже в потоке, поэтому ожидание в очереди пула его не тратит.
+    """
+    # scraper_pool импортирует этот модуль через egress
+    from api.clients.scraper_pool import ScraperCancelled
+
+    if not get_rate_limiter('tracker_pages').acquire_blocking(loop, priority, cancel_event):
+        raise ScraperCancelled()
+    response = session.get(WARMUP_URL, timeout=timeout)
+    print(f"🌐 CloudScraper прогрев clearance: {response.status_code}")
+    if response.status_code != 200:
+        return False
+    return jar.capture(session)
+
+
+def _refresh_session(egress, cancel_event: threading.Event, loop: asyncio.AbstractEventLoop) -> bool:
+    """Фоновый прогрев одной сессии; отказ Cloudflare отправляет ее в карантин"""
+    if warm_up(egress.scraper, egress.jar, loop, cancel_event, Priority.BACKGROUND):
+        return True
+    egress.challenged = True
+    return False
+
+
+async def refresh_loop(pool, interval: float = 60):
+    """Фоновое обновление cookies каждой исходящей сессии до истечения срока"""
+    loop = asyncio.get_running_loop()
+    while True:
+        now = time.monotonic()
+        for session in pool.egress.sessions:
+            jar = session.jar
+            # Обновляем только имеющиеся cookies; пустые сессии прогреваются по запросу
+            if not jar.cookies or not jar.needs_refresh() or session.is_quarantined(now):
+                continue
+            try:
+                await pool.run(_refresh_session, loop, timeout=30.0, session=session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Ошибка фонового обновления clearance {session.name}: {e}")
+        await asyncio.sleep(interval)
+
+
+_refresh_task: Optional[asyncio.Task] = None
+
+
+def ensure_refresh_task(pool):
+    """Запустить фоновое обновление cookies, если оно еще не работает"""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.get_running_loop().create_task(refresh_loop(pool))
+    return _refresh_task
+
+
+async def stop_refresh_task():
+    """Остановить фоновое обновление cookies (при завершении процесса)"""
+    global _refresh_task
+    task, _refresh_task = _refresh_task, None
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,67 @@
+import asyncio
+import math
+import time
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Бюджет времени запроса исчерпан"""
+
+
+class Deadline:
+    """Единый бюджет времени запроса, передаваемый через все этапы.
+
+    Этап берет себе не больше оставшегося (и не больше своего cap), а reserve
+    оставляет время следующим этапам - например, на загрузку карточки.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self, reserve: float = 0.0) -> float:
+        return max(0.0, self.expires_at - time.monotonic() - reserve)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0.0) -> float:
+        """Таймаут этапа: остаток бюджета за вычетом reserve, не больше cap"""
+        remaining = self.remaining(reserve)
+        return remaining if cap is None else min(cap, remaining)
+
+    def request_timeout(self, reserve: float = 0.0) -> int:
+        """Остаток в целых секундах (не меньше 1) для API, принимающих int"""
+        return max(1, math.ceil(self.remaining(reserve)))
+
+    def shrink(self, reserve: float) -> 'Deadline':
+        """Дедлайн, истекающий на reserve секунд раньше: время для последующих этапов"""
+        child = Deadline(0)
+        child.seconds = self.seconds
+        child.expires_at = self.expires_at - reserve
+        return child
+
+    def check(self, stage: str = ''):
+        if self.expired:
+            raise DeadlineExceeded(f"Дедлайн исчерпан{': ' + stage if stage else ''}")
+
+    async def run(self, awaitable: Awaitable[T], cap: Optional[float] = None, reserve: float = 0.0,
+                  stage: str = '') -> T:
+        """Выполнить этап в пределах бюджета; по его исчерпании этап отменяется"""
+        timeout = self.timeout(cap, reserve)
+        if timeout <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(f"Нет времени на этап {stage}")
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError as e:
+            if isinstance(e, DeadlineExceeded):
+                raise
+            raise DeadlineExceeded(f"Этап {stage} не уложился в {timeout:.1f}s") from e
+
+    def __repr__(self) -> str:
+        return f"Deadline({self.remaining():.2f}s из {self.seconds:.1f}s)"
@@ -0,0 +1,215 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+import cloudscraper
+from decouple import config, Csv
+
+from api.clients.clearance import ClearanceJar
+
+# Базовые заголовки сессии; заголовки конкретного запроса передаются в get(),
+# поэтому сессия не мутирует между запросами
+CLOUDSCRAPER_BROWSER = {
+    'browser': 'chrome',
+    'platform': 'android',
+    'mobile': True
+}
+
+CLOUDSCRAPER_HEADERS = {
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Cache-Control": "no-cache",
+    "DNT": "1",
+    "Origin": "https://tracker.gg",
+    "Pragma": "no-cache",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-origin",
+}
+
+
+def create_cloud_scraper(proxy: Optional[str] = None):
+    """Создать новую сессию CloudScraper с базовыми заголовками"""
+    scraper = cloudscraper.create_scraper(browser=CLOUDSCRAPER_BROWSER)
+    scraper.headers.update(CLOUDSCRAPER_HEADERS)
+    if proxy:
+        scraper.proxies = {'http': proxy, 'https': proxy}
+    return scraper
+
+
+class EgressSession:
+    """Независимая исходящая сессия CloudScraper: свои cookies, заголовки и прокси"""
+
+    def __init__(self, name: str, proxy: Optional[str] = None, jar_path: Optional[str] = None,
+                 clearance_ttl: float = 1800, clearance_margin: float = 300):
+        self.name = name
+        self.proxy = proxy
+        self.jar = ClearanceJar(jar_path or f"temp/clearance_{name}.json", clearance_ttl, clearance_margin)
+        self._scraper = None
+
+        self.in_use = False
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.challenges = 0
+        self.consecutive_failures = 0
+        # Выставляются воркером: Cloudflare отклонил запрос проверкой
+        # или запрос упал на уровне соединения/прокси
+        self.challenged = False
+        self.errored = False
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+        # Экспоненциально сглаженные доля успехов и задержка
+        self.success_rate = 1.0
+        self.latency = 1.0
+        # Текущий вес для плавного взвешенного round-robin
+        self.current_weight = 0.0
+
+    @property
+    def scraper(self):
+        """Сессия CloudScraper, создается при первом использовании"""
+        if self._scraper is None:
+            self._scraper = create_cloud_scraper(self.proxy)
+        return self._scraper
+
+    def is_quarantined(self, now: float) -> bool:
+        return now < self.quarantined_until
+
+    def weight(self) -> float:
+        """Вес при выборе: выше у быстрых и успешных сессий"""
+        return max(0.01, self.success_rate) / max(0.05, self.latency)
+
+    def metrics(self, now: float) -> Dict:
+        return {
+            'name': self.name,
+            'proxy': bool(self.proxy),
+            'in_use': self.in_use,
+            'requests': self.requests,
+            'successes': self.successes,
+            'failures': self.failures,
+            'challenges': self.challenges,
+            'success_rate': round(self.success_rate, 3),
+            'latency': round(self.latency, 3),
+            'quarantined': self.is_quarantined(now),
+            'quarantine_left': max(0.0, self.quarantined_until - now),
+            'quarantines': self.quarantines,
+            'clearance': self.jar.metrics(),
+        }
+
+
+class EgressPool:
+    """Пул исходящих сессий с выбором по здоровью и карантином неудачных"""
+
+    def __init__(self, sessions: List[EgressSession], alpha: float = 0.2,
+                 max_failures: int = 3, quarantine_base: float = 30, quarantine_max: float = 600):
+        if not sessions:
+            raise ValueError("EgressPool требует хотя бы одну сессию")
+        self.sessions = sessions
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.quarantine_base = quarantine_base
+        self.quarantine_max = quarantine_max
+        self._cond = threading.Condition()
+
+    def _pick(self, now: float) -> Optional[EgressSession]:
+        free = [s for s in self.sessions if not s.in_use]
+        if not free:
+            return None
+        healthy = [s for s in free if not s.is_quarantined(now)]
+        if not healthy:
+            # Все свободные сессии в карантине - берем ту, что выйдет раньше
+            return min(free, key=lambda s: s.quarantined_until)
+
+        total = 0.0
+        best = None
+        for session in healthy:
+            weight = session.weight()
+            session.current_weight += weight
+            total += weight
+            if best is None or session.current_weight > best.current_weight:
+                best = session
+        best.current_weight -= total
+        return best
+
+    def acquire(self, cancel_event: Optional[threading.Event] = None,
+                session: Optional[EgressSession] = None) -> Optional[EgressSession]:
+        """Взять сессию в монопольное пользование (блокирует поток до освобождения).
+
+        Возвращает None, если задачу отменили во время ожидания.
+        """
+        with self._cond:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                if session is not None:
+                    chosen = None if session.in_use else session
+                else:
+                    chosen = self._pick(time.monotonic())
+                if chosen is not None:
+                    chosen.in_use = True
+                    chosen.challenged = False
+                    chosen.errored = False
+                    return chosen
+                self._cond.wait(timeout=0.5)
+
+    def release(self, session: EgressSession, ok: Optional[bool], latency: float = 0.0):
+        """Вернуть сессию и обновить ее оценку здоровья.
+
+        ok=None - задачу отменили, и сессия возвращается без оценки.
+        """
+        now = time.monotonic()
+        with self._cond:
+            challenged = session.challenged
+            session.in_use = False
+            if ok is None:
+                self._cond.notify()
+                return
+            session.requests += 1
+            session.success_rate += self.alpha * ((1.0 if ok else 0.0) - session.success_rate)
+            session.latency += self.alpha * (latency - session.latency)
+            if ok:
+                session.successes += 1
+                session.consecutive_failures = 0
+                session.quarantined_until = 0.0
+            else:
+                session.failures += 1
+                session.consecutive_failures += 1
+                if challenged:
+                    session.challenges += 1
+                if challenged or session.consecutive_failures >= self.max_failures:
+                    self._quarantine(session, now)
+            self._cond.notify()
+
+    def _quarantine(self, session: EgressSession, now: float):
+        session.quarantines += 1
+        streak = max(1, session.consecutive_failures - self.max_failures + 1)
+        duration = min(self.quarantine_max, self.quarantine_base * 2 ** (streak - 1))
+        session.quarantined_until = now + duration
+        session.current_weight = 0.0
+        print(f"🚧 Egress сессия {session.name} в карантине на {duration:.0f}s")
+
+    def metrics(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._cond:
+            return [session.metrics(now) for session in self.sessions]
+
+
+def create_egress_pool() -> EgressPool:
+    """Собрать пул сессий из настроек окружения"""
+    proxies = config('SCRAPER_EGRESS_PROXIES', default='', cast=Csv())
+    count = max(config('SCRAPER_EGRESS_SESSIONS', default=4, cast=int), len(proxies), 1)
+    jar_dir = config('CLEARANCE_JAR_DIR', default='temp')
+    ttl = config('CLEARANCE_TTL', default=1800, cast=float)
+    margin = config('CLEARANCE_REFRESH_MARGIN', default=300, cast=float)
+
+    sessions = []
+    for index in range(count):
+        proxy = proxies[index] if index < len(proxies) else None
+        name = f"egress-{index}"
+        sessions.append(EgressSession(
+            name, proxy=proxy,
+            jar_path=f"{jar_dir}/clearance_{name}.json",
+            clearance_ttl=ttl, clearance_margin=margin,
+        ))
+    return EgressPool(sessions)
@@ -1,55 +1,244 @@
 import aiohttp
 import asyncio
-from typing import Optional, Dict, Any
+import random
+from datetime import datetime
+from typing import Optional, Dict, Any, List, AsyncIterator
 from bot.utils.validation import APIError
 from api.models.player import Player, RankInfo
+from api.clients.rate_limit import get_rate_limiter, Priority
+from api.clients.cache import TTLCache
+from api.clients.streaming import MatchListStreamParser, extract_player_view
+from decouple import config
+
+
+def parse_timestamp(value) -> int:
+    """Unix-время из ISO-строки Henrik ('2024-01-01T12:00:00.000Z') или числа"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not value:
+        return 0
+    try:
+        return int(datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp())
+    except ValueError:
+        return 0
 
 
 class HenrikAPIClient:
-    def __init__(self, api_key: str, base_url: str = "https://api.henrikdev.xyz/valorant/"):
+    # Максимальная пауза Retry-After, которую имеет смысл переждать для повтора
+    MAX_RETRY_AFTER = 10.0
+    # Размер куска при потоковом чтении списков матчей
+    STREAM_CHUNK_SIZE = 64 * 1024
+    
+    # name#tag -> аккаунт (puuid, регион); общий для всех клиентов процесса.
+    # Уровень и карточка аккаунта могут отставать на время жизни записи
+    identity_cache = TTLCache(
+        maxsize=config('HENRIK_IDENTITY_CACHE_SIZE', default=10000, cast=int),
+        ttl=config('HENRIK_IDENTITY_TTL', default=86400, cast=float),
+    )
+    # match_id -> ответ v2/match; без TTL, вытеснение только по размеру
+    match_cache = TTLCache(maxsize=config('HENRIK_MATCH_CACHE_SIZE', default=5000, cast=int))
+    _matches_in_flight: Dict[str, asyncio.Future] = {}
+    
+    def __init__(self, api_key: str, base_url: str = "https://api.henrikdev.xyz/valorant/",
+                 timeout: float = 10.0, connect_timeout: float = 5.0, max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 connection_limit: int = 20, dns_cache_ttl: int = 300, keepalive_timeout: float = 30.0,
+                 default_region: Optional[str] = None):
         self.base_url = base_url
         self.api_key = api_key
+        # Регион, в котором MMR по имени запрашивается параллельно с аккаунтом
+        self.default_region = default_region or config('HENRIK_DEFAULT_REGION', default='eu')
+        self.limiter = get_rate_limiter('henrik')
+        
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connection_limit = connection_limit
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def start(self):
+        """Открыть долгоживущую сессию с пулом соединений"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"Authorization": self.api_key, "Accept": "*/*"},
+            )
+        return self
+    
+    async def close(self):
+        """Закрыть сессию и соединения"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def __aenter__(self):
+        return await self.start()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+    
+    def _backoff(self, attempt: int) -> float:
+        """Экспоненциальная пауза с полным джиттером"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
         
-    async def _make_requests(self, endpoint: str, params: Optional[Dict] = None) -> tuple[Optional[Dict[str, Any]], Optional[APIError]]:
+    async def _make_requests(self, endpoint: str, params: Optional[Dict] = None,
+                             priority: int = Priority.INTERACTIVE, reader=None) -> tuple[Optional[Any], Optional[APIError]]:
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(priority)
+            data, error, retry_after = await self._request_once(endpoint, params, reader)
+            if error is None or retry_after is None or attempt == self.max_retries:
+                return data, error
+            
+            if error == APIError.RATE_LIMITED:
+                if retry_after > self.MAX_RETRY_AFTER:
+                    return data, error
+                # Лимитер уже заблокирован на Retry-After - следующий acquire дождется окна
+                print(f"⏳ Henrik 429, повтор после {retry_after:.1f}s")
+                continue
+            
+            delay = self._backoff(attempt)
+            print(f"🔁 Henrik {endpoint}: {error}, повтор {attempt + 1}/{self.max_retries} через {delay:.2f}s")
+            await asyncio.sleep(delay)
+        return None, APIError.API_UNAVAILABLE
+    
+    async def _request_once(self, endpoint: str, params: Optional[Dict] = None,
+                            reader=None) -> tuple[Optional[Any], Optional[APIError], Optional[float]]:
+        """Один запрос. Третий элемент - минимальная пауза перед повтором или None, если повтор бесполезен.
+
+        reader - корутина, разбирающая успешный ответ вместо response.json().
+        """
         url = f"{self.base_url}{endpoint}"
-        headers = {"Authorization": self.api_key,"Accept":"*/*"}
+        session = await self._get_session()
         
         try: 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, params=params) as response:
-                    if response.status == 404:
-                        return None, APIError.PLAYER_NOT_FOUND
-                    elif response.status == 429:
-                        return None, APIError.RATE_LIMITED
-                    elif response.status >= 500:
-                        return None, APIError.API_UNAVAILABLE
-                    
-                    response.raise_for_status()
-                    data = await response.json()
-                    return data, None
+            async with session.get(url, params=params) as response:
+                retry_after = self.limiter.update_from_headers(response.status, response.headers)
+                if response.status == 404:
+                    return None, APIError.PLAYER_NOT_FOUND, None
+                elif response.status == 429:
+                    return None, APIError.RATE_LIMITED, retry_after or 0.0
+                elif response.status >= 500:
+                    return None, APIError.API_UNAVAILABLE, 0.0
+                
+                response.raise_for_status()
+                data = await reader(response) if reader else await response.json()
+                return data, None, None
         except asyncio.TimeoutError:
-            return None, APIError.TIMEOUT
+            return None, APIError.TIMEOUT, 0.0
+        except aiohttp.ClientResponseError as e:
+            print(f"Error making request: {e}")
+            return None, APIError.API_UNAVAILABLE, None
         except aiohttp.ClientError as e:
+            # Обрыв соединения, DNS и т.п. - имеет смысл повторить
             print(f"Error making request: {e}")
-            return None, APIError.API_UNAVAILABLE
+            return None, APIError.API_UNAVAILABLE, 0.0
         except Exception as e:
             print(f"Unexpected error: {e}")
-            return None, APIError.API_UNAVAILABLE
+            return None, APIError.API_UNAVAILABLE, None
         
     async def get_player_stats(self, name: str, tag: str) -> Optional[Player]:
         endpoint = f"v1/account/{name}/{tag}"
-        response = await self._make_requests(endpoint)
-        if response and response.get('status') == 200:
+        response, error = await self._make_requests(endpoint)
+        if not error and response and response.get('status') == 200:
             return Player(**response['data'])
         return None
     
-    async def get_matchlist(self, name: str, tag: str, region: str) -> Optional[Dict[str, Any]]:
+    async def get_matchlist(self, name: str, tag: str, region: str, size: Optional[int] = None,
+                            mode: Optional[str] = None, priority: int = Priority.INTERACTIVE) -> tuple[Optional[Dict[str, Any]], Optional[APIError]]:
         endpoint = f"v3/matches/{region}/{name}/{tag}"
-        return await self._make_requests(endpoint)
+        params = {}
+        if size:
+            params['size'] = size
+        if mode:
+            params['mode'] = mode
+        return await self._make_requests(endpoint, params or None, priority=priority)
     
-    async def get_match(self, matchid: str) -> Optional[Dict[str, Any]]:
-        endpoint = f"v2/match/{matchid}"
-        return await self._make_requests(endpoint)
+    async def get_matchlist_player(self, name: str, tag: str, region: str, size: Optional[int] = None,
+                                   mode: Optional[str] = None, puuid: Optional[str] = None,
+                                   priority: int = Priority.INTERACTIVE) -> tuple[Optional[List[Dict[str, Any]]], Optional[APIError]]:
+        """Список матчей игрока в сжатом виде: {'match': строка matches, 'player': строка player_matches}.
+
+        Ответ v3/matches разбирается потоково по мере получения, полный документ
+        списка матчей в памяти не собирается, а статистика остальных игроков
+        и раунды отбрасываются сразу.
+        """
+        endpoint = f"v3/matches/{region}/{name}/{tag}"
+        params = {}
+        if size:
+            params['size'] = size
+        if mode:
+            params['mode'] = mode
+
+        async def read(response: aiohttp.ClientResponse) -> List[Dict[str, Any]]:
+            parser = MatchListStreamParser()
+            views = []
+
+            def consume(chunk: Optional[bytes]):
+                matches = parser.close() if chunk is None else parser.feed(chunk)
+                for match in matches:
+                    view = extract_player_view(match, name, tag, puuid)
+                    if view:
+                        views.append(view)
+
+            # Разбор и выборка игрока идут в потоке, цикл событий только читает сокет
+            async for chunk in response.content.iter_chunked(self.STREAM_CHUNK_SIZE):
+                await asyncio.to_thread(consume, chunk)
+            await asyncio.to_thread(consume, None)
+            return views
+
+        return await self._make_requests(endpoint, params or None, priority=priority, reader=read)
+    
+    async def get_match(self, matchid: str, priority: int = Priority.INTERACTIVE) -> tuple[Optional[Dict[str, Any]], Optional[APIError]]:
+        """Детали матча. Завершенные матчи неизменны, поэтому кэшируются навсегда"""
+        cached = self.match_cache.get(matchid)
+        if cached is not None:
+            return cached, None
+        
+        # Один и тот же матч, запрошенный одновременно, качаем один раз
+        pending = self._matches_in_flight.get(matchid)
+        if pending is None:
+            pending = asyncio.ensure_future(self._make_requests(f"v2/match/{matchid}", priority=priority))
+            self._matches_in_flight[matchid] = pending
+            pending.add_done_callback(lambda _: self._matches_in_flight.pop(matchid, None))
+        
+        data, error = await asyncio.shield(pending)
+        if not error and data and data.get('status') == 200:
+            self.match_cache.set(matchid, data)
+        return data, error
+    
+    async def get_matches(self, match_ids, concurrency: int = 4,
+                          priority: int = Priority.INTERACTIVE) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Детали нескольких матчей с ограниченной параллельностью.
+
+        Возвращает match_id -> ответ API (None, если матч получить не удалось).
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        unique_ids = list(dict.fromkeys(match_ids))
+        
+        async def fetch(matchid: str):
+            cached = self.match_cache.get(matchid)
+            if cached is not None:
+                return matchid, cached
+            async with semaphore:
+                data, error = await self.get_match(matchid, priority)
+            return matchid, None if error else data
+        
+        results = await asyncio.gather(*(fetch(matchid) for matchid in unique_ids))
+        return dict(results)
     
     async def get_mmr_history(self, region: str, name: str, tag: str) -> Optional[Dict[str, Any]]:
         endpoint = f"v1/mmr-history/{region}/{name}/{tag}"
@@ -59,33 +248,160 @@ class HenrikAPIClient:
         endpoint = f"v2/by-puuid/mmr/{region}/{puuid}"
         return await self._make_requests(endpoint)
     
+    async def _iter_pages(self, endpoint: str, params: Dict[str, Any], page_size: int,
+                          priority: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Страницы paged-эндпоинта v1/lifetime. Следующая страница запрашивается,
+        пока вызывающий обрабатывает текущую; при выходе из цикла запрос отменяется."""
+        def fetch(page: int) -> asyncio.Future:
+            return asyncio.ensure_future(
+                self._make_requests(endpoint, {**params, 'page': page, 'size': page_size}, priority=priority)
+            )
+        
+        page = 1
+        pending: Optional[asyncio.Future] = fetch(page)
+        try:
+            while pending is not None:
+                response, error = await pending
+                pending = None
+                if error or not response:
+                    print(f"⚠️ Henrik {endpoint}, страница {page}: {error}")
+                    return
+                
+                items = response.get('data') or []
+                total = (response.get('results') or {}).get('total')
+                if len(items) >= page_size and (total is None or page * page_size < total):
+                    page += 1
+                    pending = fetch(page)
+                if items:
+                    yield items
+        finally:
+            if pending is not None:
+                pending.cancel()
+    
+    async def iter_matches(self, name: str, tag: str, region: str, since: Optional[int] = None,
+                           mode: Optional[str] = None, page_size: int = 20, details: bool = False,
+                           priority: int = Priority.INTERACTIVE) -> AsyncIterator[Dict[str, Any]]:
+        """Матчи игрока от новых к старым, постранично через v1/lifetime/matches.
+
+        since - unix-время, старше которого матчи не нужны: перебор на нем останавливается.
+        С details=True вместо кратких записей отдаются полные документы v2/match
+        (через match_cache); детали матчей страницы качаются параллельно.
+        """
+        params = {'mode': mode} if mode else {}
+        pages = self._iter_pages(f"v1/lifetime/matches/{region}/{name}/{tag}", params, page_size, priority)
+        details_task: Optional[asyncio.Future] = None
+        try:
+            async for items in pages:
+                fresh = []
+                for item in items:
+                    meta = item.get('meta') or {}
+                    if since is not None and parse_timestamp(meta.get('started_at')) < since:
+                        break
+                    fresh.append(item)
+                
+                if details:
+                    ids = [(item.get('meta') or {}).get('id') for item in fresh]
+                    details_task = asyncio.ensure_future(self.get_matches([i for i in ids if i], priority=priority))
+                    documents = await details_task
+                    details_task = None
+                    for matchid in ids:
+                        document = documents.get(matchid)
+                        if document:
+                            yield document.get('data') or document
+                else:
+                    for item in fresh:
+                        yield item
+                
+                if len(fresh) < len(items):
+                    return
+        finally:
+            if details_task is not None:
+                details_task.cancel()
+            await pages.aclose()
+    
+    async def iter_mmr_history(self, name: str, tag: str, region: str, since: Optional[int] = None,
+                               page_size: int = 20, priority: int = Priority.INTERACTIVE) -> AsyncIterator[Dict[str, Any]]:
+        """Изменения RR игрока от новых к старым, постранично через v1/lifetime/mmr-history"""
+        pages = self._iter_pages(f"v1/lifetime/mmr-history/{region}/{name}/{tag}", {}, page_size, priority)
+        try:
+            async for items in pages:
+                for item in items:
+                    if since is not None and parse_timestamp(item.get('date')) < since:
+                        return
+                    yield item
+        finally:
+            await pages.aclose()
+    
+    @staticmethod
+    def _identity_key(name: str, tag: str) -> str:
+        return f"{name.strip().lower()}#{tag.strip().lower()}"
+    
+    @staticmethod
+    def _with_rank(player: Player, mmr_data: Optional[Dict[str, Any]], mmr_error: Optional[APIError]) -> Player:
+        """Вернуть копию игрока с RankInfo, если MMR получен"""
+        if mmr_error or not mmr_data or mmr_data.get('status') != 200:
+            return player
+        data = mmr_data.get('data') or {}
+        if "error" in data:
+            return player
+        try:
+            return player.model_copy(update={'rank_info': RankInfo(**data)})
+        except Exception as e:
+            print(f"Error creating RankInfo: {e}")
+            return player
+    
     async def get_full_player_info(self, name: str, tag: str) -> tuple[Optional[Player], Optional[APIError]]:
-        player_data, error = await self._make_requests(f"v1/account/{name}/{tag}")
-        if error:
-            return None, error
+        key = self._identity_key(name, tag)
         
-        if not player_data or player_data.get('status') != 200:
-            return None, APIError.PLAYER_NOT_FOUND
+        # Известный name#tag: puuid и регион берем из кэша и сразу идем за MMR
+        cached = self.identity_cache.get(key)
+        if cached is not None:
+            mmr_data, mmr_error = await self._make_requests(f"v2/by-puuid/mmr/{cached.region}/{cached.puuid}")
+            if mmr_error != APIError.PLAYER_NOT_FOUND:
+                return self._with_rank(cached, mmr_data, mmr_error), None
+            # puuid больше не соответствует name#tag - обычный холодный путь
+            self.identity_cache.pop(key)
+        
+        # Холодный путь: аккаунт и MMR по имени в предполагаемом регионе параллельно
+        account_task = asyncio.create_task(self._make_requests(f"v1/account/{name}/{tag}"))
+        mmr_task = asyncio.create_task(self._make_requests(f"v2/mmr/{self.default_region}/{name}/{tag}"))
+        try:
+            player_data, error = await account_task
+        except BaseException:
+            mmr_task.cancel()
+            raise
+        
+        if error or not player_data or player_data.get('status') != 200:
+            mmr_task.cancel()
+            return None, error or APIError.PLAYER_NOT_FOUND
         
         try:
             player = Player(**player_data['data'])
         except Exception as e:
+            mmr_task.cancel()
             print(f"Error creationg Player: {e}")
             return None, APIError.API_UNAVAILABLE
         
-        mmr_data, mmr_error = await self._make_requests(f"v2/by-puuid/mmr/{player.region}/{player.puuid}")
+        self.identity_cache.set(key, player)
         
-        if mmr_error:
-            return player, None
+        if player.region == self.default_region:
+            mmr_data, mmr_error = await mmr_task
+        else:
+            mmr_task.cancel()
+            mmr_data, mmr_error = await self._make_requests(f"v2/by-puuid/mmr/{player.region}/{player.puuid}")
         
-        if mmr_data or mmr_data.get('status') == 200 and "error" not in mmr_data.get('data', {}):
-            try:
-                rank_info = RankInfo(**mmr_data['data'])
-                player_data = player.model_dump()
-                player_data['rank_info'] = rank_info
-                return Player(**player_data), None
-            except Exception as e:
-                print(f"Error creating RankInfo: {e}")
-                return player, None
-            
-        return player, None
\ No newline at end of file
+        return self._with_rank(player, mmr_data, mmr_error), None
+
+
+_client: Optional[HenrikAPIClient] = None
+
+
+def get_henrik_client() -> Optional[HenrikAPIClient]:
+    """Общий для процесса клиент Henrik или None, если HENRIK_API_KEY не задан"""
+    global _client
+    if _client is None:
+        api_key = config('HENRIK_API_KEY', default='')
+        if not api_key:
+            return None
+        _client = HenrikAPIClient(api_key, base_url=config('HENRIK_API_URL', default="https://api.henrikdev.xyz/valorant/"))
+    return _client
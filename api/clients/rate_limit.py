@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from decouple import config
+
+
+class Priority:
+    """Приоритет запроса в очереди лимитера (меньше - раньше)"""
+    INTERACTIVE = 0
+    BACKGROUND = 10
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах: число или HTTP-дата"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token bucket для одного upstream с приоритетной очередью ожидания.
+
+    Учитывает Retry-After и заголовки x-ratelimit-*: при исчерпании лимита
+    на стороне сервера корзина блокируется до указанного момента.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+        self._waiters = []
+        self._counter = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self.granted = 0
+        self.throttled = 0
+        self.avg_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, priority: int = Priority.INTERACTIVE) -> float:
+        """Дождаться токена. Возвращает время ожидания в очереди"""
+        started = time.monotonic()
+        now = started
+        self._refill(now)
+        if not self._waiters and now >= self.blocked_until and self.tokens >= 1:
+            self.tokens -= 1
+            self._record_wait(0.0)
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        await future
+        waited = time.monotonic() - started
+        self._record_wait(waited)
+        return waited
+
+    def acquire_blocking(self, loop: asyncio.AbstractEventLoop, priority: int = Priority.INTERACTIVE,
+                         cancel_event: Optional[threading.Event] = None) -> bool:
+        """Получить токен из рабочего потока. False, если задачу отменили"""
+        future = asyncio.run_coroutine_threadsafe(self.acquire(priority), loop)
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                future.cancel()
+                return False
+            try:
+                future.result(timeout=0.2)
+                return True
+            except FutureTimeoutError:
+                continue
+
+    async def _dispatch(self):
+        """Раздает токены ожидающим в порядке приоритета"""
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+
+            heapq.heappop(self._waiters)
+            self.tokens -= 1
+            future.set_result(None)
+
+    def _record_wait(self, waited: float):
+        self.granted += 1
+        if waited > 0:
+            self.throttled += 1
+        self.avg_wait += 0.1 * (waited - self.avg_wait)
+        self.max_wait = max(self.max_wait, waited)
+
+    def block_for(self, seconds: float):
+        """Не выдавать токены ближайшие seconds секунд"""
+        until = time.monotonic() + seconds
+        if until > self.blocked_until:
+            self.blocked_until = until
+            print(f"🚦 {self.name}: лимит исчерпан, пауза {seconds:.1f}s")
+
+    def update_from_headers(self, status: int, headers) -> Optional[float]:
+        """Учесть Retry-After и x-ratelimit-* из ответа. Возвращает паузу, если она выставлена"""
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        if status == 429 and retry_after is None:
+            retry_after = max(1.0, 1 / self.rate)
+
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is not None and reset is not None:
+            try:
+                if int(float(remaining)) <= 0:
+                    reset_in = float(reset)
+                    # Заголовок бывает и в секундах, и unix-временем
+                    if reset_in > 10 ** 9:
+                        reset_in -= time.time()
+                    retry_after = max(retry_after or 0.0, reset_in)
+                else:
+                    self.tokens = min(self.tokens, float(remaining))
+            except ValueError:
+                pass
+
+        if retry_after:
+            self.block_for(retry_after)
+        return retry_after
+
+    def metrics(self) -> Dict:
+        now = time.monotonic()
+        self._refill(now)
+        pending = [w for w in self._waiters if not w[2].done()]
+        return {
+            'name': self.name,
+            'rate': self.rate,
+            'burst': self.burst,
+            'tokens': round(self.tokens, 2),
+            'blocked_for': max(0.0, self.blocked_until - now),
+            'queue_depth': len(pending),
+            'queue_interactive': sum(1 for w in pending if w[0] <= Priority.INTERACTIVE),
+            'queue_background': sum(1 for w in pending if w[0] > Priority.INTERACTIVE),
+            'granted': self.granted,
+            'throttled': self.throttled,
+            'avg_wait': round(self.avg_wait, 3),
+            'max_wait': round(self.max_wait, 3),
+        }
+
+
+# Лимиты по умолчанию: запросов в секунду и размер пачки
+UPSTREAMS = {
+    'henrik': (config('HENRIK_RATE', default=0.5, cast=float), config('HENRIK_BURST', default=5, cast=int)),
+    'tracker_api': (config('TRACKER_API_RATE', default=1.0, cast=float), config('TRACKER_API_BURST', default=5, cast=int)),
+    'tracker_pages': (config('TRACKER_PAGES_RATE', default=0.2, cast=float), config('TRACKER_PAGES_BURST', default=2, cast=int)),
+}
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(name: str) -> RateLimiter:
+    """Общий для процесса лимитер upstream"""
+    if name not in _limiters:
+        rate, burst = UPSTREAMS[name]
+        _limiters[name] = RateLimiter(name, rate, burst)
+    return _limiters[name]
+
+
+def rate_limit_metrics() -> Dict[str, Dict]:
+    """Текущий бюджет и очереди всех upstream"""
+    return {name: get_rate_limiter(name).metrics() for name in UPSTREAMS}
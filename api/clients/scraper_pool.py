@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from decouple import config
+
+from api.clients.egress import EgressPool, EgressSession, create_egress_pool
+
+
+class ScraperCancelled(Exception):
+    """Задача CloudScraper отменена до завершения"""
+
+
+class ScraperPoolFull(Exception):
+    """Очередь пула CloudScraper переполнена"""
+
+
+class ScraperPool:
+    """Выделенный ограниченный пул потоков для CloudScraper.
+
+    Поток на время задачи берет сессию из EgressPool, задачи получают
+    threading.Event для кооперативной отмены, а дефолтный executor цикла
+    не используется.
+    """
+
+    def __init__(self, egress: EgressPool, max_workers: int = 4, max_queue: int = 16):
+        self.egress = egress
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cloudscraper")
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+
+    def _call(self, fn: Callable, cancel_event: threading.Event, state: Dict,
+              pinned: Optional[EgressSession], args: tuple) -> Any:
+        with self._lock:
+            if state['dequeued']:
+                # Задача уже снята из очереди отменившей ее корутиной
+                raise ScraperCancelled()
+            state['dequeued'] = True
+            self.queued -= 1
+            self.running += 1
+        session = None
+        ok = None
+        started = time.monotonic()
+        try:
+            session = self.egress.acquire(cancel_event, pinned)
+            if session is None:
+                raise ScraperCancelled()
+            started = time.monotonic()
+            result = fn(session, cancel_event, *args)
+            # Пустой результат (игрок не найден, 404) - не вина сессии;
+            # неудачу задача отмечает флагами challenged/errored
+            ok = not (session.challenged or session.errored)
+            with self._lock:
+                self.completed += 1
+            return result
+        except ScraperCancelled:
+            with self._lock:
+                self.cancelled += 1
+            raise
+        except Exception:
+            ok = False
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            if session is not None:
+                if session.challenged:
+                    ok = False
+                elif cancel_event.is_set():
+                    # Проигравший хедж или истекший дедлайн не оценивают сессию
+                    ok = None
+                self.egress.release(session, ok, time.monotonic() - started)
+            with self._lock:
+                self.running -= 1
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None,
+                  session: Optional[EgressSession] = None) -> Any:
+        """Выполнить fn(egress_session, cancel_event, *args) в пуле.
+
+        session закрепляет задачу за конкретной исходящей сессией. При таймауте
+        или отмене корутины выставляется cancel_event, а задача, еще не взятая
+        потоком, снимается из очереди.
+        """
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ScraperPoolFull(f"очередь CloudScraper заполнена ({self.queued})")
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+
+        cancel_event = threading.Event()
+        state = {'dequeued': False}
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, self._call, fn, cancel_event, state, session, args)
+        except Exception:
+            with self._lock:
+                self.queued -= 1
+            raise
+
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except BaseException:
+            cancel_event.set()
+            with self._lock:
+                if not state['dequeued']:
+                    # Поток так и не взял задачу - снимаем ее из очереди
+                    state['dequeued'] = True
+                    self.queued -= 1
+                    self.cancelled += 1
+            raise
+
+    def metrics(self) -> Dict[str, int]:
+        """Снимок метрик пула"""
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'queue_depth': self.queued,
+                'max_queue_depth': self.max_queue_depth,
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'cancelled': self.cancelled,
+                'rejected': self.rejected,
+                'sessions': self.egress.metrics(),
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def interruptible_sleep(cancel_event: threading.Event, seconds: float):
+    """Пауза, прерываемая отменой задачи"""
+    if cancel_event.wait(seconds):
+        raise ScraperCancelled()
+
+
+_pool: Optional[ScraperPool] = None
+
+
+def get_scraper_pool() -> ScraperPool:
+    """Общий для процесса пул CloudScraper"""
+    global _pool
+    if _pool is None:
+        _pool = ScraperPool(
+            create_egress_pool(),
+            max_workers=config('SCRAPER_POOL_WORKERS', default=4, cast=int),
+            max_queue=config('SCRAPER_POOL_MAX_QUEUE', default=16, cast=int),
+        )
+    return _pool
+
+
+def close_scraper_pool():
+    """Остановить пул CloudScraper: задачи из очереди отменяются, потоки не ждем"""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, List, Optional
+
+import ijson
+
+from api.storage.match_store import parse_match_row, parse_player_row, side_kills
+
+try:
+    # Разбор на C (yajl2); без собранного расширения ijson работает на чистом Python
+    _backend = ijson.get_backend('yajl2_c')
+except ImportError:
+    print("⚠️ ijson без C-бэкенда yajl2_c: потоковый разбор матчей будет медленным")
+    _backend = ijson
+
+
+class MatchListStreamParser:
+    """Инкрементальный разбор ответа v3/matches: {"status": ..., "data": [match, ...]}.
+
+    Байты подаются кусками через feed(), который возвращает матчи, полностью
+    пришедшие к этому моменту. Разбор идет в C-парсере ijson, в памяти держится
+    только текущий матч, а крупные поддеревья верхнего уровня (по умолчанию
+    rounds) отбрасываются сразу после сборки матча.
+    """
+
+    def __init__(self, skip_keys: Iterable[str] = ('rounds',)):
+        self.skip_keys = tuple(skip_keys)
+        self._items = ijson.sendable_list()
+        self._coro = _backend.items_coro(self._items, 'data.item', use_float=True)
+        self.done = False
+
+    def feed(self, chunk: bytes) -> List[Dict]:
+        if chunk:
+            try:
+                self._coro.send(chunk)
+            except ijson.JSONError as e:
+                raise ValueError(f"Некорректный ответ v3/matches: {e}") from e
+        return self._take()
+
+    def close(self) -> List[Dict]:
+        if not self.done:
+            self.done = True
+            try:
+                self._coro.close()
+            except ijson.JSONError as e:
+                raise ValueError(f"Ответ v3/matches оборвался: {e}") from e
+        return self._take()
+
+    def _take(self) -> List[Dict]:
+        items = list(self._items)
+        del self._items[:]
+        for item in items:
+            if isinstance(item, dict):
+                for key in self.skip_keys:
+                    if key in item:
+                        item[key] = None
+        return items
+
+
+def extract_player_view(match: Dict, name: Optional[str] = None, tag: Optional[str] = None,
+                        puuid: Optional[str] = None) -> Optional[Dict]:
+    """Метаданные матча и строка статистики одного игрока (по puuid или name#tag)"""
+    players = (match.get('players') or {}).get('all_players') or []
+    player = None
+    for candidate in players:
+        if puuid and candidate.get('puuid') == puuid:
+            player = candidate
+            break
+        if (not puuid and name and tag
+                and (candidate.get('name') or '').lower() == name.lower()
+                and (candidate.get('tag') or '').lower() == tag.lower()):
+            player = candidate
+            break
+    if player is None:
+        return None
+
+    match_row = parse_match_row(match)
+    own_kills = [
+        kill for kill in match.get('kills') or ()
+        if player.get('puuid') in (kill.get('killer_puuid'), kill.get('victim_puuid'))
+    ]
+    return {
+        'match': match_row,
+        'player': parse_player_row(match_row, player, match.get('teams') or {}, side_kills(own_kills)),
+    }
@@ -6,11 +6,75 @@ import cloudscraper
 import time
 import random
 import urllib.parse
+from collections import deque
+from decouple import config
+from api.clients.scraper_pool import close_scraper_pool, get_scraper_pool, interruptible_sleep, ScraperCancelled, ScraperPoolFull
+from api.clients.clearance import ensure_refresh_task, stop_refresh_task, warm_up, TRACKER_SITE_URL
+from api.clients.rate_limit import get_rate_limiter, Priority
+from api.clients.deadline import Deadline
+from api.analytics.roles import determine_main_role, analyze_play_style
+
+
+class LatencyTracker:
+    """Скользящее окно задержек httpx для расчёта порога хеджирования"""
+    
+    def __init__(self, window: int = 200, percentile: float = 0.9,
+                 default: float = 2.0, min_samples: int = 20,
+                 floor: float = 0.3, ceiling: float = 10.0):
+        self.samples = deque(maxlen=window)
+        self.percentile = percentile
+        self.default = default
+        self.min_samples = min_samples
+        self.floor = floor
+        self.ceiling = ceiling
+    
+    def record(self, seconds: float):
+        """Запомнить задержку успешного запроса"""
+        self.samples.append(seconds)
+    
+    def threshold(self) -> float:
+        """Порог, после которого запускается параллельный запрос (p90)"""
+        if len(self.samples) < self.min_samples:
+            return self.default
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+        return max(self.floor, min(self.ceiling, ordered[index]))
+
+
+class HedgeBudget:
+    """Ограничение числа одновременно хеджированных запросов"""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.launched = 0
+        self.rejected = 0
+    
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        self.launched += 1
+        return True
+    
+    def release(self):
+        self.in_flight = max(0, self.in_flight - 1)
+
 
 class TrackerGGAPI:
     """Интеграция с Tracker.gg API для получения расширенной статистики"""
     
-    BASE_URL = "https://api.tracker.gg/api/v2/valorant/standard"
+    BASE_URL = config('TRACKER_API_URL', default="https://api.tracker.gg/api/v2/valorant/standard")
+    
+    # Хеджирование: общий для всех экземпляров бюджет и статистика задержек
+    HEDGE_ENABLED = config('TRACKER_HEDGE_ENABLED', default=True, cast=bool)
+    httpx_latency = LatencyTracker()
+    hedge_budget = HedgeBudget(config('TRACKER_HEDGE_MAX_IN_FLIGHT', default=4, cast=int))
+    # Потолки таймаутов попыток; с дедлайном берется меньшее из потолка и остатка бюджета
+    HTTPX_TIMEOUT = 30.0
+    CLOUDSCRAPER_TIMEOUT = 30.0
+    CLOUDSCRAPER_REQUEST_TIMEOUT = 10.0
     
     def __init__(self):
         # Обычный httpx клиент
@@ -22,35 +86,24 @@ class TrackerGGAPI:
             timeout=30.0
         )
         
-        # CloudScraper для обхода Cloudflare
-        self.cloud_scraper = cloudscraper.create_scraper(
-            browser={
-                'browser': 'chrome',
-                'platform': 'android',
-                'mobile': True
-            }
-        )
+        # CloudScraper для обхода Cloudflare работает в выделенном пуле потоков
+        self.scraper_pool = get_scraper_pool()
         
-        # Настройки CloudScraper
-        self.cloud_scraper.headers.update({
-            "Accept": "application/json, text/plain, */*",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
-            "Cache-Control": "no-cache",
-            "DNT": "1",
-            "Origin": "https://tracker.gg",
-            "Pragma": "no-cache",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-origin",
-        })
+        # Общий бюджет запросов к API tracker.gg; бюджет HTML страниц расходует warm_up
+        self.api_limiter = get_rate_limiter('tracker_api')
     
-    async def get_enhanced_player_stats(self, riot_id: str, tagline: str) -> Optional[Dict]:
-        """Получить обработанную статистику игрока для карточки"""
+    async def get_enhanced_player_stats(self, riot_id: str, tagline: str,
+                                        deadline: Optional[Deadline] = None,
+                                        with_summary: bool = False) -> Optional[Dict]:
+        """Получить обработанную статистику игрока для карточки.
+
+        with_summary добавляет в результат 'summary' (get_player_summary) из того
+        же ответа, чтобы подпись к карточке не требовала второго запроса.
+        """
         
         print(f"🔍 get_enhanced_player_stats вызван для {riot_id}#{tagline}")
         
-        raw_data = await self.get_player_profile(riot_id, tagline)
+        raw_data = await self.get_player_profile(riot_id, tagline, deadline=deadline)
         print(f"📊 get_player_profile завершен, данные получены: {bool(raw_data)}")
         
         if not raw_data or 'data' not in raw_data:
@@ -87,7 +140,7 @@ class TrackerGGAPI:
             print("❌ Не найден current_season сегмент")
             print(f"🔍 Доступные сегменты: {[s.get('type') for s in segments]}")
             # Возвращаем базовую структуру с минимальными данными
-            return {
+            base = {
                 'riot_id': riot_id,
                 'tagline': tagline,
                 'region': 'N/A',
@@ -104,6 +157,9 @@ class TrackerGGAPI:
                 'headshot_pct': 0,
                 'favorite_agent': 'Unknown'
             }
+            if with_summary:
+                base['summary'] = self.get_player_summary(raw_data)
+            return base
             
         # Находим агента с наибольшим количеством матчей
         favorite_agent = None
@@ -223,23 +279,32 @@ class TrackerGGAPI:
         else:
             print("🎭 Любимый агент не найден")
         
+        if with_summary:
+            result['summary'] = self.get_player_summary(raw_data)
         return result
 
-    async def get_player_profile(self, riot_id: str, tagline: str) -> Optional[Dict]:
-        """Получить полную статистику игрока через CloudScraper"""
+    async def get_player_profile(self, riot_id: str, tagline: str, priority: int = Priority.INTERACTIVE,
+                                 deadline: Optional[Deadline] = None) -> Optional[Dict]:
+        """Получить полную статистику игрока через CloudScraper.
+
+        deadline - общий бюджет запроса: каждая попытка получает только его остаток.
+        """
+        
+        if self.HEDGE_ENABLED:
+            return await self._get_player_profile_hedged(riot_id, tagline, priority, deadline)
         
         print(f"🌩️ Попытка получения через CloudScraper: {riot_id}#{tagline}")
         
         # Сначала пробуем обычный httpx
         print(f"🔄 Пробуем httpx...")
-        httpx_result = await self._try_httpx(riot_id, tagline)
+        httpx_result = await self._try_httpx(riot_id, tagline, priority, deadline)
         if httpx_result:
             print("✅ Успех через обычный httpx!")
             return httpx_result
         
         # Если httpx не работает, пробуем CloudScraper
         print("🔄 Переключение на CloudScraper...")
-        cloudscraper_result = await self._try_cloudscraper(riot_id, tagline)
+        cloudscraper_result = await self._try_cloudscraper(riot_id, tagline, priority, deadline)
         if cloudscraper_result:
             print("✅ Успех через CloudScraper!")
             return cloudscraper_result
@@ -247,7 +312,51 @@ class TrackerGGAPI:
         print("❌ Все методы не удались")
         return None
     
-    async def _try_httpx(self, riot_id: str, tagline: str) -> Optional[Dict]:
+    async def _get_player_profile_hedged(self, riot_id: str, tagline: str, priority: int = Priority.INTERACTIVE,
+                                         deadline: Optional[Deadline] = None) -> Optional[Dict]:
+        """Хеджированный запрос: httpx, а после порога p90 параллельно CloudScraper"""
+        
+        httpx_task = asyncio.create_task(self._try_httpx(riot_id, tagline, priority, deadline))
+        threshold = self.httpx_latency.threshold()
+        
+        try:
+            done, _ = await asyncio.wait({httpx_task}, timeout=threshold)
+        except asyncio.CancelledError:
+            httpx_task.cancel()
+            raise
+        if done or not self.hedge_budget.try_acquire():
+            # httpx ответил до порога или бюджет исчерпан - обычный последовательный путь
+            result = await httpx_task
+            if result:
+                print("✅ Успех через обычный httpx!")
+                return result
+            print("🔄 Переключение на CloudScraper...")
+            result = await self._try_cloudscraper(riot_id, tagline, priority, deadline)
+            if result:
+                print("✅ Успех через CloudScraper!")
+            return result
+        
+        print(f"⏱️ httpx не ответил за {threshold:.2f}s, запускаем CloudScraper параллельно")
+        scraper_task = asyncio.create_task(self._try_cloudscraper(riot_id, tagline, priority, deadline))
+        pending = {httpx_task, scraper_task}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result:
+                        winner = "httpx" if task is httpx_task else "CloudScraper"
+                        print(f"✅ Хедж выигран через {winner}")
+                        return result
+            print("❌ Все методы не удались")
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+            self.hedge_budget.release()
+    
+    async def _try_httpx(self, riot_id: str, tagline: str, priority: int = Priority.INTERACTIVE,
+                         deadline: Optional[Deadline] = None) -> Optional[Dict]:
         """Попытка через обычный httpx"""
         try:
             # URL-кодируем riot_id и tagline для поддержки кириллицы
@@ -256,11 +365,20 @@ class TrackerGGAPI:
             url = f"{self.BASE_URL}/profile/riot/{encoded_riot_id}%23{encoded_tagline}"
             print(f"📡 httpx запрос: {url}")
             
-            response = await self.client.get(url)
+            await self.api_limiter.acquire(priority)
+            timeout = self.HTTPX_TIMEOUT if deadline is None else deadline.timeout(self.HTTPX_TIMEOUT)
+            if timeout <= 0:
+                print("⏰ httpx: бюджет запроса исчерпан")
+                return None
+            started = time.monotonic()
+            response = await self.client.get(url, timeout=timeout)
             print(f"📊 httpx ответ: {response.status_code}")
+            self.api_limiter.update_from_headers(response.status_code, response.headers)
             
             if response.status_code == 200:
-                return response.json()
+                data = response.json()
+                self.httpx_latency.record(time.monotonic() - started)
+                return data
             else:
                 print(f"❌ httpx ошибка: {response.status_code}")
                 return None
@@ -269,157 +387,218 @@ class TrackerGGAPI:
             print(f"💥 httpx исключение: {e}")
             return None
     
-    async def _try_cloudscraper(self, riot_id: str, tagline: str) -> Optional[Dict]:
-        """Попытка через CloudScraper в отдельном потоке"""
-        import threading
-        import asyncio
+    async def _try_cloudscraper(self, riot_id: str, tagline: str, priority: int = Priority.INTERACTIVE,
+                                deadline: Optional[Deadline] = None) -> Optional[Dict]:
+        """Попытка через CloudScraper в выделенном пуле потоков"""
+        ensure_refresh_task(self.scraper_pool)
+        loop = asyncio.get_running_loop()
+        timeout = self.CLOUDSCRAPER_TIMEOUT if deadline is None else deadline.timeout(self.CLOUDSCRAPER_TIMEOUT)
+        if timeout <= 0:
+            print("⏰ CloudScraper: бюджет запроса исчерпан")
+            return None
+        try:
+            return await self.scraper_pool.run(
+                self._cloudscraper_sync, riot_id, tagline, loop, priority, deadline,
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"⏰ CloudScraper timeout - операция заняла более {timeout:.1f} секунд")
+            return None
+        except ScraperCancelled:
+            print("🛑 CloudScraper задача отменена")
+            return None
+        except ScraperPoolFull as e:
+            print(f"🚦 CloudScraper пул перегружен: {e}")
+            return None
+        except Exception as e:
+            print(f"💥 CloudScraper executor ошибка: {e}")
+            return None
+    
+    def _cloudscraper_sync(self, egress, cancel_event, riot_id: str, tagline: str,
+                           loop: asyncio.AbstractEventLoop, priority: int,
+                           deadline: Optional[Deadline] = None) -> Optional[Dict]:
+        """Синхронная функция для CloudScraper (выполняется в потоке пула на сессии egress)"""
+        scraper = egress.scraper
+        
+        def request_timeout() -> float:
+            # Каждый HTTP запрос ограничен и своим лимитом, и остатком общего бюджета
+            if deadline is None:
+                return self.CLOUDSCRAPER_REQUEST_TIMEOUT
+            timeout = deadline.timeout(self.CLOUDSCRAPER_REQUEST_TIMEOUT)
+            if timeout <= 0:
+                raise ScraperCancelled()
+            return timeout
+        
+        def take(limiter) -> bool:
+            # Токен лимитера берется в потоке, чтобы ожидание в очереди пула его не тратило
+            if not limiter.acquire_blocking(loop, priority, cancel_event):
+                raise ScraperCancelled()
+            return True
+        
+        def report(response):
+            loop.call_soon_threadsafe(self.api_limiter.update_from_headers, response.status_code, response.headers)
         
-        def cloudscraper_sync(riot_id: str, tagline: str) -> Optional[Dict]:
-            """Синхронная функция для CloudScraper"""
-            try:
-                print(f"🔧 CloudScraper начинает работу...")
-                # URL-кодируем для поддержки кириллицы
-                encoded_riot_id = urllib.parse.quote(riot_id, safe='')
-                encoded_tagline = urllib.parse.quote(tagline, safe='')
-                
-                # Сначала посещаем главную страницу для получения cookies
-                main_url = f"https://tracker.gg/valorant/profile/riot/{encoded_riot_id}%23{encoded_tagline}/overview"
-                print(f"🌐 CloudScraper: посещение главной страницы {main_url}")
-                
-                main_response = self.cloud_scraper.get(main_url, timeout=10)
-                print(f"📄 CloudScraper главная страница: {main_response.status_code}")
-                
-                if main_response.status_code != 200:
-                    print(f"❌ Не удалось загрузить главную страницу: {main_response.status_code}")
+        try:
+            print(f"🔧 CloudScraper начинает работу...")
+            # URL-кодируем для поддержки кириллицы
+            encoded_riot_id = urllib.parse.quote(riot_id, safe='')
+            encoded_tagline = urllib.parse.quote(tagline, safe='')
+            
+            # Referer страницы профиля, как при переходе из браузера
+            main_url = f"{TRACKER_SITE_URL}/valorant/profile/riot/{encoded_riot_id}%23{encoded_tagline}/overview"
+            
+            # Используем сохраненные clearance cookies вместо посещения HTML страницы
+            jar = egress.jar
+            used_cached = jar.apply(scraper)
+            if used_cached:
+                print(f"🍪 CloudScraper: clearance cookies из кэша ({jar.ttl():.0f}s)")
+            else:
+                print(f"🌐 CloudScraper [{egress.name}]: нет clearance cookies, прогрев")
+                if not warm_up(scraper, jar, loop, cancel_event, priority, timeout=request_timeout()):
+                    print("❌ Не удалось пройти прогрев Cloudflare")
+                    egress.challenged = True
                     return None
-                
-                # Небольшая задержка как настоящий пользователь
-                time.sleep(random.uniform(1, 3))
-                
-                # Обновляем заголовки для API запроса
-                self.cloud_scraper.headers.update({
-                    "Referer": main_url,
-                    "X-Requested-With": "XMLHttpRequest",
-                    "Accept": "application/json, text/plain, */*",
-                    "Accept-Encoding": "gzip, deflate, br"  # Важно для правильной декомпрессии
-                })
-                
-                # Теперь API запрос
-                api_url = f"{self.BASE_URL}/profile/riot/{encoded_riot_id}%23{encoded_tagline}"
-                print(f"🔗 CloudScraper API: {api_url}")
-                
-                api_response = self.cloud_scraper.get(api_url, timeout=10)
-                print(f"📡 CloudScraper API ответ: {api_response.status_code}")
-                print(f"📋 Content-Type: {api_response.headers.get('content-type', 'unknown')}")
-                print(f"🔧 Content-Encoding: {api_response.headers.get('content-encoding', 'none')}")
-                print(f"📦 Content-Length: {api_response.headers.get('content-length', 'unknown')}")
-                
-                if api_response.status_code == 200:
-                    try:
-                        # Проверяем, что содержимое действительно JSON
-                        content_type = api_response.headers.get('content-type', '').lower()
+                # Небольшая задержка как настоящий пользователь (прерывается отменой)
+                interruptible_sleep(cancel_event, random.uniform(1, 3))
+            
+            # Заголовки API запроса передаются в сам запрос, сессия не мутирует
+            api_headers = {
+                "Referer": main_url,
+                "X-Requested-With": "XMLHttpRequest",
+                "Accept": "application/json, text/plain, */*",
+                "Accept-Encoding": "gzip, deflate, br",  # Важно для правильной декомпрессии
+                **jar.request_headers(),
+            }
+            
+            # Теперь API запрос
+            api_url = f"{self.BASE_URL}/profile/riot/{encoded_riot_id}%23{encoded_tagline}"
+            print(f"🔗 CloudScraper API: {api_url}")
+            
+            take(self.api_limiter)
+            api_response = scraper.get(api_url, headers=api_headers, timeout=request_timeout())
+            report(api_response)
+            
+            if api_response.status_code == 403 and used_cached and not cancel_event.is_set():
+                # Cookies устарели раньше срока - проходим проверку заново и повторяем
+                print("🍪 Clearance cookies отклонены, повторный прогрев")
+                jar.invalidate()
+                if not warm_up(scraper, jar, loop, cancel_event, priority, timeout=request_timeout()):
+                    egress.challenged = True
+                    return None
+                api_headers.update(jar.request_headers())
+                take(self.api_limiter)
+                api_response = scraper.get(api_url, headers=api_headers, timeout=request_timeout())
+                report(api_response)
+            
+            if api_response.status_code == 403:
+                # Сессия получила проверку Cloudflare - пул отправит ее в карантин
+                egress.challenged = True
+            
+            print(f"📡 CloudScraper API ответ: {api_response.status_code}")
+            print(f"📋 Content-Type: {api_response.headers.get('content-type', 'unknown')}")
+            print(f"🔧 Content-Encoding: {api_response.headers.get('content-encoding', 'none')}")
+            print(f"📦 Content-Length: {api_response.headers.get('content-length', 'unknown')}")
+            
+            if api_response.status_code == 200:
+                try:
+                    # Проверяем, что содержимое действительно JSON
+                    content_type = api_response.headers.get('content-type', '').lower()
+                    
+                    if 'application/json' in content_type:
+                        print("✅ Контент определен как JSON")
                         
-                        if 'application/json' in content_type:
-                            print("✅ Контент определен как JSON")
+                        # Пробуем несколько способов декодирования
+                        try:
+                            # Способ 1: Стандартный .json()
+                            data = api_response.json()
+                            print("✅ CloudScraper JSON декодирован (метод 1)")
+                            return data
+                        except:
+                            print("❌ Метод 1 не сработал, пробуем метод 2")
                             
-                            # Пробуем несколько способов декодирования
                             try:
-                                # Способ 1: Стандартный .json()
-                                data = api_response.json()
-                                print("✅ CloudScraper JSON декодирован (метод 1)")
-                                return data
-                            except:
-                                print("❌ Метод 1 не сработал, пробуем метод 2")
+                                # Способ 2: Ручное декодирование
+                                import json
+                                text_content = api_response.text
+                                print(f"📄 Длина текста: {len(text_content)} символов")
+                                print(f"📄 Первые 100 символов: {repr(text_content[:100])}")
+                                
+                                if text_content.strip():
+                                    data = json.loads(text_content)
+                                    print("✅ CloudScraper JSON декодирован (метод 2)")
+                                    return data
+                                else:
+                                    print("❌ Пустой ответ")
+                                    
+                            except Exception as e2:
+                                print(f"❌ Метод 2 не сработал: {e2}")
                                 
                                 try:
-                                    # Способ 2: Ручное декодирование
-                                    import json
-                                    text_content = api_response.text
-                                    print(f"📄 Длина текста: {len(text_content)} символов")
-                                    print(f"📄 Первые 100 символов: {repr(text_content[:100])}")
+                                    # Способ 3: Работа с сырыми байтами
+                                    raw_content = api_response.content
+                                    print(f"📦 Сырой контент: {len(raw_content)} байт")
+                                    print(f"📦 Первые 50 байт: {raw_content[:50]}")
+                                    
+                                    # Пробуем декомпрессию
+                                    import gzip
+                                    import brotli
+                                    
+                                    encoding = api_response.headers.get('content-encoding', '').lower()
                                     
-                                    if text_content.strip():
-                                        data = json.loads(text_content)
-                                        print("✅ CloudScraper JSON декодирован (метод 2)")
+                                    if encoding == 'gzip':
+                                        print("🔧 Пробуем gzip декомпрессию")
+                                        decompressed = gzip.decompress(raw_content)
+                                        data = json.loads(decompressed.decode('utf-8'))
+                                        print("✅ CloudScraper JSON декодирован (gzip)")
+                                        return data
+                                    elif encoding == 'br':
+                                        print("🔧 Пробуем brotli декомпрессию")
+                                        decompressed = brotli.decompress(raw_content)
+                                        data = json.loads(decompressed.decode('utf-8'))
+                                        print("✅ CloudScraper JSON декодирован (brotli)")
                                         return data
                                     else:
-                                        print("❌ Пустой ответ")
-                                        
-                                except Exception as e2:
-                                    print(f"❌ Метод 2 не сработал: {e2}")
-                                    
-                                    try:
-                                        # Способ 3: Работа с сырыми байтами
-                                        raw_content = api_response.content
-                                        print(f"📦 Сырой контент: {len(raw_content)} байт")
-                                        print(f"📦 Первые 50 байт: {raw_content[:50]}")
-                                        
-                                        # Пробуем декомпрессию
-                                        import gzip
-                                        import brotli
-                                        
-                                        encoding = api_response.headers.get('content-encoding', '').lower()
+                                        print("🔧 Пробуем без декомпрессии")
+                                        data = json.loads(raw_content.decode('utf-8'))
+                                        print("✅ CloudScraper JSON декодирован (raw)")
+                                        return data
                                         
-                                        if encoding == 'gzip':
-                                            print("🔧 Пробуем gzip декомпрессию")
-                                            decompressed = gzip.decompress(raw_content)
-                                            data = json.loads(decompressed.decode('utf-8'))
-                                            print("✅ CloudScraper JSON декодирован (gzip)")
-                                            return data
-                                        elif encoding == 'br':
-                                            print("🔧 Пробуем brotli декомпрессию")
-                                            decompressed = brotli.decompress(raw_content)
-                                            data = json.loads(decompressed.decode('utf-8'))
-                                            print("✅ CloudScraper JSON декодирован (brotli)")
-                                            return data
-                                        else:
-                                            print("🔧 Пробуем без декомпрессии")
-                                            data = json.loads(raw_content.decode('utf-8'))
-                                            print("✅ CloudScraper JSON декодирован (raw)")
-                                            return data
-                                            
-                                    except Exception as e3:
-                                        print(f"❌ Метод 3 не сработал: {e3}")
-                                        print(f"📄 Первые 200 байт как текст: {repr(raw_content[:200])}")
-                        else:
-                            print(f"❌ Неожиданный content-type: {content_type}")
-                            print(f"📄 Первые 200 символов: {api_response.text[:200]}")
-                            
-                        return None
+                                except Exception as e3:
+                                    print(f"❌ Метод 3 не сработал: {e3}")
+                                    print(f"📄 Первые 200 байт как текст: {repr(raw_content[:200])}")
+                    else:
+                        print(f"❌ Неожиданный content-type: {content_type}")
+                        print(f"📄 Первые 200 символов: {api_response.text[:200]}")
                         
-                    except Exception as e:
-                        print(f"❌ Общая ошибка декодирования: {e}")
-                        return None
-                else:
-                    print(f"❌ CloudScraper API ошибка: {api_response.status_code}")
-                    
-                    # Выводим заголовки ответа для диагностики
-                    print("📋 Заголовки ответа:")
-                    for key, value in api_response.headers.items():
-                        if key.lower() in ['cf-ray', 'server', 'cf-cache-status', 'content-type', 'content-encoding']:
-                            print(f"   {key}: {value}")
-                    
-                    print(f"📄 Ответ: {api_response.text[:300]}")
                     return None
                     
-            except Exception as e:
-                print(f"💥 CloudScraper исключение: {e}")
-                import traceback
-                traceback.print_exc()
+                except Exception as e:
+                    print(f"❌ Общая ошибка декодирования: {e}")
+                    return None
+            else:
+                print(f"❌ CloudScraper API ошибка: {api_response.status_code}")
+                
+                # Выводим заголовки ответа для диагностики
+                print("📋 Заголовки ответа:")
+                for key, value in api_response.headers.items():
+                    if key.lower() in ['cf-ray', 'server', 'cf-cache-status', 'content-type', 'content-encoding']:
+                        print(f"   {key}: {value}")
+                
+                print(f"📄 Ответ: {api_response.text[:300]}")
                 return None
-        
-        # Запускаем CloudScraper в отдельном потоке с timeout
-        loop = asyncio.get_event_loop()
-        try:
-            return await asyncio.wait_for(
-                loop.run_in_executor(None, cloudscraper_sync, riot_id, tagline),
-                timeout=30.0  # 30 секунд timeout
-            )
-        except asyncio.TimeoutError:
-            print("⏰ CloudScraper timeout - операция заняла более 30 секунд")
+                
+        except ScraperCancelled:
+            raise
+        except cloudscraper.exceptions.CloudflareException as e:
+            print(f"🛡️ CloudScraper не прошел проверку Cloudflare: {e}")
+            egress.challenged = True
             return None
         except Exception as e:
-            print(f"💥 CloudScraper executor ошибка: {e}")
+            print(f"💥 CloudScraper исключение: {e}")
+            # Ошибка соединения или прокси - пул снизит оценку сессии
+            egress.errored = True
+            import traceback
+            traceback.print_exc()
             return None
     
     def extract_current_season_stats(self, profile_data: Dict, current_rank: str = None) -> Dict:
@@ -644,43 +823,38 @@ class TrackerGGAPI:
     
     def _determine_main_role(self, agents: List[Dict]) -> str:
         """Определить основную роль игрока"""
-        if not agents:
-            return "Unknown"
-            
-        role_games = {}
-        for agent in agents:
-            role = agent.get('role', 'Unknown')
-            games = agent.get('matches_played', 0)
-            role_games[role] = role_games.get(role, 0) + games
-            
-        return max(role_games, key=role_games.get) if role_games else "Unknown"
+        return determine_main_role(agents)
     
     def _analyze_play_style(self, season_stats: Dict, clutch_stats: Dict) -> str:
         """Анализ стиля игры"""
-        if not season_stats:
-            return "Unknown"
-            
-        kd = season_stats.get('kd_ratio', 0) or 0
-        clutch_rate = clutch_stats.get('clutch_percentage', 0) or 0
-        headshot_pct = season_stats.get('headshot_percentage', 0) or 0
-        
-        if clutch_rate > 60:
-            return "🔥 Clutch God"
-        elif kd > 1.3 and headshot_pct > 25:
-            return "🎯 Precision Killer"  
-        elif kd > 1.1:
-            return "⚔️ Aggressive Fragger"
-        elif clutch_rate > 40:
-            return "🧠 Clutch Player"
-        elif headshot_pct > 30:
-            return "🔫 Aim Master"
-        else:
-            return "🎮 Balanced Player"
+        return analyze_play_style(season_stats, clutch_stats)
     
     async def close(self):
         """Закрыть все клиенты"""
         await self.client.aclose()
 
+
+_tracker: Optional[TrackerGGAPI] = None
+
+
+def get_tracker_client() -> TrackerGGAPI:
+    """Общий для процесса клиент tracker.gg: одно httpx-соединение на все запросы"""
+    global _tracker
+    if _tracker is None:
+        _tracker = TrackerGGAPI()
+    return _tracker
+
+
+async def close_tracker_client():
+    """Закрыть клиент tracker.gg вместе с фоновым обновлением clearance и пулом CloudScraper"""
+    global _tracker
+    # Задача обновления ставит работу в пул, поэтому останавливается первой
+    await stop_refresh_task()
+    if _tracker is not None:
+        await _tracker.close()
+        _tracker = None
+    close_scraper_pool()
+
 # Тестирование с CloudScraper
 async def test_cloudscraper():
     """Тест CloudScraper интеграции"""
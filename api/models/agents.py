@@ -43,3 +43,10 @@ def get_agent_name(agent_id: str) -> str:
 def get_agent_role(agent_id: str) -> str:
     """Получить роль агента по ID"""
     return get_agent_info(agent_id)["role"]
+
+def get_agent_role_by_name(agent_name: str) -> str:
+    """Получить роль агента по имени (Henrik отдает агента именем, а не ID)"""
+    for agent in VALORANT_AGENTS.values():
+        if agent["name"].lower() == (agent_name or "").lower():
+            return agent["role"]
+    return "Unknown"
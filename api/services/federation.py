@@ -0,0 +1,128 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from decouple import config
+
+from api.clients.deadline import Deadline
+from api.clients.henrik_client import get_henrik_client
+from api.clients.trackerggapi import get_tracker_client
+from api.models.player import Player
+from api.services.history import local_stats
+
+# Сколько ждать каждый источник; опоздавший не задерживает карточку
+SOURCE_DEADLINES = {
+    'henrik': config('FEDERATION_HENRIK_DEADLINE', default=3.0, cast=float),
+    'tracker': config('FEDERATION_TRACKER_DEADLINE', default=15.0, cast=float),
+}
+
+# Порядок источников для поля: берется первое непустое значение.
+# Ранг, RR, уровень и регион у Henrik точнее и свежее, пиковый ранг у tracker.gg - за все время
+FIELD_PRIORITY = {
+    'region': ('henrik', 'tracker'),
+    'account_level': ('henrik', 'tracker'),
+    'current_rank': ('henrik', 'tracker'),
+    'current_rr': ('henrik', 'tracker'),
+    'peak_rank': ('tracker', 'henrik'),
+}
+DEFAULT_PRIORITY = ('tracker', 'henrik')
+
+EMPTY_VALUES = (None, '', 'N/A')
+
+
+def henrik_stats(player: Player) -> Dict:
+    """Поля enhanced_stats, которые можно заполнить из аккаунта и MMR Henrik"""
+    stats = {
+        'riot_id': player.name,
+        'tagline': player.tag,
+        'region': player.region,
+        'account_level': player.account_level,
+    }
+    rank_info = player.rank_info
+    if rank_info and rank_info.current_data:
+        stats['current_rank'] = rank_info.current_data.currenttierpatched
+        stats['current_rr'] = rank_info.current_data.ranking_in_tier
+    if rank_info and rank_info.highest_rank:
+        stats['peak_rank'] = rank_info.highest_rank.patched_tier
+    return stats
+
+
+def merge_stats(results: Dict[str, Dict]) -> Dict:
+    """Слить ответы источников по FIELD_PRIORITY"""
+    merged = {}
+    keys = {key for data in results.values() for key in data}
+    for key in keys:
+        for source in FIELD_PRIORITY.get(key, DEFAULT_PRIORITY):
+            value = results.get(source, {}).get(key)
+            if value not in EMPTY_VALUES:
+                merged[key] = value
+                break
+        else:
+            # Все источники вернули пустое значение - сохраняем его как есть
+            merged[key] = next(data[key] for data in results.values() if key in data)
+    return merged
+
+
+async def _fetch_henrik(riot_id: str, tagline: str, deadline: Optional[Deadline]) -> Optional[Dict]:
+    client = get_henrik_client()
+    if client is None:
+        return None
+    player, error = await client.get_full_player_info(riot_id, tagline)
+    if error or not player:
+        print(f"⚠️ Henrik: {riot_id}#{tagline} - {error}")
+        return None
+    stats = henrik_stats(player)
+    # Тренд RR и прочее из накопленной истории - по puuid, который знает только Henrik
+    stats.update(await local_stats(player.puuid, player.name, player.tag, player.region))
+    return stats
+
+
+async def _fetch_tracker(riot_id: str, tagline: str, deadline: Optional[Deadline]) -> Optional[Dict]:
+    # Дедлайн уходит внутрь, чтобы остановить и потоки CloudScraper, а не только корутину.
+    # Сводка для подписи строится из того же ответа - отдельный запрос за ней не нужен
+    return await get_tracker_client().get_enhanced_player_stats(riot_id, tagline, deadline=deadline, with_summary=True)
+
+
+SOURCES: Dict[str, Callable[[str, str, Optional[Deadline]], Awaitable[Optional[Dict]]]] = {
+    'henrik': _fetch_henrik,
+    'tracker': _fetch_tracker,
+}
+
+
+async def _run_source(name: str, riot_id: str, tagline: str,
+                      deadline: Optional[Deadline]) -> Tuple[str, str, Optional[Dict]]:
+    started = time.monotonic()
+    timeout = SOURCE_DEADLINES[name] if deadline is None else deadline.timeout(SOURCE_DEADLINES[name])
+    if timeout <= 0:
+        return name, 'timeout', None
+    try:
+        data = await asyncio.wait_for(SOURCES[name](riot_id, tagline, deadline), timeout)
+    except asyncio.TimeoutError:
+        print(f"⏱️ {name}: нет ответа за {timeout:.1f}s")
+        return name, 'timeout', None
+    except Exception as e:
+        print(f"❌ {name}: {e}")
+        return name, 'error', None
+    status = 'ok' if data else 'empty'
+    print(f"📡 {name}: {status} за {time.monotonic() - started:.2f}s")
+    return name, status, data
+
+
+async def fetch_profile_stats(riot_id: str, tagline: str, deadline: Optional[Deadline] = None) -> Optional[Dict]:
+    """Статистика для карточки из всех источников параллельно.
+
+    Каждый источник ограничен своим дедлайном и общим deadline запроса;
+    карточка собирается из того, что успело прийти. В 'sources' - статус
+    каждого источника (ok, empty, timeout, error). None, если данных нет ни
+    от одного источника.
+    """
+    outcomes = await asyncio.gather(*(_run_source(name, riot_id, tagline, deadline) for name in SOURCES))
+    results = {name: data for name, _, data in outcomes if data}
+    if not results:
+        return None
+
+    stats = merge_stats(results)
+    stats.setdefault('riot_id', riot_id)
+    stats.setdefault('tagline', tagline)
+    stats['sources'] = {name: status for name, status, _ in outcomes}
+    return stats
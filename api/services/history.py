@@ -0,0 +1,84 @@
+import asyncio
+import time
+from typing import Dict, Optional, Set
+
+from decouple import config
+
+from api.analytics.stats_engine import StatsEngine
+from api.clients.cache import TTLCache
+from api.clients.henrik_client import get_henrik_client
+from api.storage.columnar import get_columnar_archive
+from api.storage.ingest import MatchIngestor, MMRHistoryIngestor
+from api.storage.match_store import get_match_store
+from api.storage.mmr_series import DAY, get_mmr_series_store
+
+# Дозагрузка истории игрока не чаще раза в интервал (секунд)
+HISTORY_REFRESH_INTERVAL = config('HISTORY_REFRESH_INTERVAL', default=300.0, cast=float)
+# За сколько дней считать изменение RR в сводке
+RR_TREND_DAYS = config('RR_TREND_DAYS', default=7, cast=int)
+# Сколько матчей нужно в локальной истории, чтобы строить по ней сводку
+HISTORY_MIN_MATCHES = config('HISTORY_MIN_MATCHES', default=5, cast=int)
+
+_refreshed = TTLCache(maxsize=10000, ttl=HISTORY_REFRESH_INTERVAL)
+_tasks: Set[asyncio.Task] = set()
+
+
+async def refresh_history(puuid: str, name: str, tag: str, region: str):
+    """Дозагрузить локальную историю игрока с фоновым приоритетом Henrik"""
+    client = get_henrik_client()
+    if client is None:
+        return
+    store = get_match_store()
+    await MatchIngestor(client, store).refresh_player(name, tag, region)
+    # Сводка читает колоночный архив: переносим в него новые матчи
+    await asyncio.to_thread(get_columnar_archive().sync_from_store, store, puuid)
+    await MMRHistoryIngestor(client, get_mmr_series_store()).refresh_player(puuid, name, tag, region)
+
+
+def _finished(task: asyncio.Task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️ Дозагрузка истории: {task.exception()!r}")
+
+
+def schedule_refresh(puuid: str, name: str, tag: str, region: str):
+    """Запустить дозагрузку в фоне: карточку она не задерживает, новые данные увидит следующий запрос"""
+    if puuid in _refreshed:
+        return
+    _refreshed.set(puuid, True)
+    task = asyncio.ensure_future(refresh_history(puuid, name, tag, region))
+    _tasks.add(task)
+    task.add_done_callback(_finished)
+
+
+def rr_trend(puuid: str) -> Optional[Dict]:
+    """Изменение RR за последние RR_TREND_DAYS дней по сохраненному ряду"""
+    series = get_mmr_series_store().load(puuid)
+    if not len(series):
+        return None
+    trend = series.trend(since=int(time.time()) - RR_TREND_DAYS * DAY)
+    if not trend['games']:
+        return None
+    trend['days'] = RR_TREND_DAYS
+    return trend
+
+
+def history_summary(puuid: str, riot_id: str, region: str) -> Optional[Dict]:
+    """Сводка текущего сезона по архиву матчей в формате get_player_summary"""
+    arrays = get_columnar_archive().open(puuid)
+    if len(arrays) < HISTORY_MIN_MATCHES:
+        return None
+    return StatsEngine().summarize(arrays, riot_id=riot_id, region=region)
+
+
+async def local_stats(puuid: str, name: str, tag: str, region: str) -> Dict:
+    """Поля статистики из локальной истории игрока; заодно запускает ее дозагрузку"""
+    schedule_refresh(puuid, name, tag, region)
+    stats = {}
+    trend = await asyncio.to_thread(rr_trend, puuid)
+    if trend:
+        stats['rr_trend'] = trend
+    summary = await asyncio.to_thread(history_summary, puuid, f"{name}#{tag}", region)
+    if summary:
+        stats['history_summary'] = summary
+    return stats
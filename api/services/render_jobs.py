@@ -0,0 +1,196 @@
+import asyncio
+import base64
+import json
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from decouple import config
+
+from api.clients.deadline import Deadline, DeadlineExceeded
+from api.clients.henrik_client import get_henrik_client
+from api.clients.trackerggapi import close_tracker_client
+from api.services.federation import fetch_profile_stats
+from utils.browser_pool import get_browser_pool
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis нужен только для распределенного режима
+    aioredis = None
+
+JOBS_KEY = config('RENDER_JOBS_KEY', default='render:jobs')
+RESULT_PREFIX = 'render:result:'
+# Сколько хранится неполученный результат (бот мог уже сдаться)
+RESULT_TTL = 120
+# Часть бюджета запроса, которую сбор статистики оставляет рендеру
+RENDER_RESERVE = config('RENDER_RESERVE', default=10.0, cast=float)
+
+
+def start_stats_fetch(riot_id: str, tagline: str, deadline: Optional[Deadline] = None) -> asyncio.Task:
+    """Запустить сбор статистики в фоне, оставив рендеру RENDER_RESERVE"""
+    return asyncio.ensure_future(
+        fetch_profile_stats(riot_id, tagline, deadline.shrink(RENDER_RESERVE) if deadline else None)
+    )
+
+
+async def _notify_stats(stats_task: asyncio.Task, on_stats: Callable[[Dict], Awaitable]):
+    try:
+        stats = await stats_task
+    except Exception:
+        return
+    if stats:
+        await on_stats(stats)
+
+
+async def render_profile_card(riot_id: str, tagline: str, deadline: Optional[Deadline] = None,
+                              on_stats: Optional[Callable[[Dict], Awaitable]] = None) -> Optional[Dict]:
+    """Весь конвейер карточки: статистика из источников и рендер.
+
+    Сбор статистики и подготовка браузера идут параллельно. on_stats
+    вызывается с данными, как только они пришли, - до конца рендера.
+    Возвращает {'image': PNG-байты, 'stats': данные карточки} или None.
+    """
+    import utils.card_generator as CardGen
+
+    stats_task = start_stats_fetch(riot_id, tagline, deadline)
+    notify = asyncio.ensure_future(_notify_stats(stats_task, on_stats)) if on_stats else None
+    try:
+        image = await CardGen.generate_profile_card_pipelined(stats_task, riot_id, tagline, deadline)
+    finally:
+        for task in (stats_task, notify):
+            if task is not None and not task.done():
+                task.cancel()
+    if not image:
+        return None
+    return {'image': image, 'stats': stats_task.result()}
+
+
+class LocalRenderBackend:
+    """Рендер в процессе бота - заменитель сервиса для запуска в одном процессе"""
+
+    async def submit(self, riot_id: str, tagline: str, deadline: Deadline,
+                     on_stats: Optional[Callable[[Dict], Awaitable]] = None) -> Optional[Dict]:
+        return await deadline.run(render_profile_card(riot_id, tagline, deadline, on_stats), stage='render')
+
+    async def close(self):
+        pass
+
+
+class RedisRenderBackend:
+    """Задачи рендера через Redis-совместимое хранилище.
+
+    Бот кладет задачу в список JOBS_KEY и ждет ответы в собственном списке
+    render:result:<id>. Воркеры (python -m api.services.render_jobs) забирают
+    задачи, пропускают те, чей дедлайн уже прошел, сами собирают статистику
+    параллельно с подготовкой браузера и публикуют сначала статистику
+    (kind='stats'), затем результат (kind='result').
+    """
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("Для RENDER_BACKEND=redis установите пакет redis")
+        self.redis = aioredis.from_url(url)
+
+    async def submit(self, riot_id: str, tagline: str, deadline: Deadline,
+                     on_stats: Optional[Callable[[Dict], Awaitable]] = None) -> Optional[Dict]:
+        job_id = uuid.uuid4().hex
+        # Между процессами дедлайн передается как время по часам, а не monotonic
+        job = {'id': job_id, 'riot_id': riot_id, 'tagline': tagline,
+               'deadline': time.time() + deadline.remaining(), 'notify': on_stats is not None}
+        await self.redis.lpush(JOBS_KEY, json.dumps(job, ensure_ascii=False))
+
+        while True:
+            reply = await self.redis.brpop(f"{RESULT_PREFIX}{job_id}", timeout=deadline.request_timeout())
+            if reply is None:
+                raise DeadlineExceeded("Сервис рендера не ответил до дедлайна")
+            message = json.loads(reply[1])
+            if message.get('kind') == 'stats':
+                if on_stats is not None:
+                    await on_stats(message['stats'])
+                continue
+            if not message.get('image'):
+                return None
+            return {'image': base64.b64decode(message['image']), 'stats': message.get('stats') or {}}
+
+    async def next_job(self, poll_timeout: int = 5) -> Optional[Dict]:
+        item = await self.redis.brpop(JOBS_KEY, timeout=poll_timeout)
+        return json.loads(item[1]) if item else None
+
+    async def _push(self, job_id: str, message: Dict):
+        key = f"{RESULT_PREFIX}{job_id}"
+        await self.redis.lpush(key, json.dumps(message, ensure_ascii=False, default=str))
+        await self.redis.expire(key, RESULT_TTL)
+
+    async def publish_stats(self, job_id: str, stats: Dict):
+        await self._push(job_id, {'kind': 'stats', 'stats': stats})
+
+    async def publish(self, job_id: str, result: Optional[Dict]):
+        message = {'kind': 'result', 'image': None, 'stats': None}
+        if result:
+            message.update(image=base64.b64encode(result['image']).decode('ascii'), stats=result['stats'])
+        await self._push(job_id, message)
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+_backend = None
+
+
+def get_render_backend():
+    """Бэкенд рендера по RENDER_BACKEND: local (по умолчанию) или redis"""
+    global _backend
+    if _backend is None:
+        if config('RENDER_BACKEND', default='local') == 'redis':
+            _backend = RedisRenderBackend(config('REDIS_URL', default='redis://localhost:6379/0'))
+        else:
+            _backend = LocalRenderBackend()
+    return _backend
+
+
+async def run_render_worker(concurrency: int, poll_timeout: int = 5):
+    """Воркер сервиса рендера: concurrency задач одновременно"""
+    backend = get_render_backend()
+    if not isinstance(backend, RedisRenderBackend):
+        raise RuntimeError("Отдельный воркер рендера работает только с RENDER_BACKEND=redis")
+
+    async def loop(index: int):
+        while True:
+            job = await backend.next_job(poll_timeout)
+            if job is None:
+                continue
+            remaining = job['deadline'] - time.time()
+            if remaining <= 0:
+                print(f"⏭️ Рендер {job['riot_id']}#{job['tagline']}: дедлайн истек в очереди")
+                continue
+            deadline = Deadline(remaining)
+            on_stats = None
+            if job.get('notify'):
+                on_stats = lambda stats, job_id=job['id']: backend.publish_stats(job_id, stats)
+            try:
+                result = await deadline.run(
+                    render_profile_card(job['riot_id'], job['tagline'], deadline, on_stats),
+                    stage='render',
+                )
+            except asyncio.TimeoutError:
+                print(f"⏱️ Рендер {job['riot_id']}#{job['tagline']}: не уложились в дедлайн")
+                continue
+            except Exception as e:
+                print(f"❌ Рендер {job['riot_id']}#{job['tagline']}: {e}")
+                result = None
+            await backend.publish(job['id'], result)
+
+    print(f"🖼️ Воркер рендера запущен, параллельность {concurrency}")
+    try:
+        await asyncio.gather(*(loop(i) for i in range(concurrency)))
+    finally:
+        await get_browser_pool().close()
+        await backend.close()
+        henrik = get_henrik_client()
+        if henrik is not None:
+            await henrik.close()
+        await close_tracker_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_render_worker(config('RENDER_WORKER_CONCURRENCY', default=2, cast=int)))
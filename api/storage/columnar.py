@@ -0,0 +1,105 @@
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from decouple import config
+
+from api.analytics.stats_engine import CATEGORICAL_COLUMNS, NUMERIC_COLUMNS, LazyColumns, MatchArrays
+from api.storage.files import append_columns, player_dir, read_json, read_meta, write_json, write_meta
+
+# Фиксированная ширина каждой колонки на диске (little-endian)
+COLUMN_DTYPES = {name: np.dtype(dtype).newbyteorder('<') for name, dtype in NUMERIC_COLUMNS.items()}
+COLUMN_DTYPES.update({name: np.dtype('<i4') for name in CATEGORICAL_COLUMNS})
+EMPTY_META = {'rows': 0, 'last_started_at': 0}
+
+
+class ColumnarArchive:
+    """Колоночный архив матчей игроков на диске, читаемый через np.memmap.
+
+    Для каждого игрока - каталог с файлом на колонку фиксированной ширины,
+    словарем строковых значений (агенты, карты, сезоны) и meta.json с числом
+    зафиксированных строк. Добавление дописывает хвосты файлов и только потом
+    обновляет meta.json, поэтому прерванная запись не видна читателям.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def row_count(self, puuid: str) -> int:
+        return read_meta(player_dir(self.root, puuid), EMPTY_META)['rows']
+
+    def last_started_at(self, puuid: str) -> int:
+        return read_meta(player_dir(self.root, puuid), EMPTY_META).get('last_started_at', 0)
+
+    def open(self, puuid: str) -> MatchArrays:
+        """Открыть архив игрока без копирования: колонки отображаются в память при первом обращении"""
+        directory = player_dir(self.root, puuid)
+        rows = read_meta(directory, EMPTY_META)['rows']
+        dictionaries = read_json(os.path.join(directory, 'dictionary.json'), {})
+        dictionaries = {name: dictionaries.get(name, []) for name in CATEGORICAL_COLUMNS}
+
+        def load(name: str) -> np.ndarray:
+            dtype = COLUMN_DTYPES[name]
+            if rows == 0:
+                return np.zeros(0, dtype=dtype)
+            return np.memmap(os.path.join(directory, f"{name}.bin"), dtype=dtype, mode='r', shape=(rows,))
+
+        return MatchArrays(LazyColumns(COLUMN_DTYPES, load), dictionaries)
+
+    def append_rows(self, puuid: str, rows: Sequence[Dict]) -> int:
+        """Дописать строки player_matches в архив. Возвращает число добавленных строк.
+
+        Строки старше последней сохраненной пропускаются, чтобы архив оставался
+        упорядоченным по времени.
+        """
+        directory = player_dir(self.root, puuid)
+        os.makedirs(directory, exist_ok=True)
+        meta = read_meta(directory, EMPTY_META)
+        last_started_at = meta.get('last_started_at', 0)
+        rows = sorted((row for row in rows if (row.get('started_at') or 0) > last_started_at),
+                      key=lambda row: row.get('started_at') or 0)
+        if not rows:
+            return 0
+
+        dictionary_path = os.path.join(directory, 'dictionary.json')
+        dictionaries: Dict[str, List[str]] = read_json(dictionary_path, {})
+        columns = {}
+        for name in CATEGORICAL_COLUMNS:
+            labels = dictionaries.setdefault(name, [])
+            index = {label: code for code, label in enumerate(labels)}
+            codes = []
+            for row in rows:
+                label = row.get(name) or ''
+                if label not in index:
+                    index[label] = len(labels)
+                    labels.append(label)
+                codes.append(index[label])
+            columns[name] = np.asarray(codes, dtype=COLUMN_DTYPES[name])
+        for name in NUMERIC_COLUMNS:
+            columns[name] = np.asarray([row.get(name) or 0 for row in rows], dtype=COLUMN_DTYPES[name])
+
+        append_columns(directory, columns, meta['rows'])
+        write_json(dictionary_path, dictionaries)
+        write_meta(directory, {
+            'rows': meta['rows'] + len(rows),
+            'last_started_at': int(columns['started_at'][-1]),
+        })
+        return len(rows)
+
+    def sync_from_store(self, store, puuid: str) -> int:
+        """Дописать в архив матчи из MatchStore, которых в нем еще нет"""
+        since = self.last_started_at(puuid)
+        rows = store.player_matches(puuid, since=since + 1 if since else None)
+        return self.append_rows(puuid, rows)
+
+
+_archive: Optional[ColumnarArchive] = None
+
+
+def get_columnar_archive() -> ColumnarArchive:
+    """Общий для процесса колоночный архив"""
+    global _archive
+    if _archive is None:
+        _archive = ColumnarArchive(config('MATCH_ARCHIVE_DIR', default='temp/match_archive'))
+    return _archive
@@ -0,0 +1,49 @@
+import json
+import os
+import re
+from typing import Dict
+
+import numpy as np
+
+
+def player_dir(root: str, puuid: str) -> str:
+    """Каталог игрока в файловом хранилище: puuid без небезопасных для пути символов"""
+    return os.path.join(root, re.sub(r'[^A-Za-z0-9_-]', '_', puuid))
+
+
+def read_json(path: str, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def write_json(path: str, data):
+    """Атомарная запись: читатель видит либо старый файл, либо новый целиком"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_meta(directory: str, default: Dict) -> Dict:
+    return read_json(os.path.join(directory, 'meta.json'), default)
+
+
+def write_meta(directory: str, meta: Dict):
+    write_json(os.path.join(directory, 'meta.json'), meta)
+
+
+def append_columns(directory: str, columns: Dict[str, np.ndarray], committed: int, prefix: str = ''):
+    """Дописать значения колонок в файлы <prefix><name>.bin после committed зафиксированных строк.
+
+    Хвост незавершенной прошлой записи отрезается. Новые строки становятся
+    видны читателям, только когда вызывающий обновит meta.json.
+    """
+    for name, values in columns.items():
+        path = os.path.join(directory, f"{prefix}{name}.bin")
+        with open(path, 'r+b' if os.path.exists(path) else 'w+b') as f:
+            f.truncate(committed * values.dtype.itemsize)
+            f.seek(committed * values.dtype.itemsize)
+            f.write(values.tobytes())
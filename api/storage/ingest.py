@@ -0,0 +1,176 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from api.clients.henrik_client import HenrikAPIClient, parse_timestamp
+from api.clients.rate_limit import Priority
+from api.storage.match_store import MatchStore, parse_match
+from api.storage.mmr_series import MMRSeriesStore, parse_mmr_point
+
+
+class MatchIngestor:
+    """Инкрементальная загрузка истории матчей игрока в MatchStore.
+
+    Сначала запрашиваются несколько последних матчей: если среди них есть уже
+    сохраненный, обновление стоит одного маленького запроса. Иначе догружается
+    пачка и сохраняются только матчи новее последнего сохраненного. Если и
+    пачка не дошла до сохраненного матча, промежуток дочитывается по
+    v1/lifetime/matches с деталями через get_matches. Если дойти до
+    сохраненного матча не удалось, ничего не сохраняется - следующее
+    обновление повторит попытку вместо того, чтобы оставить дыру.
+
+    В режиме streaming список матчей разбирается потоково и сохраняется только
+    строка запрошенного игрока - меньше памяти и CPU, но без строк остальных
+    участников матча.
+    """
+
+    def __init__(self, client: HenrikAPIClient, store: MatchStore, probe_size: int = 3,
+                 batch_size: int = 10, mode: Optional[str] = 'competitive', streaming: bool = False):
+        self.client = client
+        self.store = store
+        self.probe_size = probe_size
+        self.batch_size = batch_size
+        self.mode = mode
+        self.streaming = streaming
+
+    @staticmethod
+    def _find_puuid(player_rows: List[Dict], name: str, tag: str) -> Optional[str]:
+        name, tag = name.lower(), tag.lower()
+        for row in player_rows:
+            if (row.get('name') or '').lower() == name and (row.get('tag') or '').lower() == tag:
+                return row.get('puuid')
+        return None
+
+    async def _fetch(self, name: str, tag: str, region: str, size: int, priority: int) -> Optional[List[Dict]]:
+        """Матчи от новых к старым в виде {'match': строка matches, 'players': строки player_matches}"""
+        if self.streaming:
+            views, error = await self.client.get_matchlist_player(
+                name, tag, region, size=size, mode=self.mode, priority=priority
+            )
+            entries = [{'match': view['match'], 'players': [view['player']]} for view in views or ()]
+        else:
+            response, error = await self.client.get_matchlist(name, tag, region, size=size, mode=self.mode, priority=priority)
+            entries = []
+            for match in (response or {}).get('data') or ():
+                match_row, player_rows = parse_match(match)
+                entries.append({'match': match_row, 'players': player_rows})
+        if error or not entries:
+            if error:
+                print(f"⚠️ Не удалось получить матчи {name}#{tag}: {error}")
+            return None
+        return sorted(entries, key=lambda entry: entry['match']['started_at'], reverse=True)
+
+    def _entry(self, match: Dict, puuid: str) -> Dict:
+        match_row, player_rows = parse_match(match)
+        if self.streaming:
+            player_rows = [row for row in player_rows if row.get('puuid') == puuid]
+        return {'match': match_row, 'players': player_rows}
+
+    async def _fetch_gap(self, name: str, tag: str, region: str, state: Dict, puuid: str,
+                         seen: set, priority: int) -> Optional[List[Dict]]:
+        """Матчи старше пачки и новее сохраненного. None - до сохраненного матча дойти не удалось"""
+        last_started_at = state['last_started_at'] or 0
+        match_ids, reached = [], False
+        async for item in self.client.iter_matches(name, tag, region, since=last_started_at,
+                                                   mode=self.mode, priority=priority):
+            meta = item.get('meta') or {}
+            match_id = meta.get('id')
+            if match_id == state['last_match_id'] or parse_timestamp(meta.get('started_at')) <= last_started_at:
+                reached = True
+                break
+            if match_id and match_id not in seen:
+                match_ids.append(match_id)
+        if not reached:
+            return None
+
+        documents = await self.client.get_matches(match_ids, priority=priority)
+        entries = []
+        for match_id in match_ids:
+            document = documents.get(match_id)
+            if not document:
+                print(f"⚠️ Не удалось получить матч {match_id} игрока {name}#{tag}")
+                return None
+            entries.append(self._entry(document.get('data') or document, puuid))
+        return entries
+
+    async def refresh_player(self, name: str, tag: str, region: str,
+                             priority: int = Priority.BACKGROUND) -> int:
+        """Догрузить новые матчи игрока. Возвращает число сохраненных матчей"""
+        entries = await self._fetch(name, tag, region, self.probe_size, priority)
+        if not entries:
+            return 0
+
+        puuid = self._find_puuid(entries[0]['players'], name, tag)
+        if not puuid:
+            print(f"⚠️ Игрок {name}#{tag} не найден в матче {entries[0]['match']['match_id']}")
+            return 0
+
+        state = await asyncio.to_thread(self.store.get_ingest_state, puuid)
+        newest = entries[0]['match']
+        if state and state['last_match_id'] == newest['match_id']:
+            return 0
+
+        probe_ids = {entry['match']['match_id'] for entry in entries}
+        requested = self.probe_size
+        if self.batch_size > self.probe_size and not (state and state['last_match_id'] in probe_ids):
+            batch = await self._fetch(name, tag, region, self.batch_size, priority)
+            if batch:
+                entries = batch
+                requested = self.batch_size
+                newest = entries[0]['match']
+
+        new_entries = []
+        # Без состояния догонять нечего; короткий ответ - это вся история игрока
+        reached = not state or len(entries) < requested
+        for entry in entries:
+            match_row = entry['match']
+            if not match_row['match_id']:
+                continue
+            if state and (match_row['match_id'] == state['last_match_id']
+                          or match_row['started_at'] <= (state['last_started_at'] or 0)):
+                reached = True
+                break
+            new_entries.append(entry)
+
+        if not reached:
+            gap = await self._fetch_gap(name, tag, region, state, puuid,
+                                        {entry['match']['match_id'] for entry in new_entries}, priority)
+            if gap is None:
+                # Ничего не сохраняем: история игрока остается непрерывной, следующее обновление повторит попытку
+                print(f"⚠️ {name}#{tag}: не удалось дочитать историю до последнего сохраненного матча")
+                return 0
+            new_entries.extend(gap)
+
+        if new_entries:
+            await asyncio.to_thread(
+                self.store.add_parsed,
+                [entry['match'] for entry in new_entries],
+                [row for entry in new_entries for row in entry['players']],
+            )
+        await asyncio.to_thread(self.store.set_ingest_state, puuid, newest['match_id'], newest['started_at'])
+        print(f"📥 {name}#{tag}: сохранено новых матчей {len(new_entries)}")
+        return len(new_entries)
+
+
+class MMRHistoryIngestor:
+    """Дозагрузка истории RR игрока в MMRSeriesStore: страницы читаются только до последней сохраненной точки"""
+
+    def __init__(self, client: HenrikAPIClient, store: MMRSeriesStore, page_size: int = 20):
+        self.client = client
+        self.store = store
+        self.page_size = page_size
+
+    async def refresh_player(self, puuid: str, name: str, tag: str, region: str,
+                             priority: int = Priority.BACKGROUND) -> int:
+        """Дописать новые точки RR. Возвращает число сохраненных точек"""
+        last_timestamp = await asyncio.to_thread(self.store.last_timestamp, puuid)
+        points = []
+        async for item in self.client.iter_mmr_history(name, tag, region, since=last_timestamp + 1 if last_timestamp else None,
+                                                       page_size=self.page_size, priority=priority):
+            point = parse_mmr_point(item)
+            if point:
+                points.append(point)
+
+        added = await asyncio.to_thread(self.store.append, puuid, points) if points else 0
+        if added:
+            print(f"📈 {name}#{tag}: сохранено точек RR {added}")
+        return added
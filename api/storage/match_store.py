@@ -0,0 +1,281 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from decouple import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    match_id      TEXT PRIMARY KEY,
+    started_at    INTEGER NOT NULL,
+    map           TEXT,
+    mode          TEXT,
+    queue         TEXT,
+    season_id     TEXT,
+    region        TEXT,
+    rounds_played INTEGER,
+    game_length   INTEGER,
+    red_rounds    INTEGER,
+    blue_rounds   INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS player_matches (
+    puuid          TEXT NOT NULL,
+    match_id       TEXT NOT NULL,
+    started_at     INTEGER NOT NULL,
+    name           TEXT,
+    tag            TEXT,
+    map            TEXT,
+    mode           TEXT,
+    season_id      TEXT,
+    agent          TEXT,
+    team           TEXT,
+    tier           INTEGER,
+    won            INTEGER,
+    rounds_played  INTEGER,
+    rounds_won     INTEGER,
+    score          INTEGER,
+    kills          INTEGER,
+    deaths         INTEGER,
+    assists        INTEGER,
+    headshots      INTEGER,
+    bodyshots      INTEGER,
+    legshots       INTEGER,
+    damage_made    INTEGER,
+    attack_kills   INTEGER,
+    attack_deaths  INTEGER,
+    defense_kills  INTEGER,
+    defense_deaths INTEGER,
+    PRIMARY KEY (puuid, match_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_matches_started ON matches (started_at);
+CREATE INDEX IF NOT EXISTS idx_pm_puuid_started ON player_matches (puuid, started_at DESC);
+CREATE INDEX IF NOT EXISTS idx_pm_puuid_map ON player_matches (puuid, map);
+CREATE INDEX IF NOT EXISTS idx_pm_puuid_agent ON player_matches (puuid, agent);
+CREATE INDEX IF NOT EXISTS idx_pm_match ON player_matches (match_id);
+
+CREATE TABLE IF NOT EXISTS ingest_state (
+    puuid           TEXT PRIMARY KEY,
+    last_match_id   TEXT,
+    last_started_at INTEGER,
+    updated_at      INTEGER
+);
+"""
+
+PLAYER_COLUMNS = (
+    'puuid', 'match_id', 'started_at', 'name', 'tag', 'map', 'mode', 'season_id',
+    'agent', 'team', 'tier', 'won', 'rounds_played', 'rounds_won', 'score',
+    'kills', 'deaths', 'assists', 'headshots', 'bodyshots', 'legshots', 'damage_made',
+    'attack_kills', 'attack_deaths', 'defense_kills', 'defense_deaths',
+)
+
+MATCH_COLUMNS = (
+    'match_id', 'started_at', 'map', 'mode', 'queue', 'season_id', 'region',
+    'rounds_played', 'game_length', 'red_rounds', 'blue_rounds',
+)
+
+
+def attacking_team(round_index: int) -> str:
+    """Атакующая команда в раунде: Red атакует первую половину, в овертайме стороны меняются каждый раунд"""
+    if round_index < 12:
+        return 'Red'
+    if round_index < 24:
+        return 'Blue'
+    return 'Red' if (round_index - 24) % 2 == 0 else 'Blue'
+
+
+def parse_match_row(match: Dict) -> Dict:
+    """Строка таблицы matches из документа матча Henrik (v2/match, v3/matches)"""
+    metadata = match.get('metadata', {})
+    teams = match.get('teams') or {}
+    return {
+        'match_id': metadata.get('matchid'),
+        'started_at': int(metadata.get('game_start') or 0),
+        'map': metadata.get('map'),
+        'mode': metadata.get('mode'),
+        'queue': metadata.get('queue'),
+        'season_id': metadata.get('season_id'),
+        'region': metadata.get('region'),
+        'rounds_played': metadata.get('rounds_played') or 0,
+        'game_length': metadata.get('game_length') or 0,
+        'red_rounds': (teams.get('red') or {}).get('rounds_won') or 0,
+        'blue_rounds': (teams.get('blue') or {}).get('rounds_won') or 0,
+    }
+
+
+def side_kills(kills: Iterable[Dict]) -> Dict[str, List[int]]:
+    """puuid -> [attack_kills, attack_deaths, defense_kills, defense_deaths] по событиям убийств"""
+    result: Dict[str, List[int]] = {}
+    for kill in kills or ():
+        round_index = kill.get('round')
+        if round_index is None:
+            continue
+        attackers = attacking_team(round_index)
+        killer, victim = kill.get('killer_puuid'), kill.get('victim_puuid')
+        if killer and killer != victim:
+            row = result.setdefault(killer, [0, 0, 0, 0])
+            row[0 if kill.get('killer_team') == attackers else 2] += 1
+        if victim:
+            row = result.setdefault(victim, [0, 0, 0, 0])
+            row[1 if kill.get('victim_team') == attackers else 3] += 1
+    return result
+
+
+def parse_player_row(match_row: Dict, player: Dict, teams: Dict, sides: Dict[str, List[int]]) -> Dict:
+    """Строка player_matches для одного игрока матча"""
+    stats = player.get('stats') or {}
+    team = player.get('team') or ''
+    team_info = teams.get(team.lower()) or {}
+    attack_kills, attack_deaths, defense_kills, defense_deaths = sides.get(player.get('puuid'), (0, 0, 0, 0))
+    return {
+        'puuid': player.get('puuid'),
+        'match_id': match_row['match_id'],
+        'started_at': match_row['started_at'],
+        'name': player.get('name'),
+        'tag': player.get('tag'),
+        'map': match_row['map'],
+        'mode': match_row['mode'],
+        'season_id': match_row['season_id'],
+        'agent': player.get('character'),
+        'team': team,
+        'tier': player.get('currenttier') or 0,
+        'won': 1 if team_info.get('has_won') else 0,
+        'rounds_played': match_row['rounds_played'],
+        'rounds_won': team_info.get('rounds_won') or 0,
+        'score': stats.get('score') or 0,
+        'kills': stats.get('kills') or 0,
+        'deaths': stats.get('deaths') or 0,
+        'assists': stats.get('assists') or 0,
+        'headshots': stats.get('headshots') or 0,
+        'bodyshots': stats.get('bodyshots') or 0,
+        'legshots': stats.get('legshots') or 0,
+        'damage_made': player.get('damage_made') or 0,
+        'attack_kills': attack_kills,
+        'attack_deaths': attack_deaths,
+        'defense_kills': defense_kills,
+        'defense_deaths': defense_deaths,
+    }
+
+
+def parse_match(match: Dict) -> Tuple[Dict, List[Dict]]:
+    """Разобрать документ матча в строку matches и строки всех игроков"""
+    match_row = parse_match_row(match)
+    teams = match.get('teams') or {}
+    sides = side_kills(match.get('kills'))
+    players = (match.get('players') or {}).get('all_players') or []
+    return match_row, [parse_player_row(match_row, player, teams, sides) for player in players]
+
+
+class MatchStore:
+    """Локальное SQLite-хранилище истории матчей"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add_matches(self, matches: Iterable[Dict]) -> int:
+        """Сохранить документы матчей со всеми игроками. Возвращает число новых матчей"""
+        match_rows, player_rows = [], []
+        for match in matches:
+            match_row, rows = parse_match(match)
+            if not match_row['match_id']:
+                continue
+            match_rows.append(match_row)
+            player_rows.extend(rows)
+        return self.add_parsed(match_rows, player_rows)
+
+    def add_parsed(self, match_rows: Iterable[Dict], player_rows: Iterable[Dict]) -> int:
+        """Сохранить уже разобранные строки matches и player_matches. Возвращает число новых матчей"""
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO matches ({', '.join(MATCH_COLUMNS)}) "
+                f"VALUES ({', '.join(':' + c for c in MATCH_COLUMNS)})",
+                match_rows,
+            )
+            added = self._conn.total_changes - before
+            self.add_player_rows(player_rows, _locked=True)
+        return added
+
+    def add_player_rows(self, rows: Iterable[Dict], _locked: bool = False):
+        """Сохранить готовые строки player_matches"""
+        sql = (
+            f"INSERT OR REPLACE INTO player_matches ({', '.join(PLAYER_COLUMNS)}) "
+            f"VALUES ({', '.join(':' + c for c in PLAYER_COLUMNS)})"
+        )
+        if _locked:
+            self._conn.executemany(sql, rows)
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+
+    def has_match(self, match_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+        return row is not None
+
+    def get_ingest_state(self, puuid: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM ingest_state WHERE puuid = ?", (puuid,)).fetchone()
+        return dict(row) if row else None
+
+    def set_ingest_state(self, puuid: str, last_match_id: str, last_started_at: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO ingest_state (puuid, last_match_id, last_started_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(puuid) DO UPDATE SET last_match_id = excluded.last_match_id, "
+                "last_started_at = excluded.last_started_at, updated_at = excluded.updated_at",
+                (puuid, last_match_id, last_started_at, int(time.time())),
+            )
+
+    def player_matches(self, puuid: str, map_name: Optional[str] = None, agent: Optional[str] = None,
+                       since: Optional[int] = None, until: Optional[int] = None,
+                       mode: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Строки игрока от новых к старым с фильтрами по карте, агенту, режиму и дате"""
+        clauses, params = ["puuid = ?"], [puuid]
+        for column, value in (('map', map_name), ('agent', agent), ('mode', mode)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("started_at < ?")
+            params.append(until)
+        sql = f"SELECT * FROM player_matches WHERE {' AND '.join(clauses)} ORDER BY started_at DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def count_player_matches(self, puuid: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM player_matches WHERE puuid = ?", (puuid,)).fetchone()[0]
+
+
+_store: Optional[MatchStore] = None
+
+
+def get_match_store() -> MatchStore:
+    """Общее для процесса хранилище матчей"""
+    global _store
+    if _store is None:
+        _store = MatchStore(config('MATCH_STORE_PATH', default='temp/matches.sqlite3'))
+    return _store
@@ -0,0 +1,278 @@
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from decouple import config
+
+from api.clients.cache import TTLCache
+from api.clients.henrik_client import parse_timestamp
+from api.storage.files import append_columns, player_dir, read_meta, write_meta
+
+# Колонки ряда на диске (little-endian, дописываются в конец файлов)
+SERIES_DTYPES = {
+    'timestamp': np.dtype('<i8'),
+    'elo': np.dtype('<i4'),
+    'rr': np.dtype('<i2'),
+    'tier': np.dtype('<i2'),
+    'change': np.dtype('<i2'),
+    'season': np.dtype('<i4'),
+}
+
+# Колонки уровней прореживания day/act (файлы <уровень>_<колонка>.bin)
+LEVEL_DTYPES = {
+    'timestamp': np.dtype('<i8'),
+    'elo': np.dtype('<i4'),
+    'elo_min': np.dtype('<i4'),
+    'elo_max': np.dtype('<i4'),
+    'tier': np.dtype('<i2'),
+    'change': np.dtype('<i4'),
+    'games': np.dtype('<i4'),
+    'season': np.dtype('<i4'),
+}
+
+DAY = 86400
+EMPTY_META = {'rows': 0, 'last_timestamp': 0, 'seasons': []}
+# Уровень на диске: rows закрытых групп и строка ряда, с которой начинается открытая группа
+EMPTY_LEVEL = {'rows': 0, 'start': 0}
+
+
+def parse_mmr_point(item: Dict) -> Optional[Dict]:
+    """Точка ряда из записи v1/mmr-history или v1/lifetime/mmr-history"""
+    timestamp = item.get('date_raw') or parse_timestamp(item.get('date'))
+    if not timestamp or item.get('elo') is None:
+        return None
+    tier = item.get('tier')
+    season = item.get('season')
+    return {
+        'timestamp': int(timestamp),
+        'elo': int(item['elo']),
+        'rr': int(item.get('ranking_in_tier') or 0),
+        'tier': int(item.get('currenttier') or (tier.get('id') if isinstance(tier, dict) else tier) or 0),
+        'change': int(item.get('mmr_change_to_last_game') or item.get('last_mmr_change') or 0),
+        'season': item.get('season_id') or (season.get('short') or season.get('id') if isinstance(season, dict) else season) or '',
+    }
+
+
+class MMRSeries:
+    """Ряд изменений MMR игрока: отсортированные по времени numpy-массивы.
+
+    Уровни прореживания (match - каждая игра, day - по суткам UTC, act - по
+    актам) хранилище передает готовыми; без них они считаются один раз при
+    первом обращении. Выборка по интервалу - бинарный поиск по времени.
+    """
+
+    LEVELS = ('match', 'day', 'act')
+
+    def __init__(self, columns: Dict[str, np.ndarray], seasons: List[str],
+                 levels: Optional[Dict[str, Dict[str, np.ndarray]]] = None):
+        self.columns = columns
+        self.seasons = seasons
+        self._levels: Dict[str, Dict[str, np.ndarray]] = dict(levels or {})
+
+    def __len__(self) -> int:
+        return len(self.columns['timestamp'])
+
+    @staticmethod
+    def group_starts(name: str, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Индексы первых строк групп уровня day или act"""
+        keys = columns['timestamp'] // DAY if name == 'day' else columns['season']
+        if len(keys) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(np.diff(keys, prepend=keys[:1] - 1))
+
+    @staticmethod
+    def group(columns: Dict[str, np.ndarray], starts: np.ndarray) -> Dict[str, np.ndarray]:
+        """Свертка отсортированного ряда по группам, начинающимся с индексов starts"""
+        if len(starts) == 0:
+            return {name: np.zeros(0, dtype=dtype) for name, dtype in LEVEL_DTYPES.items()}
+        ends = np.append(starts[1:], len(columns['timestamp'])) - 1
+        grouped = {
+            'timestamp': columns['timestamp'][ends],
+            'elo': columns['elo'][ends],
+            'elo_min': np.minimum.reduceat(columns['elo'], starts),
+            'elo_max': np.maximum.reduceat(columns['elo'], starts),
+            'tier': columns['tier'][ends],
+            'change': np.add.reduceat(columns['change'].astype(np.int32), starts),
+            'games': ends - starts + 1,
+            'season': columns['season'][ends],
+        }
+        return {name: values.astype(LEVEL_DTYPES[name], copy=False) for name, values in grouped.items()}
+
+    def level(self, name: str = 'match') -> Dict[str, np.ndarray]:
+        """Все точки уровня прореживания. У точек day/act время - последняя игра группы"""
+        if name not in self.LEVELS:
+            raise ValueError(f"Неизвестный уровень ряда: {name}")
+        cached = self._levels.get(name)
+        if cached is not None:
+            return cached
+
+        columns = self.columns
+        if name == 'match':
+            result = dict(columns)
+            result['elo_min'] = result['elo_max'] = columns['elo']
+            result['games'] = np.ones(len(self), dtype=np.int32)
+        else:
+            result = self.group(columns, self.group_starts(name, columns))
+        self._levels[name] = result
+        return result
+
+    def points(self, level: str = 'match', since: Optional[int] = None,
+               until: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Точки уровня в интервале [since, until) без копирования"""
+        data = self.level(level)
+        timestamps = data['timestamp']
+        start = 0 if since is None else int(np.searchsorted(timestamps, since, side='left'))
+        stop = len(timestamps) if until is None else int(np.searchsorted(timestamps, until, side='left'))
+        return {name: values[start:stop] for name, values in data.items()}
+
+    def season_code(self, season: str) -> int:
+        return self.seasons.index(season) if season in self.seasons else -1
+
+    def trend(self, since: Optional[int] = None, until: Optional[int] = None) -> Dict:
+        """Сводка по интервалу для карточки: игры, суммарный RR, серия, пик"""
+        data = self.points('match', since, until)
+        changes = data['change']
+        if len(changes) == 0:
+            return {'games': 0, 'rr_change': 0, 'wins': 0, 'losses': 0, 'streak': 0,
+                    'peak_elo': None, 'current_elo': None}
+
+        # Серия: число последних игр с тем же знаком изменения RR; игры с 0 RR (ничьи) ее не прерывают и не продлевают
+        decisive = changes[changes != 0] > 0
+        streak = 0
+        if len(decisive):
+            last = decisive[-1]
+            breaks = np.flatnonzero(decisive != last)
+            streak = len(decisive) - (breaks[-1] + 1 if len(breaks) else 0)
+            streak = streak if last else -streak
+        return {
+            'games': int(len(changes)),
+            'rr_change': int(changes.sum()),
+            'wins': int((changes > 0).sum()),
+            'losses': int((changes < 0).sum()),
+            'streak': int(streak),
+            'peak_elo': int(data['elo'].max()),
+            'current_elo': int(data['elo'][-1]),
+        }
+
+
+class MMRSeriesStore:
+    """Хранилище рядов MMR на диске: каталог на игрока, файл на колонку.
+
+    Новые точки дописываются в хвосты файлов, затем обновляется meta.json с
+    числом зафиксированных строк. Уровни day/act тоже хранятся на диске и
+    дописываются вместе с рядом: файлы содержат только закрытые группы, а
+    последняя, еще растущая группа досчитывается при загрузке из хвоста ряда.
+    Загруженные ряды держатся в LRU-кэше до следующего добавления.
+    """
+
+    STORED_LEVELS = ('day', 'act')
+
+    def __init__(self, root: str, cache_size: int = 256):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._loaded = TTLCache(maxsize=cache_size)
+
+    def last_timestamp(self, puuid: str) -> int:
+        return read_meta(player_dir(self.root, puuid), EMPTY_META).get('last_timestamp', 0)
+
+    @staticmethod
+    def _read_columns(directory: str, dtypes: Dict[str, np.dtype], start: int, stop: int,
+                      prefix: str = '') -> Dict[str, np.ndarray]:
+        columns = {}
+        for name, dtype in dtypes.items():
+            if stop > start:
+                path = os.path.join(directory, f"{prefix}{name}.bin")
+                columns[name] = np.fromfile(path, dtype=dtype, count=stop - start, offset=start * dtype.itemsize)
+            else:
+                columns[name] = np.zeros(0, dtype=dtype)
+        return columns
+
+    def load(self, puuid: str) -> MMRSeries:
+        with self._lock:
+            series = self._loaded.get(puuid)
+            if series is not None:
+                return series
+
+            directory = player_dir(self.root, puuid)
+            meta = read_meta(directory, EMPTY_META)
+            rows = meta['rows']
+            columns = self._read_columns(directory, SERIES_DTYPES, 0, rows)
+            levels = {}
+            for name, level in meta.get('levels', {}).items():
+                closed = self._read_columns(directory, LEVEL_DTYPES, 0, level['rows'], prefix=f"{name}_")
+                tail = {column: values[level['start']:] for column, values in columns.items()}
+                open_groups = MMRSeries.group(tail, MMRSeries.group_starts(name, tail))
+                levels[name] = {column: np.concatenate([closed[column], open_groups[column]]) for column in LEVEL_DTYPES}
+            series = MMRSeries(columns, meta.get('seasons', []), levels)
+            self._loaded.set(puuid, series)
+            return series
+
+    def _append_levels(self, directory: str, meta: Dict, new_columns: Dict[str, np.ndarray]) -> Dict:
+        """Дописать группы, закрытые новыми точками. Возвращает новое описание уровней для meta.json"""
+        committed = meta['rows']
+        stored = meta.get('levels', {})
+        levels = {}
+        for name in self.STORED_LEVELS:
+            # Ряд, записанный до появления уровней на диске, сворачивается целиком
+            level = stored.get(name, EMPTY_LEVEL)
+            tail = self._read_columns(directory, SERIES_DTYPES, level['start'], committed)
+            segment = {column: np.concatenate([tail[column], new_columns[column]]) for column in SERIES_DTYPES}
+            starts = MMRSeries.group_starts(name, segment)
+            # Последняя группа может продолжиться следующими точками - на диск идут только предыдущие
+            if len(starts) > 1:
+                closed = MMRSeries.group({column: values[:starts[-1]] for column, values in segment.items()}, starts[:-1])
+                append_columns(directory, closed, level['rows'], prefix=f"{name}_")
+            levels[name] = {'rows': level['rows'] + len(starts) - 1, 'start': level['start'] + int(starts[-1])}
+        return levels
+
+    def append(self, puuid: str, points: Sequence[Dict]) -> int:
+        """Дописать точки (parse_mmr_point). Точки не новее последней сохраненной пропускаются"""
+        with self._lock:
+            directory = player_dir(self.root, puuid)
+            os.makedirs(directory, exist_ok=True)
+            meta = read_meta(directory, EMPTY_META)
+            last_timestamp = meta.get('last_timestamp', 0)
+            unique = {point['timestamp']: point for point in points if point and point['timestamp'] > last_timestamp}
+            points = [unique[timestamp] for timestamp in sorted(unique)]
+            if not points:
+                return 0
+
+            seasons: List[str] = meta.get('seasons', [])
+            index = {season: code for code, season in enumerate(seasons)}
+            for point in points:
+                if point['season'] not in index:
+                    index[point['season']] = len(seasons)
+                    seasons.append(point['season'])
+
+            committed = meta['rows']
+            columns = {
+                name: np.asarray([index[point['season']] if name == 'season' else point[name] for point in points],
+                                 dtype=dtype)
+                for name, dtype in SERIES_DTYPES.items()
+            }
+            append_columns(directory, columns, committed)
+            levels = self._append_levels(directory, meta, columns)
+            write_meta(directory, {
+                'rows': committed + len(points),
+                'last_timestamp': points[-1]['timestamp'],
+                'seasons': seasons,
+                'levels': levels,
+            })
+            self._loaded.pop(puuid)
+            return len(points)
+
+
+_series_store: Optional[MMRSeriesStore] = None
+
+
+def get_mmr_series_store() -> MMRSeriesStore:
+    """Общее для процесса хранилище рядов MMR"""
+    global _series_store
+    if _series_store is None:
+        _series_store = MMRSeriesStore(
+            config('MMR_SERIES_DIR', default='temp/mmr_series'),
+            cache_size=config('MMR_SERIES_CACHE_SIZE', default=256, cast=int),
+        )
+    return _series_store
@@ -1,10 +1,96 @@
 import asyncio
+from aiohttp import web
+from aiogram import Bot
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from decouple import config
 from bot.create_bot import bot, dp
-from bot.handlers import start, profile
+from bot.handlers import start, profile, inline
+from api.clients.henrik_client import get_henrik_client
+from api.clients.trackerggapi import close_tracker_client
+from bot.utils.job_queue import get_inline_queue, get_profile_queue
+from bot.utils.load_shedding import get_load_shedder
+from utils.browser_pool import get_browser_pool
 
-async def main():
+# polling - long polling; webhook - aiohttp-сервер. В обоих режимах бот - один процесс: очередь,
+# троттлинг и лимиты Telegram живут в его памяти. Тяжелый рендер масштабируется воркерами RENDER_BACKEND=redis
+BOT_MODE = config('BOT_MODE', default='polling')
+WEBHOOK_BASE_URL = config('WEBHOOK_BASE_URL', default='')
+WEBHOOK_PATH = config('WEBHOOK_PATH', default='/webhook')
+WEBHOOK_SECRET = config('WEBHOOK_SECRET', default='') or None
+WEBHOOK_HOST = config('WEBHOOK_HOST', default='0.0.0.0')
+WEBHOOK_PORT = config('WEBHOOK_PORT', default=8000, cast=int)
+# Регистрировать вебхук в Telegram при старте
+WEBHOOK_REGISTER = config('WEBHOOK_REGISTER', default=True, cast=bool)
+
+
+def setup_routers():
     dp.include_router(profile.profile_router)
+    dp.include_router(inline.inline_router)
     dp.include_router(start.start_router)
+    dp.shutdown.register(on_shutdown)
+
+
+async def on_shutdown():
+    # Прогретые Chrome иначе переживут процесс бота
+    await get_browser_pool().close()
+    # Закрываем соединения общих клиентов источников
+    henrik = get_henrik_client()
+    if henrik is not None:
+        await henrik.close()
+    await close_tracker_client()
+
+
+async def on_webhook_startup(bot: Bot):
+    await bot.set_webhook(
+        f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    print(f"🌐 Вебхук зарегистрирован: {WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+
+async def health(request: web.Request) -> web.Response:
+    """Проверка живости и метрики нагрузки: выбранные режимы /profile и очереди рендера"""
+    return web.json_response({
+        'status': 'ok',
+        'load_shedding': get_load_shedder().metrics(),
+        'profile_queue': get_profile_queue().metrics(),
+        'inline_queue': get_inline_queue().metrics(),
+    })
+
+
+async def run_webhook():
+    """aiohttp-сервер вебхука. Апдейт подтверждается сразу, обработка идет в фоне"""
+    if WEBHOOK_REGISTER:
+        dp.startup.register(on_webhook_startup)
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=WEBHOOK_SECRET,
+    ).register(app, path=WEBHOOK_PATH)
+    app.router.add_get('/health', health)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    print(f"🚀 Вебхук слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def main():
+    setup_routers()
+    if BOT_MODE == 'webhook':
+        await run_webhook()
+        return
+
     await bot.delete_webhook(drop_pending_updates=True)
     await dp.start_polling(bot)
 
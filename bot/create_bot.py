@@ -5,6 +5,7 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 from decouple import config
+from bot.middlewares.outbound import OutboundRateLimiter
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -12,4 +13,6 @@ logger = logging.getLogger(__name__)
 all_media_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)))
 
 bot = Bot(token=config('TG_TOKEN'), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# Все исходящие запросы идут через очередь с лимитами Telegram и повтором 429
+bot.session.middleware(OutboundRateLimiter())
 dp = Dispatcher(storage=MemoryStorage())
\ No newline at end of file
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+from typing import Dict
+
+from aiogram import Bot, Router
+from aiogram.methods import SendPhoto
+from aiogram.types import (BufferedInputFile, InlineQuery, InlineQueryResultArticle, InlineQueryResultCachedPhoto,
+                           InputTextMessageContent)
+from decouple import config
+
+from api.clients.cache import TTLCache
+from api.clients.deadline import Deadline
+from api.services.federation import fetch_profile_stats
+from api.services.render_jobs import get_render_backend
+from bot.handlers.profile import PROFILE_UPLOAD_RESERVE, sanitize_filename, stats_caption
+from bot.utils.card_cache import get_card_cache
+from bot.utils.job_queue import JobReplaced, QueueFull, get_inline_queue, get_profile_queue
+from bot.utils.load_shedding import get_load_shedder
+from bot.utils.validation import validate_riot_id
+
+inline_router = Router()
+
+# Чат, куда фоновый рендер загружает карточки ради file_id; без него inline отдает только текст
+CARD_STORAGE_CHAT_ID = config('CARD_STORAGE_CHAT_ID', default=0, cast=int)
+INLINE_RENDER_DEADLINE = config('INLINE_RENDER_DEADLINE', default=45.0, cast=float)
+# Фоновая работа стартует, когда пользователь перестал набирать запрос
+INLINE_DEBOUNCE = config('INLINE_DEBOUNCE', default=1.0, cast=float)
+# Сколько держать ответ пользователю: повторные нажатия клавиш отвечаются из кэша
+INLINE_HIT_TTL = config('INLINE_HIT_TTL', default=60.0, cast=float)
+INLINE_MISS_TTL = config('INLINE_MISS_TTL', default=3.0, cast=float)
+
+_user_results = TTLCache(maxsize=config('INLINE_USER_CACHE_SIZE', default=10000, cast=int))
+# Фоновая подготовка ответа на пользователя: ссылка держит задачу до ее завершения
+_user_tasks: Dict[int, asyncio.Task] = {}
+
+
+def _result_id(*parts: str) -> str:
+    return hashlib.md5(':'.join(parts).encode('utf-8')).hexdigest()
+
+
+def build_results(riot_id: str, tagline: str) -> tuple:
+    """Результаты inline из кэша карточек; второй элемент - есть ли готовая карточка"""
+    file_id, caption = get_card_cache().get(riot_id, tagline)
+    if file_id:
+        return [InlineQueryResultCachedPhoto(
+            id=_result_id('card', riot_id.lower(), tagline.lower()),
+            photo_file_id=file_id,
+            caption=caption,
+            parse_mode="Markdown",
+        )], True
+
+    # Промах: мгновенный текстовый ответ, пока в фоне готовится карточка или, без чата-хранилища, сводка
+    pending = "Карточка готовится" if CARD_STORAGE_CHAT_ID else "Сводка собирается"
+    text = caption or (f"🎮 **{riot_id}#{tagline}**\n\n"
+                       f"⏳ {pending} - повторите запрос через несколько секунд "
+                       f"или отправьте /profile {riot_id}#{tagline}")
+    return [InlineQueryResultArticle(
+        id=_result_id('text', riot_id.lower(), tagline.lower(), str(bool(caption))),
+        title=f"{riot_id}#{tagline}",
+        description="Сводка статистики" if caption else f"{pending}...",
+        input_message_content=InputTextMessageContent(message_text=text, parse_mode="Markdown"),
+    )], False
+
+
+async def cache_summary(riot_id: str, tagline: str):
+    """Без чата-хранилища inline отдает текстом только сводку - собираем ее"""
+    stats = await fetch_profile_stats(riot_id, tagline, Deadline(INLINE_RENDER_DEADLINE))
+    if stats:
+        get_card_cache().remember_caption(riot_id, tagline, stats_caption(riot_id, tagline, stats))
+
+
+async def render_for_inline(bot: Bot, riot_id: str, tagline: str):
+    """Фоновый рендер для inline: карточка загружается в чат-хранилище ради file_id"""
+    deadline = Deadline(INLINE_RENDER_DEADLINE)
+    card = await get_render_backend().submit(riot_id, tagline, deadline.shrink(PROFILE_UPLOAD_RESERVE))
+    if not card:
+        return
+
+    caption = stats_caption(riot_id, tagline, card['stats'])
+    sent = await bot(
+        SendPhoto(
+            chat_id=CARD_STORAGE_CHAT_ID,
+            photo=BufferedInputFile(card['image'], filename=f"{sanitize_filename(riot_id)}_{tagline}.png"),
+            caption=caption,
+            parse_mode="Markdown",
+            disable_notification=True,
+        ),
+        request_timeout=deadline.request_timeout(),
+    )
+    get_card_cache().remember_card(riot_id, tagline, sent.photo[-1].file_id, caption)
+    print(f"📦 Карточка {riot_id}#{tagline} готова для inline")
+
+
+def _forget(task: asyncio.Task):
+    # Результат никто не ждет - только забираем исключение, чтобы оно не терялось молча
+    if task.cancelled() or isinstance(task.exception(), (type(None), JobReplaced)):
+        return
+    print(f"⚠️ Фоновая задача inline: {task.exception()!r}")
+
+
+async def prepare_answer(bot: Bot, user_id: int, riot_id: str, tagline: str):
+    """Фоновая подготовка ответа для name#tag после паузы в наборе.
+
+    С чатом-хранилищем рендер идет через собственную очередь inline и
+    пропускается, пока /profile под нагрузкой; без него собирается только сводка.
+    """
+    await asyncio.sleep(INLINE_DEBOUNCE)
+    if not CARD_STORAGE_CHAT_ID:
+        await cache_summary(riot_id, tagline)
+        return
+
+    # Inline уступает /profile: оба делят браузеры и источники
+    if get_load_shedder().mode(get_profile_queue().queued) != 'full':
+        return
+    try:
+        job = await get_inline_queue().submit(('inline', user_id), lambda: render_for_inline(bot, riot_id, tagline))
+    except QueueFull:
+        return
+    await job.result()
+
+
+def schedule_render(bot: Bot, user_id: int, riot_id: str, tagline: str):
+    """Запустить фоновую подготовку ответа для name#tag.
+
+    На пользователя одна задача: пока он набирает запрос, каждое новое
+    name#tag отменяет прежнее, и до источников доходит только запрос,
+    после которого он сделал паузу INLINE_DEBOUNCE.
+    """
+    if not CARD_STORAGE_CHAT_ID and get_card_cache().get(riot_id, tagline)[1]:
+        return
+    previous = _user_tasks.pop(user_id, None)
+    if previous is not None and not previous.done():
+        previous.cancel()
+    task = asyncio.ensure_future(prepare_answer(bot, user_id, riot_id, tagline))
+    task.add_done_callback(_forget)
+    task.add_done_callback(lambda done: _user_tasks.get(user_id) is done and _user_tasks.pop(user_id))
+    _user_tasks[user_id] = task
+
+
+@inline_router.inline_query()
+async def inline_profile(inline_query: InlineQuery, bot: Bot):
+    """@bot name#tag: карточка из кэша или текстовая сводка с рендером в фоне"""
+    query = inline_query.query.strip()
+    user_key = (inline_query.from_user.id, query.lower())
+    cached = _user_results.get(user_key)
+    if cached is not None:
+        results, cache_time = cached
+        await inline_query.answer(results, cache_time=cache_time, is_personal=True)
+        return
+
+    validation_result = validate_riot_id(query)
+    if not validation_result:
+        await inline_query.answer([], cache_time=1, is_personal=True)
+        return
+
+    riot_id, tagline = validation_result
+    results, hit = build_results(riot_id, tagline)
+    if not hit:
+        schedule_render(bot, inline_query.from_user.id, riot_id, tagline)
+    ttl = INLINE_HIT_TTL if hit else INLINE_MISS_TTL
+    cache_time = int(ttl)
+    _user_results.set(user_key, (results, cache_time), ttl=ttl)
+    await inline_query.answer(results, cache_time=cache_time, is_personal=True)
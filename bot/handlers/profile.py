@@ -1,29 +1,35 @@
+import asyncio
 import os
 import re
+import time
 from pathlib import Path
-from api.clients.trackerggapi import TrackerGGAPI
-from aiogram.types import Message, FSInputFile
+from typing import Dict, Optional
+from api.clients.deadline import Deadline
+from aiogram.types import Message, FSInputFile, BufferedInputFile
 from aiogram import Router
 from aiogram.filters import Command
+from aiogram.utils.chat_action import ChatActionSender
 from decouple import config
 from bot.utils.validation import validate_riot_id, get_error_message, APIError
 from bot.create_bot import all_media_dir
+from bot.middlewares.throttling import ThrottlingMiddleware
+from api.services.federation import fetch_profile_stats
+from api.services.render_jobs import get_render_backend
+from bot.utils.card_cache import get_card_cache
+from bot.utils.job_queue import get_profile_queue, JobReplaced, QueueFull
+from bot.utils.load_shedding import get_load_shedder
+from utils.lite_card import render_lite_card
 import utils.card_generator as CardGen
 
-tracker = TrackerGGAPI()
-
 profile_router = Router()
+# Внутренний middleware: срабатывает только на сообщения, дошедшие до обработчика /profile;
+# токен списывается только за запрос с правильным Riot ID
+profile_router.message.middleware(ThrottlingMiddleware(validate=validate_riot_id))
 
-async def get_enhanced_stats(riot_id: str, tagline: str):
-    """Получение расширенной статистики (legacy функция)"""
-    tracker = TrackerGGAPI()
-    profile_data = await tracker.get_player_profile(riot_id, tagline)
-    
-    if not profile_data:
-        return None
-        
-    summary = tracker.get_player_summary(profile_data)
-    return summary
+# Бюджет всего ответа на /profile: очередь, источники, рендер и загрузка в Telegram
+PROFILE_DEADLINE = config('PROFILE_DEADLINE', default=45.0, cast=float)
+# Часть бюджета, которую рендер оставляет на загрузку карточки
+PROFILE_UPLOAD_RESERVE = config('PROFILE_UPLOAD_RESERVE', default=5.0, cast=float)
 
 def sanitize_filename(name: str) -> str:
     """Заменяет пробелы на подчеркивания и удаляет опасные символы"""
@@ -52,104 +58,276 @@ async def profile_stat(message: Message):
             return
 
         riot_id, tagline = validation_result
+        # Отсчет бюджета - с момента, когда запрос принят
+        await serve_profile(message, riot_id, tagline, Deadline(PROFILE_DEADLINE))
         
-        print(f"🚀 Обработка профиля: {riot_id}#{tagline}")
-        
-        # Показываем сообщение о загрузке
-        loading_msg = await message.answer(f"🔍 Создаю карточку для {riot_id}#{tagline}...")
-        
-        print(f"📨 Сообщение о загрузке отправлено")
-        
-        # Генерируем карточку
-        print(f"🎯 Начинаем генерацию карточки...")
-        card_path = await CardGen.generate_enhanced_profile_card(riot_id, tagline)
-        
-        print(f"📋 Результат генерации: {card_path}")
-            
-        if not card_path or not os.path.exists(card_path):
-            await loading_msg.edit_text("❌ Не удалось создать карточку. Возможно, игрок не найден или нет данных.")
+    except Exception as e:
+        await message.answer(f"❌ Произошла ошибка: {str(e)}")
+
+
+async def serve_profile(message: Message, riot_id: str, tagline: str, deadline: Deadline):
+    """Ответ на /profile: полная карточка через очередь или деградированный режим.
+
+    Статистику собирает сам конвейер рендера (в процессе бота или в воркере
+    сервиса) параллельно с подготовкой браузера - уже после того, как очередь
+    приняла задачу, поэтому замененные и отклоненные запросы источники не трогают.
+    """
+    print(f"🚀 Обработка профиля: {riot_id}#{tagline}")
+    
+    queue = get_profile_queue()
+    mode = get_load_shedder().choose(queue.queued)
+    if mode != 'full':
+        # Дешевые режимы не занимают очередь полного рендера
+        await send_degraded_profile(message, riot_id, tagline, mode, deadline)
+        return
+    
+    progress = ProfileProgress(message, riot_id, tagline)
+    # Вместо сообщения о загрузке - индикатор "отправляет фото" до самого ответа
+    async with ChatActionSender.upload_photo(chat_id=message.chat.id, bot=message.bot,
+                                             message_thread_id=message.message_thread_id):
+        try:
+            job = await queue.submit(
+                message.from_user.id if message.from_user else message.chat.id,
+                lambda: send_profile_card(progress, deadline),
+                on_start=progress.on_start,
+                deadline=deadline,
+            )
+        except QueueFull:
+            await progress.fail("⏳ Бот сейчас перегружен. Попробуйте через минуту.")
             return
         
-        # Получаем данные для caption
-        print(f"📊 Получаем данные для caption...")
-        tracker_api = TrackerGGAPI()
-        profile_data = await tracker_api.get_player_profile(riot_id, tagline)
+        position = queue.position(job)
+        if position and queue.running >= queue.workers:
+            await progress.on_queued(position)
         
-        print(f"📊 Profile data получен: {bool(profile_data)}")
-        
-        if profile_data:
-            print(f"📊 Вызываем get_player_summary...")
-            summary = tracker_api.get_player_summary(profile_data)
-            print(f"📊 Summary получен: {bool(summary)}")
-            
-            # Формируем caption с текстовой статистикой
-            caption_text = f"🎮 **{riot_id}#{tagline}**\n\n"
-            
-            if summary:
-                print(f"📊 Обрабатываем summary...")
-                # Получаем данные из current_season
-                current_season = summary.get('current_season', {})
-                print(f"📊 Current season: {bool(current_season)}")
-                
-                # Ранг
-                rank = current_season.get('rank') or "Не определен"
-                caption_text += f"🏆 **Ранг:** {rank}\n"
-                
-                # Регион и уровень
-                if summary.get('region'):
-                    caption_text += f"🌍 **Регион:** {summary.get('region')}\n"
-                if summary.get('account_level'):
-                    caption_text += f"⭐ **Уровень:** {summary.get('account_level')}\n"
-                
-                # Матчи и винрейт
-                matches = current_season.get('matches_played', 0) or 0
-                win_rate = current_season.get('win_rate', 0) or 0
-                caption_text += f"🎯 **Матчей:** {matches}\n"
-                caption_text += f"📊 **Процент побед:** {win_rate:.1f}%\n"
-                
-                # K/D
-                kd = current_season.get('kd_ratio', 0) or 0
-                caption_text += f"⚔️ **K/D:** {kd:.2f}\n"
-                
-                # Любимый агент из топ агентов
-                print(f"📊 Получаем топ агентов...")
-                top_agents = summary.get('top_agents', [])
-                print(f"📊 Top agents: {type(top_agents)}, количество: {len(top_agents) if top_agents else 0}")
-                
-                if top_agents and len(top_agents) > 0:
-                    main_agent = top_agents[0]
-                    agent_name = main_agent.get('name', 'Неизвестен')
-                    agent_matches = main_agent.get('matches_played', 0) or 0
-                    caption_text += f"🎭 **Любимый агент:** {agent_name} ({agent_matches} матчей)\n"
-                    
-                # Стиль игры
-                play_style = summary.get('play_style', '')
-                if play_style:
-                    caption_text += f"🎨 **Стиль:** {play_style}\n"
-            else:
-                caption_text += "📊 Статистика с Tracker.gg"
+        try:
+            await job.result()
+        except JobReplaced:
+            await progress.fail("↩️ Запрос заменен более новым.")
+        except asyncio.TimeoutError:
+            await progress.fail(get_error_message(APIError.TIMEOUT))
+
+
+class ProfileProgress:
+    """Ответ на /profile в минимум запросов к Bot API: сводка, затем карточка.
+
+    Отдельного сообщения о загрузке нет: статусное сообщение появляется, только
+    если запрос ждет в очереди, или когда пришла текстовая сводка. Карточка
+    уходит фото-ответом; если сводка уже показана, подпись у фото короткая и
+    сводка остается, иначе сводка идет в подписи. Сообщение правят обработчик,
+    воркер очереди и конвейер рендера (сводка) - по очереди под lock.
+    """
+
+    def __init__(self, message: Message, riot_id: str, tagline: str):
+        self.message = message
+        self.riot_id = riot_id
+        self.tagline = tagline
+        self.lock = asyncio.Lock()
+        self.status_msg: Optional[Message] = None
+        self.started = False
+        self.queued = False
+        self.finished = False
+        self.summary: Optional[str] = None
+
+    async def _post(self, text: str, **kwargs):
+        if self.status_msg is None:
+            self.status_msg = await self.message.answer(text, **kwargs)
+        else:
+            await self.status_msg.edit_text(text, **kwargs)
+
+    async def on_queued(self, position: int):
+        async with self.lock:
+            if not self.started and not self.finished and self.summary is None:
+                self.queued = True
+                await self._post(f"⏳ {self.riot_id}#{self.tagline}: вы в очереди, позиция {position}")
+
+    async def on_start(self):
+        async with self.lock:
+            self.started = True
+            if self.queued and self.summary is None:
+                await self._post(f"🔍 Создаю карточку для {self.riot_id}#{self.tagline}...")
+
+    async def show_summary(self, stats: Dict):
+        """Текстовая сводка, как только конвейер рендера получил статистику"""
+        async with self.lock:
+            if self.finished:
+                return
+            summary = stats_caption(self.riot_id, self.tagline, stats)
+            get_card_cache().remember_caption(self.riot_id, self.tagline, summary)
+            try:
+                await self._post(summary, parse_mode="Markdown")
+            except Exception as e:
+                print(f"⚠️ Не удалось показать сводку: {e}")
+                return
+            self.summary = summary
+        print(f"📝 Сводка {self.riot_id}#{self.tagline} показана до карточки")
+
+    async def send_card(self, image: bytes, caption: str, deadline: Deadline):
+        """Отправить карточку; вызывается под lock"""
+        self.finished = True
+        photo_file = BufferedInputFile(image, filename=f"{sanitize_filename(self.riot_id)}_{self.tagline}.png")
+        # Загрузка ограничена остатком бюджета
+        sent = await self.message.bot(
+            self.message.reply_photo(
+                photo=photo_file,
+                caption=caption if self.summary is None else f"🎮 **{self.riot_id}#{self.tagline}**",
+                parse_mode="Markdown",
+            ),
+            request_timeout=deadline.request_timeout(),
+        )
+        # Загруженное фото переиспользуется inline-режимом по file_id
+        get_card_cache().remember_card(self.riot_id, self.tagline, sent.photo[-1].file_id, caption)
+        if self.status_msg is not None and self.summary is None:
+            # Устаревший статус очереди - сводка уже в подписи
+            try:
+                await self.status_msg.delete()
+            except Exception as e:
+                print(f"⚠️ Не удалось удалить статус: {e}")
+
+    async def show_error(self, text: str):
+        """Ошибка вместо статуса или под сводкой; вызывается под lock"""
+        self.finished = True
+        if self.summary is None:
+            await self._post(text)
+        else:
+            await self._post(f"{self.summary}\n\n{text}", parse_mode="Markdown")
+
+    async def fail(self, text: str):
+        """Завершить ответ без карточки; уже показанная сводка остается"""
+        async with self.lock:
+            await self.show_error(text)
+
+
+def build_caption(riot_id: str, tagline: str, summary) -> str:
+    """Текстовая сводка профиля (Markdown) из get_player_summary; None - профиль не получен"""
+    if summary is not None:
+        # Формируем caption с текстовой статистикой
+        caption_text = f"🎮 **{riot_id}#{tagline}**\n\n"
+
+        if summary:
+            print(f"📊 Обрабатываем summary...")
+            # Получаем данные из current_season
+            current_season = summary.get('current_season', {})
+            print(f"📊 Current season: {bool(current_season)}")
+
+            # Ранг
+            rank = current_season.get('rank') or "Не определен"
+            caption_text += f"🏆 **Ранг:** {rank}\n"
+
+            # Регион и уровень
+            if summary.get('region'):
+                caption_text += f"🌍 **Регион:** {summary.get('region')}\n"
+            if summary.get('account_level'):
+                caption_text += f"⭐ **Уровень:** {summary.get('account_level')}\n"
+
+            # Матчи и винрейт
+            matches = current_season.get('matches_played', 0) or 0
+            win_rate = current_season.get('win_rate', 0) or 0
+            caption_text += f"🎯 **Матчей:** {matches}\n"
+            caption_text += f"📊 **Процент побед:** {win_rate:.1f}%\n"
+
+            # K/D
+            kd = current_season.get('kd_ratio', 0) or 0
+            caption_text += f"⚔️ **K/D:** {kd:.2f}\n"
+
+            # Любимый агент из топ агентов
+            print(f"📊 Получаем топ агентов...")
+            top_agents = summary.get('top_agents', [])
+            print(f"📊 Top agents: {type(top_agents)}, количество: {len(top_agents) if top_agents else 0}")
+
+            if top_agents and len(top_agents) > 0:
+                main_agent = top_agents[0]
+                agent_name = main_agent.get('name', 'Неизвестен')
+                agent_matches = main_agent.get('matches_played', 0) or 0
+                caption_text += f"🎭 **Любимый агент:** {agent_name} ({agent_matches} матчей)\n"
+
+            # Стиль игры
+            play_style = summary.get('play_style', '')
+            if play_style:
+                caption_text += f"🎨 **Стиль:** {play_style}\n"
         else:
-            caption_text = f"🎮 **{riot_id}#{tagline}**\n📊 Статистика с Tracker.gg"
-                
-        # Отправляем карточку с caption
+            caption_text += "📊 Статистика с Tracker.gg"
+    else:
+        caption_text = f"🎮 **{riot_id}#{tagline}**\n📊 Статистика с Tracker.gg"
+    return caption_text
+
+
+def trend_line(trend: Dict) -> str:
+    """Строка сводки об изменении RR за последние дни"""
+    streak = trend['streak']
+    line = f"📈 **RR за {trend['days']} дн.:** {trend['rr_change']:+d} ({trend['wins']}W/{trend['losses']}L)"
+    if abs(streak) >= 2:
+        line += f", серия {'побед' if streak > 0 else 'поражений'}: {abs(streak)}"
+    return line + "\n"
+
+
+def stats_caption(riot_id: str, tagline: str, stats: Optional[Dict]) -> str:
+    """Текстовая сводка из сводки tracker.gg, собранной вместе со статистикой карточки.
+    Без нее - из сводки по локальной истории матчей"""
+    summary = (stats.get('summary') or stats.get('history_summary')) if stats else None
+    caption_text = build_caption(riot_id, tagline, summary)
+    if stats and stats.get('rr_trend'):
+        caption_text = caption_text.rstrip('\n') + "\n" + trend_line(stats['rr_trend'])
+    return caption_text
+
+
+async def send_profile_card(progress: ProfileProgress, deadline: Deadline):
+    """Сгенерировать карточку и отправить ее в ответ на команду (выполняется воркером очереди)"""
+    riot_id, tagline = progress.riot_id, progress.tagline
+    # Генерируем карточку (в процессе бота или в отдельном сервисе рендера)
+    print(f"🎯 Начинаем генерацию карточки, {deadline}")
+    started = time.monotonic()
+    try:
+        # Текстовая сводка показывается, как только пришла статистика, не дожидаясь рендера
+        card = await get_render_backend().submit(riot_id, tagline, deadline.shrink(PROFILE_UPLOAD_RESERVE),
+                                                 on_stats=progress.show_summary)
+    finally:
+        # Таймауты тоже учитываются: это самый сильный сигнал перегрузки
+        get_load_shedder().record_render(time.monotonic() - started)
+
+    print(f"📋 Результат генерации: {bool(card)}")
+
+    if not card:
+        await progress.fail("❌ Не удалось создать карточку. Возможно, игрок не найден или нет данных.")
+        return
+
+    caption_text = stats_caption(riot_id, tagline, card['stats'])
+
+    # Отправляем карточку с caption
+    async with progress.lock:
         try:
-            photo_file = FSInputFile(card_path)
-            await message.reply_photo(
-                photo=photo_file, 
-                caption=caption_text,
-                parse_mode="Markdown"
-            )
-            await loading_msg.delete()
-                
-            # Удаляем временный файл
-            await safe_delete_file(card_path)
-                
+            await progress.send_card(card['image'], caption_text, deadline)
         except Exception as e:
-            await loading_msg.edit_text(f"❌ Ошибка при отправке карточки: {str(e)}")
-        
-    except Exception as e:
-        await message.answer(f"❌ Произошла ошибка: {str(e)}")
+            await progress.show_error(f"❌ Ошибка при отправке карточки: {str(e)}")
+
+
+async def send_degraded_profile(message: Message, riot_id: str, tagline: str, mode: str, deadline: Deadline):
+    """Ответ под нагрузкой: lite - упрощенная PIL-карточка, text - только текстовая сводка"""
+    action = ChatActionSender.upload_photo if mode == 'lite' else ChatActionSender.typing
+    async with action(chat_id=message.chat.id, bot=message.bot, message_thread_id=message.message_thread_id):
+        try:
+            stats = await deadline.run(fetch_profile_stats(riot_id, tagline, deadline.shrink(PROFILE_UPLOAD_RESERVE)),
+                                       stage='stats')
+        except asyncio.TimeoutError:
+            await message.answer(get_error_message(APIError.TIMEOUT))
+            return
+        caption_text = stats_caption(riot_id, tagline, stats)
+        if mode == 'lite' and stats:
+            image = await asyncio.to_thread(render_lite_card, stats, riot_id, tagline)
+            await message.bot(
+                message.reply_photo(
+                    photo=BufferedInputFile(image, filename=f"{sanitize_filename(riot_id)}_{tagline}_lite.png"),
+                    caption=caption_text + "\n⚡ Упрощенная карточка: бот под нагрузкой",
+                    parse_mode="Markdown"
+                ),
+                request_timeout=deadline.request_timeout(),
+            )
+            return
 
+    await message.answer(
+        caption_text + "\n\n⚡ Бот под нагрузкой, карточка не создавалась",
+        parse_mode="Markdown"
+    )
 
 
 async def safe_delete_file(file_path: str):
@@ -0,0 +1,93 @@
+import time
+from typing import Dict, Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import DeleteMessage, GetUpdates, Response, SendChatAction, TelegramMethod
+from aiogram.methods.base import TelegramType
+from decouple import config
+
+from api.clients.cache import TTLCache
+from api.clients.rate_limit import RateLimiter
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """Очередь исходящих запросов бота в пределах лимитов Telegram.
+
+    Общий лимит на бота (около 30 сообщений в секунду) и лимит на чат: личный
+    чат - примерно сообщение в секунду, группа или канал - 20 в минуту.
+    Запрос ждет токен сначала чата, затем общий. На 429 лимитер чата (или
+    общий, если чата нет) блокируется на retry_after и запрос повторяется
+    до max_retries раз.
+    """
+
+    # Не создают сообщений и не тратят лимит чата
+    CHAT_EXEMPT = (SendChatAction, DeleteMessage)
+    # Long polling сам ждет обновлений, его нельзя держать в очереди
+    EXEMPT = (GetUpdates,)
+    # Сколько живет лимитер чата без запросов (сверх оставшейся блокировки)
+    CHAT_IDLE_TTL = 60.0
+
+    def __init__(self, global_rate: Optional[float] = None, chat_rate: Optional[float] = None,
+                 group_per_minute: Optional[float] = None, chat_burst: Optional[int] = None,
+                 max_retries: Optional[int] = None, max_chats: int = 10000):
+        global_rate = global_rate or config('TG_GLOBAL_RATE', default=30.0, cast=float)
+        self.global_ = RateLimiter('telegram', global_rate, max(1, int(global_rate)))
+        self.chat_rate = chat_rate or config('TG_CHAT_RATE', default=1.0, cast=float)
+        self.group_rate = (group_per_minute or config('TG_GROUP_PER_MINUTE', default=20.0, cast=float)) / 60.0
+        self.chat_burst = chat_burst or config('TG_CHAT_BURST', default=3, cast=int)
+        self.max_retries = config('TG_MAX_RETRIES', default=3, cast=int) if max_retries is None else max_retries
+        # Лимитер чата живет, пока в чат пишут; простаивающий пересоздается полным
+        self._chats = TTLCache(maxsize=max_chats, ttl=self.CHAT_IDLE_TTL)
+        self.retried = 0
+        self.failed = 0
+
+    def _chat_limiter(self, chat_id: Union[int, str]) -> RateLimiter:
+        limiter = self._chats.get(chat_id)
+        if limiter is None:
+            # Отрицательный id - группа или канал, строка - @username канала
+            group = isinstance(chat_id, str) or chat_id < 0
+            limiter = RateLimiter(f"telegram:{chat_id}", self.group_rate if group else self.chat_rate, self.chat_burst)
+        # Заблокированный по 429 лимитер не должен истечь раньше блокировки - иначе чат получит полную корзину
+        blocked = max(0.0, limiter.blocked_until - time.monotonic())
+        self._chats.set(chat_id, limiter, ttl=blocked + self.CHAT_IDLE_TTL)
+        return limiter
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if isinstance(method, self.EXEMPT):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, 'chat_id', None)
+        chat = None if chat_id is None or isinstance(method, self.CHAT_EXEMPT) else self._chat_limiter(chat_id)
+        attempt = 0
+        while True:
+            if chat is not None:
+                await chat.acquire()
+            await self.global_.acquire()
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                attempt += 1
+                self.retried += 1
+                if chat is None:
+                    self.global_.block_for(e.retry_after)
+                else:
+                    chat.block_for(e.retry_after)
+                    self._chat_limiter(chat_id)
+
+    def metrics(self) -> Dict:
+        return {
+            'global': self.global_.metrics(),
+            'chats': len(self._chats),
+            'retried': self.retried,
+            'failed': self.failed,
+        }
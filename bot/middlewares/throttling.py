@@ -0,0 +1,121 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+from decouple import config
+
+from api.clients.cache import TTLCache
+
+
+class TokenBuckets:
+    """Набор token bucket по ключам с ограниченной памятью.
+
+    Ведро хранится только пока не наполнилось заново: его время жизни равно
+    времени полного пополнения, а отсутствующее ведро эквивалентно полному.
+    Число ведер ограничено LRU, проверка - O(1).
+    """
+
+    def __init__(self, per_minute: float, burst: int, max_keys: int = 10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.refill_time = burst / self.rate
+        self._buckets = TTLCache(maxsize=max_keys, ttl=self.refill_time)
+
+    def _tokens(self, key: Hashable, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return float(self.burst)
+        tokens, updated_at = bucket
+        return min(float(self.burst), tokens + (now - updated_at) * self.rate)
+
+    def wait_time(self, key: Hashable, now: float) -> float:
+        """Через сколько секунд по ключу появится токен (0 - уже есть)"""
+        tokens = self._tokens(key, now)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def consume(self, key: Hashable, now: float):
+        self._buckets.set(key, (self._tokens(key, now) - 1, now))
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничение частоты дорогих команд: на пользователя, на чат и на весь бот.
+
+    Запрос проходит, только если токен есть во всех трех ведрах, и тогда
+    списывается из всех сразу. Отказ - короткий текстовый ответ, не чаще
+    одного на пользователя за время ожидания. validate проверяет аргументы
+    команды до списания: с неверными аргументами обработчик отвечает
+    подсказкой, а токен остается у пользователя.
+    """
+
+    GLOBAL_KEY = 'global'
+
+    def __init__(self, user: Optional[TokenBuckets] = None, chat: Optional[TokenBuckets] = None,
+                 global_: Optional[TokenBuckets] = None, validate: Optional[Callable[[str], Any]] = None):
+        self.validate = validate
+        max_keys = config('THROTTLE_MAX_KEYS', default=10000, cast=int)
+        self.user = user if user is not None else TokenBuckets(
+            config('THROTTLE_USER_PER_MINUTE', default=3.0, cast=float),
+            config('THROTTLE_USER_BURST', default=3, cast=int), max_keys,
+        )
+        self.chat = chat if chat is not None else TokenBuckets(
+            config('THROTTLE_CHAT_PER_MINUTE', default=10.0, cast=float),
+            config('THROTTLE_CHAT_BURST', default=10, cast=int), max_keys,
+        )
+        self.global_ = global_ if global_ is not None else TokenBuckets(
+            config('THROTTLE_GLOBAL_PER_MINUTE', default=60.0, cast=float),
+            config('THROTTLE_GLOBAL_BURST', default=20, cast=int), 1,
+        )
+        # Кому уже ответили отказом, чтобы не отвечать на каждое сообщение
+        self._warned = TTLCache(maxsize=max_keys)
+        self.allowed = 0
+        self.rejected = 0
+
+    def check(self, user_id: Hashable, chat_id: Hashable, now: Optional[float] = None) -> float:
+        """0 - запрос разрешен и токены списаны, иначе сколько секунд ждать"""
+        now = time.monotonic() if now is None else now
+        checks = ((self.user, user_id), (self.chat, chat_id), (self.global_, self.GLOBAL_KEY))
+        wait = max(buckets.wait_time(key, now) for buckets, key in checks)
+        if wait > 0:
+            self.rejected += 1
+            return wait
+        for buckets, key in checks:
+            buckets.consume(key, now)
+        self.allowed += 1
+        return 0.0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Message):
+            return await handler(event, data)
+        if self.validate is not None:
+            # CommandObject кладет в data фильтр Command, сработавший до внутреннего middleware
+            command = data.get('command')
+            if not self.validate((command.args if command is not None else None) or ''):
+                return await handler(event, data)
+
+        chat_id = event.chat.id
+        user_id = event.from_user.id if event.from_user else chat_id
+        wait = self.check(user_id, chat_id)
+        if not wait:
+            return await handler(event, data)
+
+        if user_id not in self._warned:
+            self._warned.set(user_id, True, ttl=wait)
+            await event.answer(f"⏳ Слишком много запросов. Попробуйте через {int(wait) + 1} с.")
+        return None
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'user_buckets': len(self.user),
+            'chat_buckets': len(self.chat),
+        }
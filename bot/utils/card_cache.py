@@ -0,0 +1,51 @@
+from typing import Dict, Hashable, Optional, Tuple
+
+from decouple import config
+
+from api.clients.cache import TTLCache
+
+
+class CardCache:
+    """Готовые карточки по Riot ID: file_id фото в Telegram и текстовая сводка.
+
+    file_id приходит с любой отправленной карточки (/profile или фоновый
+    рендер для inline) и позволяет переслать фото без повторной загрузки.
+    Сводка кэшируется отдельно - ей отвечают, пока карточки нет.
+    """
+
+    def __init__(self, ttl: float = 600.0, maxsize: int = 2000):
+        self.file_ids = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.captions = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def key(riot_id: str, tagline: str) -> Tuple[str, str]:
+        return riot_id.lower(), tagline.lower()
+
+    def get(self, riot_id: str, tagline: str) -> Tuple[Optional[str], Optional[str]]:
+        """(file_id, сводка) - любое из значений может отсутствовать"""
+        key = self.key(riot_id, tagline)
+        return self.file_ids.get(key), self.captions.get(key)
+
+    def remember_caption(self, riot_id: str, tagline: str, caption: str):
+        self.captions.set(self.key(riot_id, tagline), caption)
+
+    def remember_card(self, riot_id: str, tagline: str, file_id: str, caption: Optional[str] = None):
+        self.file_ids.set(self.key(riot_id, tagline), file_id)
+        if caption:
+            self.remember_caption(riot_id, tagline, caption)
+
+    def metrics(self) -> Dict:
+        return {'file_ids': self.file_ids.metrics(), 'captions': self.captions.metrics()}
+
+
+_card_cache: Optional[CardCache] = None
+
+
+def get_card_cache() -> CardCache:
+    global _card_cache
+    if _card_cache is None:
+        _card_cache = CardCache(
+            ttl=config('CARD_CACHE_TTL', default=600.0, cast=float),
+            maxsize=config('CARD_CACHE_SIZE', default=2000, cast=int),
+        )
+    return _card_cache
@@ -0,0 +1,172 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+from decouple import config
+
+from api.clients.deadline import Deadline, DeadlineExceeded
+
+
+class JobReplaced(Exception):
+    """Задача снята из очереди: тот же пользователь отправил новый запрос"""
+
+
+class QueueFull(Exception):
+    """Очередь заполнена, новые задачи не принимаются"""
+
+
+class Job:
+    """Задача очереди: фабрика корутины и future с ее результатом"""
+
+    def __init__(self, key: Hashable, run: Callable[[], Awaitable],
+                 on_start: Optional[Callable[[], Awaitable]] = None,
+                 deadline: Optional[Deadline] = None):
+        self.key = key
+        self.run = run
+        self.on_start = on_start
+        self.deadline = deadline
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    async def result(self):
+        return await asyncio.shield(self.future)
+
+
+class JobQueue:
+    """Очередь тяжелых задач с фиксированным числом воркеров.
+
+    У каждого ключа (пользователя) не больше одной ожидающей задачи: повторная
+    отправка занимает место прежней, а прежняя завершается JobReplaced.
+    Задача, не уложившаяся в deadline, отменяется с asyncio.TimeoutError.
+    Если у задачи свой Deadline запроса, время ожидания в очереди вычитается
+    из него, а задача с истекшим бюджетом не запускается вовсе.
+    """
+
+    def __init__(self, workers: int = 2, deadline: float = 60.0, max_size: int = 100):
+        self.workers = workers
+        self.deadline = deadline
+        self.max_size = max_size
+        self._pending: Deque[Job] = deque()
+        self._by_key: Dict[Hashable, Job] = {}
+        self._wakeup = asyncio.Condition()
+        self._tasks = []
+        self._closing = False
+        self.running = 0
+        self.finished = 0
+        self.timed_out = 0
+        self.replaced = 0
+
+    def _ensure_workers(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending)
+
+    def position(self, job: Job) -> int:
+        """Место задачи в очереди, начиная с 1; 0 - задача уже выполняется или завершена"""
+        try:
+            return self._pending.index(job) + 1
+        except ValueError:
+            return 0
+
+    async def submit(self, key: Hashable, run: Callable[[], Awaitable],
+                     on_start: Optional[Callable[[], Awaitable]] = None,
+                     deadline: Optional[Deadline] = None) -> Job:
+        self._ensure_workers()
+        job = Job(key, run, on_start, deadline)
+        previous = self._by_key.get(key)
+        if previous is not None:
+            # Новый запрос занимает место прежнего, а не встает в конец
+            self._pending[self._pending.index(previous)] = job
+            previous.future.set_exception(JobReplaced())
+            previous.future.exception()  # помечаем исключение полученным
+            self.replaced += 1
+        elif len(self._pending) >= self.max_size:
+            raise QueueFull()
+        else:
+            self._pending.append(job)
+        self._by_key[key] = job
+
+        async with self._wakeup:
+            self._wakeup.notify()
+        return job
+
+    async def _worker(self, index: int):
+        # Флаг, а не только cancel(): wait_for в 3.11 теряет отмену, если задача завершилась одновременно с ней
+        while not self._closing:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: self._pending)
+                job = self._pending.popleft()
+            self._by_key.pop(job.key, None)
+
+            timeout = self.deadline if job.deadline is None else job.deadline.timeout(self.deadline)
+            self.running += 1
+            try:
+                if timeout <= 0:
+                    raise DeadlineExceeded("Дедлайн истек в очереди")
+                if job.on_start is not None:
+                    await job.on_start()
+                result = await asyncio.wait_for(job.run(), timeout)
+            except asyncio.TimeoutError as e:
+                self.timed_out += 1
+                print(f"⏱️ Задача {job.key} отменена по дедлайну {timeout:.1f}s")
+                job.future.set_exception(e)
+                # Отправитель мог уже сдаться по тому же дедлайну и не забрать результат
+                job.future.exception()
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+            finally:
+                self.running -= 1
+                self.finished += 1
+
+    async def close(self):
+        self._closing = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._closing = False
+
+    def metrics(self) -> Dict:
+        return {
+            'workers': self.workers,
+            'queued': self.queued,
+            'running': self.running,
+            'finished': self.finished,
+            'timed_out': self.timed_out,
+            'replaced': self.replaced,
+        }
+
+
+_profile_queue: Optional[JobQueue] = None
+_inline_queue: Optional[JobQueue] = None
+
+
+def get_profile_queue() -> JobQueue:
+    """Общая очередь генерации карточек /profile"""
+    global _profile_queue
+    if _profile_queue is None:
+        _profile_queue = JobQueue(
+            workers=config('PROFILE_WORKERS', default=2, cast=int),
+            deadline=config('PROFILE_JOB_DEADLINE', default=60.0, cast=float),
+            max_size=config('PROFILE_QUEUE_MAX', default=100, cast=int),
+        )
+    return _profile_queue
+
+
+def get_inline_queue() -> JobQueue:
+    """Отдельная очередь фонового рендера для inline: свои воркеры и лимит, /profile она не занимает"""
+    global _inline_queue
+    if _inline_queue is None:
+        _inline_queue = JobQueue(
+            workers=config('INLINE_WORKERS', default=1, cast=int),
+            deadline=config('INLINE_RENDER_DEADLINE', default=45.0, cast=float),
+            max_size=config('INLINE_QUEUE_MAX', default=20, cast=int),
+        )
+    return _inline_queue
@@ -0,0 +1,80 @@
+import time
+from typing import Dict, Optional
+
+from decouple import config
+
+
+class LoadShedder:
+    """Выбор режима ответа /profile по нагрузке на рендер.
+
+    full - полная карточка через браузер, lite - упрощенная PIL-карточка,
+    text - только текстовая сводка. Сигналы: длина очереди и сглаженное время
+    полного рендера. Замер времени устаревает через latency_ttl, иначе после
+    перехода в lite полных рендеров нет и режим никогда бы не вернулся.
+    """
+
+    MODES = ('full', 'lite', 'text')
+
+    def __init__(self, lite_depth: int = 4, text_depth: int = 12,
+                 lite_latency: float = 20.0, text_latency: float = 40.0,
+                 latency_ttl: float = 60.0, alpha: float = 0.3):
+        self.lite_depth = lite_depth
+        self.text_depth = text_depth
+        self.lite_latency = lite_latency
+        self.text_latency = text_latency
+        self.latency_ttl = latency_ttl
+        self.alpha = alpha
+        self.render_latency: Optional[float] = None
+        self._latency_at = 0.0
+        self.chosen = {mode: 0 for mode in self.MODES}
+
+    def record_render(self, seconds: float):
+        if self.render_latency is None:
+            self.render_latency = seconds
+        else:
+            self.render_latency = self.alpha * seconds + (1 - self.alpha) * self.render_latency
+        self._latency_at = time.monotonic()
+
+    def _latency(self) -> float:
+        if self.render_latency is None or time.monotonic() - self._latency_at > self.latency_ttl:
+            return 0.0
+        return self.render_latency
+
+    def mode(self, queued: int) -> str:
+        """Режим по текущей нагрузке, без учета в метриках"""
+        latency = self._latency()
+        if queued >= self.text_depth or latency >= self.text_latency:
+            return 'text'
+        if queued >= self.lite_depth or latency >= self.lite_latency:
+            return 'lite'
+        return 'full'
+
+    def choose(self, queued: int) -> str:
+        """Режим для ответа /profile; выбор попадает в метрики chosen"""
+        mode = self.mode(queued)
+        self.chosen[mode] += 1
+        if mode != 'full':
+            print(f"🧯 /profile в режиме {mode}: очередь {queued}, рендер {self._latency():.1f}s")
+        return mode
+
+    def metrics(self) -> Dict:
+        return {
+            'render_latency': round(self._latency(), 2),
+            'chosen': dict(self.chosen),
+        }
+
+
+_shedder: Optional[LoadShedder] = None
+
+
+def get_load_shedder() -> LoadShedder:
+    global _shedder
+    if _shedder is None:
+        _shedder = LoadShedder(
+            lite_depth=config('LOAD_SHED_LITE_DEPTH', default=4, cast=int),
+            text_depth=config('LOAD_SHED_TEXT_DEPTH', default=12, cast=int),
+            lite_latency=config('LOAD_SHED_LITE_LATENCY', default=20.0, cast=float),
+            text_latency=config('LOAD_SHED_TEXT_LATENCY', default=40.0, cast=float),
+            latency_ttl=config('LOAD_SHED_LATENCY_TTL', default=60.0, cast=float),
+        )
+    return _shedder
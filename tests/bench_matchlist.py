@@ -0,0 +1,169 @@
+"""Бенчмарк разбора v3/matches: json.loads целиком против потокового MatchListStreamParser.
+
+Запись настоящего ответа Henrik (нужен HENRIK_API_KEY):
+    PYTHONPATH=. python tests/bench_matchlist.py --record "name#tag" eu
+Замер на записанном ответе:
+    PYTHONPATH=. python tests/bench_matchlist.py tests/fixtures/recorded/v3_matches_eu.json "name#tag"
+
+Записи лежат вне git: в ответе ники и puuid чужих игроков.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+import urllib.parse
+
+import aiohttp
+from aiohttp import web
+from decouple import config
+
+from api.clients.henrik_client import HenrikAPIClient
+from api.clients.streaming import MatchListStreamParser, extract_player_view
+
+RECORDED_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'recorded')
+CHUNK_SIZE = HenrikAPIClient.STREAM_CHUNK_SIZE
+
+
+async def record(riot_id: str, region: str, size: int) -> str:
+    name, tag = riot_id.split('#', 1)
+    base_url = config('HENRIK_API_URL', default='https://api.henrikdev.xyz/valorant/')
+    url = f"{base_url}v3/matches/{region}/{urllib.parse.quote(name)}/{urllib.parse.quote(tag)}"
+    headers = {"Authorization": config('HENRIK_API_KEY'), "Accept": "*/*"}
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async with session.get(url, params={'size': size}) as response:
+            response.raise_for_status()
+            payload = await response.read()
+    os.makedirs(RECORDED_DIR, exist_ok=True)
+    path = os.path.join(RECORDED_DIR, f"v3_matches_{region}.json")
+    with open(path, 'wb') as f:
+        f.write(payload)
+    print(f"💾 {len(payload) / 1e6:.2f} MB -> {path}")
+    return path
+
+
+def full_parse(payload: bytes, name: str, tag: str) -> list:
+    return [extract_player_view(match, name, tag) for match in json.loads(payload)['data'] or ()]
+
+
+def stream_parse(payload: bytes, name: str, tag: str) -> list:
+    parser = MatchListStreamParser()
+    views = []
+    for start in range(0, len(payload), CHUNK_SIZE):
+        views.extend(extract_player_view(match, name, tag) for match in parser.feed(payload[start:start + CHUNK_SIZE]))
+    views.extend(extract_player_view(match, name, tag) for match in parser.close())
+    return views
+
+
+def measure(fn, *args, repeat: int = 5) -> tuple:
+    """Лучшее время из repeat прогонов и пик памяти Python одного прогона"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+
+async def serve(payload: bytes, delay: float):
+    """Локальная подмена Henrik, отдающая ответ кусками с паузой, как медленная сеть"""
+    async def matches(request):
+        response = web.StreamResponse(headers={'Content-Type': 'application/json'})
+        await response.prepare(request)
+        for start in range(0, len(payload), CHUNK_SIZE):
+            await response.write(payload[start:start + CHUNK_SIZE])
+            await asyncio.sleep(delay)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get('/v3/matches/{region}/{name}/{tag}', matches)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}/"
+
+
+async def loop_stall(coro_fn) -> tuple:
+    """Время запроса и самая долгая пауза цикла событий, пока он идет"""
+    worst = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal worst
+        while running:
+            before = time.perf_counter()
+            await asyncio.sleep(0.001)
+            worst = max(worst, time.perf_counter() - before - 0.001)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    result = await coro_fn()
+    elapsed = time.perf_counter() - started
+    running = False
+    await tick
+    return result, elapsed, worst
+
+
+async def compare_over_network(payload: bytes, name: str, tag: str, delay: float):
+    runner, base_url = await serve(payload, delay)
+    client = HenrikAPIClient('bench', base_url=base_url, timeout=120)
+    path = f"v3/matches/eu/{urllib.parse.quote(name)}/{urllib.parse.quote(tag)}"
+
+    async def baseline():
+        session = await client._get_session()
+        async with session.get(base_url + path) as response:
+            body = await response.read()
+        return full_parse(body, name, tag)
+
+    async def streamed():
+        views, _ = await client.get_matchlist_player(name, tag, 'eu')
+        return views
+
+    try:
+        for label, fn in (("json.loads после read()", baseline), ("потоковый разбор", streamed)):
+            _, elapsed, worst = await loop_stall(fn)
+            print(f"  {label:<26} {elapsed * 1000:8.1f} ms, худшая пауза цикла {worst * 1000:6.1f} ms")
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--record', nargs=2, metavar=('NAME#TAG', 'REGION'))
+    parser.add_argument('--size', type=int, default=10)
+    parser.add_argument('--delay', type=float, default=0.005, help="пауза между кусками ответа, с")
+    parser.add_argument('path', nargs='?')
+    parser.add_argument('player', nargs='?', help="name#tag игрока, чью строку выбираем")
+    args = parser.parse_args()
+
+    if args.record:
+        args.path = asyncio.run(record(args.record[0], args.record[1], args.size))
+        args.player = args.player or args.record[0]
+    if not args.path or not args.player:
+        parser.error("нужен путь к записанному ответу и name#tag (или --record)")
+
+    with open(args.path, 'rb') as f:
+        payload = f.read()
+    name, tag = args.player.split('#', 1)
+    print(f"📦 {args.path}: {len(payload) / 1e6:.2f} MB")
+
+    expected, full_time, full_peak = measure(full_parse, payload, name, tag)
+    views, stream_time, stream_peak = measure(stream_parse, payload, name, tag)
+    assert views == expected, "потоковый разбор расходится с json.loads"
+    print(f"  {'json.loads':<26} {full_time * 1000:8.1f} ms CPU, пик памяти {full_peak / 1e6:6.1f} MB")
+    print(f"  {'MatchListStreamParser':<26} {stream_time * 1000:8.1f} ms CPU, пик памяти {stream_peak / 1e6:6.1f} MB")
+
+    print(f"🌐 Через локальный сервер, куски по {CHUNK_SIZE // 1024} KB с паузой {args.delay * 1000:.0f} ms:")
+    asyncio.run(compare_over_network(payload, name, tag, args.delay))
+
+
+if __name__ == '__main__':
+    main()
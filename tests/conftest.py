@@ -0,0 +1,4 @@
+import os
+
+# Модули bot.* создают Bot при импорте; для тестов хватает токена правильного вида
+os.environ.setdefault('TG_TOKEN', '123456:test')
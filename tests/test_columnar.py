@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pytest
+
+import api.storage.columnar as columnar
+from api.analytics.stats_engine import MatchArrays, StatsEngine
+from api.storage.columnar import ColumnarArchive
+from tests.test_stats_engine import ROWS
+
+
+def test_empty_archive_opens_and_summarizes(tmp_path):
+    archive = ColumnarArchive(str(tmp_path))
+
+    arrays = archive.open('nobody')
+
+    assert len(arrays) == 0
+    assert archive.row_count('nobody') == 0
+    summary = StatsEngine().summarize(arrays)
+    assert summary['current_season']['matches_played'] == 0
+    assert summary['top_agents'] == [] and summary['maps'] == []
+
+
+def test_archive_round_trip_matches_in_memory_arrays(tmp_path):
+    archive = ColumnarArchive(str(tmp_path))
+
+    assert archive.append_rows('p1', ROWS[:2]) == 2
+    assert archive.append_rows('p1', ROWS) == 1
+    # Строки не новее последней сохраненной не дописываются
+    assert archive.append_rows('p1', ROWS[:1]) == 0
+
+    stored = archive.open('p1')
+    assert isinstance(stored.columns['kills'], np.memmap)
+    expected = MatchArrays.from_rows(ROWS)
+    for name in columnar.COLUMN_DTYPES:
+        if name in stored.dictionaries:
+            decoded = [stored.dictionaries[name][code] for code in stored.columns[name]]
+            assert decoded == [expected.dictionaries[name][code] for code in expected.columns[name]], name
+        else:
+            np.testing.assert_array_equal(stored.columns[name], expected.columns[name], err_msg=name)
+    assert StatsEngine().summarize(stored) == StatsEngine().summarize(expected)
+
+
+def test_torn_tail_after_failed_append_is_invisible_and_overwritten(tmp_path, monkeypatch):
+    archive = ColumnarArchive(str(tmp_path))
+    archive.append_rows('p1', ROWS[:1])
+
+    def crash(directory, meta):
+        raise OSError("диск отвалился")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(columnar, 'write_meta', crash)
+        with pytest.raises(OSError):
+            archive.append_rows('p1', ROWS[1:])
+
+    kills_path = os.path.join(tmp_path, 'p1', 'kills.bin')
+    # Хвост на диске есть, но meta.json его не зафиксировал
+    assert os.path.getsize(kills_path) == 3 * np.dtype('<i2').itemsize
+    assert len(archive.open('p1')) == 1
+
+    assert archive.append_rows('p1', ROWS[2:]) == 1
+    assert os.path.getsize(kills_path) == 2 * np.dtype('<i2').itemsize
+    assert archive.open('p1').columns['kills'].tolist() == [20, 15]
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from api.clients.deadline import Deadline, DeadlineExceeded
+
+
+def test_stage_timeouts_split_the_budget():
+    deadline = Deadline(10)
+
+    assert deadline.timeout(cap=3) == 3
+    assert deadline.timeout(reserve=4) == pytest.approx(6, abs=0.05)
+    assert deadline.request_timeout(reserve=8.5) == 2
+
+    child = deadline.shrink(5)
+    # Этап видит бюджет без резерва следующих этапов, родитель - целиком
+    assert child.remaining() == pytest.approx(5, abs=0.05)
+    assert deadline.remaining() == pytest.approx(10, abs=0.05)
+    assert child.shrink(4).remaining() == pytest.approx(1, abs=0.05)
+    assert deadline.shrink(20).expired and not deadline.expired
+
+
+def test_request_timeout_never_drops_below_one_second():
+    assert Deadline(0).request_timeout() == 1
+
+
+def test_run_cancels_stage_when_budget_runs_out():
+    cancelled = []
+
+    async def stage():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await Deadline(0.1).run(stage(), stage='render')
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 1
+    assert cancelled == [True]
+
+
+def test_run_respects_cap_and_reserve():
+    async def scenario():
+        deadline = Deadline(5)
+        with pytest.raises(DeadlineExceeded):
+            await deadline.run(asyncio.sleep(1), cap=0.05)
+        with pytest.raises(DeadlineExceeded):
+            await deadline.run(asyncio.sleep(1), reserve=4.95)
+        return await deadline.run(asyncio.sleep(0, result='ok'), cap=1)
+
+    assert asyncio.run(scenario()) == 'ok'
+
+
+def test_expired_budget_skips_stage_without_starting_it():
+    started = []
+
+    async def stage():
+        started.append(True)
+
+    async def scenario():
+        with pytest.raises(DeadlineExceeded):
+            await Deadline(0).run(stage(), stage='stats')
+
+    asyncio.run(scenario())
+    assert started == []
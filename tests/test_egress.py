@@ -0,0 +1,262 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import pytest
+from aiohttp import web
+
+import api.clients.clearance as clearance
+import api.clients.rate_limit as rate_limit
+import api.clients.scraper_pool as scraper_pool
+import api.clients.trackerggapi as trackerggapi
+from api.clients.egress import EgressPool, EgressSession
+from api.clients.scraper_pool import ScraperCancelled, ScraperPool
+
+
+def make_pool(tmp_path, count=2, **kwargs) -> EgressPool:
+    sessions = [EgressSession(f"s{index}", jar_path=str(tmp_path / f"jar_{index}.json")) for index in range(count)]
+    return EgressPool(sessions, **kwargs)
+
+
+def pick(pool: EgressPool) -> EgressSession:
+    session = pool.acquire()
+    pool.release(session, None)
+    return session
+
+
+def test_weighted_rotation_follows_session_weight(tmp_path):
+    pool = make_pool(tmp_path, count=3)
+    fast, slow, dead = pool.sessions
+    fast.latency, slow.latency = 0.5, 1.0
+    dead.quarantined_until = time.monotonic() + 60
+
+    picks = Counter(pick(pool).name for _ in range(30))
+
+    # Вес быстрой сессии вдвое выше; сессия в карантине не выбирается
+    assert picks == {'s0': 20, 's1': 10}
+
+
+def test_release_updates_ewma_scores(tmp_path):
+    pool = make_pool(tmp_path, count=1, alpha=0.5)
+    session = pool.sessions[0]
+
+    pool.release(pool.acquire(), True, 3.0)
+    assert session.latency == pytest.approx(2.0)
+    assert session.success_rate == pytest.approx(1.0)
+
+    pool.release(pool.acquire(), False, 1.0)
+    assert session.latency == pytest.approx(1.5)
+    assert session.success_rate == pytest.approx(0.5)
+    assert (session.requests, session.successes, session.failures) == (2, 1, 1)
+
+
+def test_cancelled_release_leaves_scores_untouched(tmp_path):
+    pool = make_pool(tmp_path, count=1, max_failures=1)
+    session = pool.sessions[0]
+
+    for _ in range(3):
+        pool.release(pool.acquire(), None, 5.0)
+
+    assert (session.requests, session.success_rate, session.latency) == (0, 1.0, 1.0)
+    assert not session.is_quarantined(time.monotonic())
+    assert not session.in_use
+
+
+def test_challenge_quarantines_immediately(tmp_path):
+    pool = make_pool(tmp_path, quarantine_base=30)
+    session = pool.acquire()
+    session.challenged = True
+
+    pool.release(session, False, 1.0)
+
+    assert session.challenges == 1
+    assert 29 < session.quarantined_until - time.monotonic() <= 30
+
+
+def test_failure_streak_backs_off_up_to_max(tmp_path):
+    pool = make_pool(tmp_path, count=1, max_failures=3, quarantine_base=10, quarantine_max=35)
+    session = pool.sessions[0]
+    durations = []
+
+    for _ in range(6):
+        pool.release(pool.acquire(), False, 1.0)
+        durations.append(round(max(0.0, session.quarantined_until - time.monotonic())))
+
+    assert durations == [0, 0, 10, 20, 35, 35]
+    assert session.quarantines == 4
+
+
+def test_quarantined_session_recovers_after_success(tmp_path):
+    pool = make_pool(tmp_path, quarantine_base=30)
+    first, second = pool.sessions
+    first.quarantined_until = time.monotonic() + 30
+    second.quarantined_until = time.monotonic() + 10
+
+    # Все в карантине - берется та, что выйдет раньше, и успех снимает карантин
+    chosen = pool.acquire()
+    pool.release(chosen, True, 0.5)
+
+    assert chosen is second
+    assert not second.is_quarantined(time.monotonic())
+    assert first.is_quarantined(time.monotonic())
+
+
+def test_scraper_pool_does_not_score_misses_or_cancellations(tmp_path):
+    async def scenario():
+        egress = make_pool(tmp_path, max_failures=1)
+        pool = ScraperPool(egress, max_workers=2)
+        release = threading.Event()
+
+        def miss(session, cancel_event):
+            return None
+
+        def hang(session, cancel_event):
+            release.wait(1.0)
+            return None
+
+        def cancelled(session, cancel_event):
+            raise ScraperCancelled()
+
+        for _ in range(3):
+            assert await pool.run(miss) is None
+            with pytest.raises(ScraperCancelled):
+                await pool.run(cancelled)
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.run(hang, timeout=0.02)
+            release.set()
+            await asyncio.sleep(0.05)
+            release.clear()
+        pool.shutdown(wait=True)
+        return egress
+
+    egress = asyncio.run(scenario())
+
+    now = time.monotonic()
+    assert not any(session.is_quarantined(now) for session in egress.sessions)
+    assert sum(session.failures for session in egress.sessions) == 0
+    assert sum(session.successes for session in egress.sessions) == 3
+
+
+def test_scraper_pool_scores_challenges_and_transport_errors(tmp_path):
+    async def scenario():
+        egress = make_pool(tmp_path, count=1, max_failures=2, quarantine_base=30)
+        pool = ScraperPool(egress, max_workers=1)
+
+        def challenged(session, cancel_event):
+            session.challenged = True
+            return None
+
+        def broken(session, cancel_event):
+            raise ConnectionError("proxy down")
+
+        await pool.run(challenged)
+        session = egress.sessions[0]
+        challenged_quarantine = session.is_quarantined(time.monotonic())
+        session.quarantined_until = 0.0
+        with pytest.raises(ConnectionError):
+            await pool.run(broken)
+        pool.shutdown(wait=True)
+        return session, challenged_quarantine
+
+    session, challenged_quarantine = asyncio.run(scenario())
+
+    assert challenged_quarantine
+    assert session.failures == 2
+    assert session.challenges == 1
+
+
+PROFILE = {'data': {'segments': [], 'metadata': {'activeShard': 'eu'}}}
+
+
+async def start_stand_in():
+    """Локальная подмена tracker.gg: страница прогрева и API профиля"""
+    hits = Counter()
+
+    async def warm_up_page(request):
+        hits['warm_up'] += 1
+        response = web.Response(text='<html>ok</html>')
+        response.set_cookie('cf_clearance', 'token', max_age=3600)
+        return response
+
+    async def profile(request):
+        riot_id = request.match_info['riot_id']
+        hits[riot_id] += 1
+        if request.cookies.get('cf_clearance') != 'token':
+            return web.Response(status=403, text='challenge')
+        if riot_id.startswith('missing'):
+            return web.json_response({'errors': [{'code': 'CollectorResultStatus::NotFound'}]}, status=404)
+        if riot_id.startswith('blocked'):
+            return web.Response(status=403, text='challenge')
+        return web.json_response(PROFILE)
+
+    app = web.Application()
+    app.router.add_get('/valorant', warm_up_page)
+    app.router.add_get('/api/profile/riot/{riot_id}', profile)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}", hits
+
+
+def test_cloudscraper_path_against_local_stand_in(tmp_path, monkeypatch):
+    egress = make_pool(tmp_path, count=1, max_failures=1)
+    pool = ScraperPool(egress, max_workers=1)
+    monkeypatch.setattr(rate_limit, '_limiters', {})
+    monkeypatch.setattr(trackerggapi, 'get_scraper_pool', lambda: pool)
+    monkeypatch.setattr(trackerggapi, 'ensure_refresh_task', lambda pool: None)
+    monkeypatch.setattr(trackerggapi.random, 'uniform', lambda a, b: 0)
+
+    async def scenario():
+        runner, url, hits = await start_stand_in()
+        # Значения TRACKER_SITE_URL и TRACKER_API_URL, указывающие на подмену
+        monkeypatch.setattr(clearance, 'WARMUP_URL', f"{url}/valorant")
+        monkeypatch.setattr(trackerggapi, 'TRACKER_SITE_URL', url)
+        monkeypatch.setattr(trackerggapi.TrackerGGAPI, 'BASE_URL', f"{url}/api")
+        api = trackerggapi.TrackerGGAPI()
+        try:
+            found = await api._try_cloudscraper('player', 'EU1')
+            missing = await api._try_cloudscraper('missing', 'EU1')
+            healthy = not egress.sessions[0].is_quarantined(time.monotonic())
+            warm_ups = hits['warm_up']
+            blocked = await api._try_cloudscraper('blocked', 'EU1')
+        finally:
+            await api.close()
+            await runner.cleanup()
+            pool.shutdown(wait=True)
+        return found, missing, healthy, warm_ups, blocked
+
+    found, missing, healthy, warm_ups, blocked = asyncio.run(scenario())
+    session = egress.sessions[0]
+
+    assert found == PROFILE
+    assert missing is None
+    # Прогрев один раз, дальше cookies берутся из jar
+    assert warm_ups == 1
+    # 404 - обычный промах: сессия здорова
+    assert healthy
+    # 403 после повторного прогрева - проверка Cloudflare и карантин
+    assert blocked is None
+    assert session.challenges == 1
+    assert session.is_quarantined(time.monotonic())
+
+
+def test_close_tracker_client_stops_refresh_task_and_pool(tmp_path, monkeypatch):
+    pool = ScraperPool(make_pool(tmp_path), max_workers=1)
+    monkeypatch.setattr(scraper_pool, '_pool', pool)
+
+    async def scenario():
+        task = clearance.ensure_refresh_task(pool)
+        await asyncio.sleep(0)
+        await trackerggapi.close_tracker_client()
+        return task
+
+    task = asyncio.run(scenario())
+
+    assert task.cancelled()
+    assert clearance._refresh_task is None
+    assert scraper_pool._pool is None
+    with pytest.raises(RuntimeError):
+        pool._executor.submit(print)
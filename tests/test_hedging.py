@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import api.clients.trackerggapi as trackerggapi
+from api.clients.egress import EgressPool, EgressSession
+from api.clients.scraper_pool import ScraperPool, interruptible_sleep
+from api.clients.trackerggapi import HedgeBudget, LatencyTracker, TrackerGGAPI
+
+
+class FreeLimiter:
+    async def acquire(self, priority):
+        pass
+
+    def update_from_headers(self, status, headers):
+        pass
+
+
+@pytest.fixture
+def hedged(tmp_path, monkeypatch):
+    """TrackerGGAPI с подменой httpx и CloudScraper; возвращает (api, пул, журнал событий)"""
+    pool = ScraperPool(EgressPool([EgressSession('s0', jar_path=str(tmp_path / 'jar.json'))]), max_workers=1)
+    monkeypatch.setattr(trackerggapi, 'get_scraper_pool', lambda: pool)
+    monkeypatch.setattr(trackerggapi, 'ensure_refresh_task', lambda pool: None)
+    api = TrackerGGAPI()
+    api.api_limiter = FreeLimiter()
+    api.httpx_latency = LatencyTracker(default=0.05)
+    api.hedge_budget = HedgeBudget(1)
+    events = []
+    yield api, pool, events
+    pool.shutdown(wait=True)
+    asyncio.run(api.close())
+
+
+def slow_httpx(api, events, delay: float, payload):
+    async def get(url, timeout):
+        events.append('httpx start')
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            events.append('httpx cancelled')
+            raise
+        events.append('httpx done')
+        return httpx.Response(200, json=payload) if payload else httpx.Response(404)
+
+    api.client.get = get
+
+
+def test_latency_threshold_is_clamped_p90():
+    tracker = LatencyTracker(window=100, min_samples=20, default=2.0, floor=0.3, ceiling=10.0)
+    for index in range(19):
+        tracker.record(index / 10)
+    # Мало замеров - порог по умолчанию
+    assert tracker.threshold() == 2.0
+
+    tracker.samples.clear()
+    for index in range(1, 101):
+        tracker.record(index / 100)
+    assert tracker.threshold() == pytest.approx(0.91)
+
+    tracker.samples.clear()
+    for _ in range(20):
+        tracker.record(0.01)
+    assert tracker.threshold() == 0.3
+    for _ in range(100):
+        tracker.record(60.0)
+    assert tracker.threshold() == 10.0
+
+
+def test_hedge_budget_rejects_when_exhausted():
+    budget = HedgeBudget(1)
+
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+    budget.release()
+    assert budget.try_acquire()
+    assert (budget.launched, budget.rejected, budget.in_flight) == (2, 1, 1)
+
+
+def test_cloudscraper_wins_hedge_and_slow_httpx_is_cancelled(hedged):
+    api, pool, events = hedged
+    slow_httpx(api, events, 1.0, {'data': 'httpx'})
+
+    def scrape(egress, cancel_event, riot_id, tagline, loop, priority, deadline):
+        events.append('scraper done')
+        return {'data': 'scraper'}
+
+    api._cloudscraper_sync = scrape
+
+    result = asyncio.run(api.get_player_profile('Player', 'EU1'))
+
+    assert result == {'data': 'scraper'}
+    assert events == ['httpx start', 'scraper done', 'httpx cancelled']
+    # Отмененный httpx не портит статистику задержек
+    assert len(api.httpx_latency.samples) == 0
+    assert api.hedge_budget.in_flight == 0
+    assert pool.egress.sessions[0].successes == 1
+
+
+def test_httpx_wins_hedge_and_scraper_loser_is_not_penalized(hedged):
+    api, pool, events = hedged
+    slow_httpx(api, events, 0.2, {'data': 'httpx'})
+
+    def scrape(egress, cancel_event, riot_id, tagline, loop, priority, deadline):
+        events.append('scraper start')
+        interruptible_sleep(cancel_event, 5)
+
+    api._cloudscraper_sync = scrape
+
+    result = asyncio.run(api.get_player_profile('Player', 'EU1'))
+    pool.shutdown(wait=True)
+
+    assert result == {'data': 'httpx'}
+    assert events == ['httpx start', 'scraper start', 'httpx done']
+    assert len(api.httpx_latency.samples) == 1
+    assert api.hedge_budget.in_flight == 0
+    session = pool.egress.sessions[0]
+    assert (session.requests, session.failures, session.quarantined_until) == (0, 0, 0.0)
+    assert pool.cancelled == 1
+
+
+def test_exhausted_budget_falls_back_to_sequential_path(hedged):
+    api, pool, events = hedged
+    api.hedge_budget = HedgeBudget(0)
+    slow_httpx(api, events, 0.15, None)
+
+    def scrape(egress, cancel_event, riot_id, tagline, loop, priority, deadline):
+        events.append('scraper start')
+        return {'data': 'scraper'}
+
+    api._cloudscraper_sync = scrape
+    started = time.monotonic()
+
+    result = asyncio.run(api.get_player_profile('Player', 'EU1'))
+
+    assert result == {'data': 'scraper'}
+    # CloudScraper стартует только после ответа httpx
+    assert events == ['httpx start', 'httpx done', 'scraper start']
+    assert time.monotonic() - started >= 0.15
+    assert api.hedge_budget.rejected == 1
@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from api.clients.henrik_client import HenrikAPIClient
+from bot.utils.validation import APIError
+
+PAGE_SIZE = 2
+# Unix-время первой (самой новой) записи; каждая следующая на час старше
+NEWEST = 1_700_100_000
+
+
+class FakePages:
+    """Подмена _make_requests: отдает paged-ответы v1/lifetime и ведет журнал.
+
+    Страницы из hang висят до отмены - так видно, что префетч отменился.
+    """
+
+    def __init__(self, count: int, total=True, hang=(), errors=()):
+        self.count = count
+        self.total = total
+        self.hang = set(hang)
+        self.errors = set(errors)
+        self.log = []
+        self.cancelled = []
+
+    def item(self, index: int, endpoint: str) -> dict:
+        started_at = NEWEST - index * 3600
+        if 'mmr-history' in endpoint:
+            return {'match_id': f"m{index}", 'date': started_at, 'last_change': 10}
+        return {'meta': {'id': f"m{index}", 'started_at': started_at}}
+
+    async def __call__(self, endpoint, params=None, priority=None, reader=None):
+        page, size = params['page'], params['size']
+        self.log.append(('start', page))
+        try:
+            if page in self.hang:
+                await asyncio.Event().wait()
+            await asyncio.sleep(0.005)
+        except asyncio.CancelledError:
+            self.cancelled.append(page)
+            raise
+        self.log.append(('done', page))
+        if page in self.errors:
+            return None, APIError.API_UNAVAILABLE
+
+        first = (page - 1) * size
+        items = [self.item(index, endpoint) for index in range(first, min(first + size, self.count))]
+        response = {'data': items}
+        if self.total:
+            response['results'] = {'total': self.count}
+        return response, None
+
+    def pages(self) -> list:
+        return [page for event, page in self.log if event == 'start']
+
+
+@pytest.fixture
+def client():
+    return HenrikAPIClient('test')
+
+
+def collect(generator, limit=None):
+    async def run():
+        items = []
+        async for item in generator:
+            items.append(item)
+            # Обработка записи отдает управление циклу - префетч успевает стартовать
+            await asyncio.sleep(0.001)
+            if limit is not None and len(items) >= limit:
+                break
+        await generator.aclose()
+        # Отмена префетча доходит до задачи на следующей итерации цикла
+        await asyncio.sleep(0.01)
+        return items
+    return asyncio.run(run())
+
+
+def test_next_page_is_fetched_while_current_is_processed(client):
+    fake = FakePages(count=6)
+    client._make_requests = fake
+
+    async def run():
+        log = fake.log
+        async for items in client._iter_pages('v1/lifetime/matches/eu/Player/EU1', {}, PAGE_SIZE, 0):
+            page = len([1 for event, _ in log if event == 'done'])
+            log.append(('consume', page))
+            await asyncio.sleep(0.02)
+            log.append(('consumed', page))
+
+    asyncio.run(run())
+
+    assert fake.pages() == [1, 2, 3]
+    # Страница 2 запрошена и получена, пока обрабатывалась страница 1
+    assert fake.log.index(('start', 2)) < fake.log.index(('consumed', 1))
+    assert fake.log.index(('done', 2)) < fake.log.index(('consumed', 1))
+    assert fake.cancelled == []
+
+
+def test_last_page_stops_without_extra_request(client):
+    # Без results.total конец виден только по неполной странице
+    fake = FakePages(count=5, total=False)
+    client._make_requests = fake
+
+    items = collect(client.iter_matches('Player', 'EU1', 'eu', page_size=PAGE_SIZE))
+
+    assert [item['meta']['id'] for item in items] == [f"m{index}" for index in range(5)]
+    assert fake.pages() == [1, 2, 3]
+
+    # С total хватает последней полной страницы
+    fake = FakePages(count=4)
+    client._make_requests = fake
+    assert len(collect(client.iter_matches('Player', 'EU1', 'eu', page_size=PAGE_SIZE))) == 4
+    assert fake.pages() == [1, 2]
+
+
+def test_page_error_ends_iteration(client):
+    fake = FakePages(count=10, errors={2})
+    client._make_requests = fake
+
+    items = collect(client.iter_mmr_history('Player', 'EU1', 'eu', page_size=PAGE_SIZE))
+
+    assert [item['match_id'] for item in items] == ['m0', 'm1']
+    assert fake.pages() == [1, 2]
+
+
+def test_since_cancels_prefetched_page(client):
+    fake = FakePages(count=10, hang={2})
+    client._make_requests = fake
+    # Граница внутри первой страницы: m1 уже старше since
+    since = NEWEST - 3600 + 1
+
+    items = collect(client.iter_matches('Player', 'EU1', 'eu', since=since, page_size=PAGE_SIZE))
+
+    assert [item['meta']['id'] for item in items] == ['m0']
+    assert fake.pages() == [1, 2]
+    assert fake.cancelled == [2]
+
+
+def test_mmr_history_since_cancels_prefetched_page(client):
+    fake = FakePages(count=10, hang={3})
+    client._make_requests = fake
+    since = NEWEST - 2 * 3600
+
+    items = collect(client.iter_mmr_history('Player', 'EU1', 'eu', since=since, page_size=PAGE_SIZE))
+
+    assert [item['match_id'] for item in items] == ['m0', 'm1', 'm2']
+    assert fake.cancelled == [3]
+
+
+def test_consumer_break_cancels_prefetched_page(client):
+    fake = FakePages(count=10, hang={2})
+    client._make_requests = fake
+
+    items = collect(client.iter_matches('Player', 'EU1', 'eu', page_size=PAGE_SIZE), limit=1)
+
+    assert len(items) == 1
+    assert fake.pages() == [1, 2]
+    assert fake.cancelled == [2]
+
+
+def test_details_follow_page_order(client, monkeypatch):
+    fake = FakePages(count=3)
+    client._make_requests = fake
+    requested = []
+
+    async def get_matches(match_ids, priority=None):
+        requested.append(tuple(match_ids))
+        # m1 не скачался - в выдаче его нет
+        return {match_id: {'data': {'id': match_id}} for match_id in match_ids if match_id != 'm1'}
+
+    monkeypatch.setattr(client, 'get_matches', get_matches)
+
+    items = collect(client.iter_matches('Player', 'EU1', 'eu', page_size=PAGE_SIZE, details=True))
+
+    assert [item['id'] for item in items] == ['m0', 'm2']
+    assert requested == [('m0', 'm1'), ('m2',)]
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from api.storage.ingest import MatchIngestor
+from api.storage.match_store import MatchStore
+
+PUUID = 'puuid-player'
+
+
+def make_match(index: int) -> dict:
+    """Документ матча Henrik: игрок и соперник, матчи с большим index новее"""
+    return {
+        'metadata': {'matchid': f"m{index}", 'game_start': 1_700_000_000 + index * 3600, 'map': 'Lotus' if index % 2 else 'Bind',
+                     'mode': 'Competitive', 'queue': 'Standard', 'season_id': 'e9a1', 'region': 'eu',
+                     'rounds_played': 20, 'game_length': 2_000_000},
+        'teams': {'red': {'has_won': True, 'rounds_won': 13}, 'blue': {'has_won': False, 'rounds_won': 7}},
+        'players': {'all_players': [
+            {'puuid': PUUID, 'name': 'Player', 'tag': 'EU1', 'team': 'Red', 'character': 'Jett', 'currenttier': 12,
+             'stats': {'score': 4000, 'kills': 20 + index, 'deaths': 10, 'assists': 5,
+                       'headshots': 10, 'bodyshots': 20, 'legshots': 2}, 'damage_made': 3000},
+            {'puuid': 'puuid-rival', 'name': 'Rival', 'tag': 'NA1', 'team': 'Blue', 'character': 'Sage',
+             'currenttier': 11, 'stats': {'kills': 10, 'deaths': 20}},
+        ]},
+        'kills': [],
+    }
+
+
+class FakeHenrik:
+    """История из count матчей; журнал запросов показывает, во что обошлось обновление"""
+
+    def __init__(self, count: int):
+        self.matches = [make_match(index) for index in range(count)]
+        self.calls = []
+        self.missing = set()
+
+    def newest(self, size: int) -> list:
+        return list(reversed(self.matches))[:size]
+
+    async def get_matchlist(self, name, tag, region, size=10, mode=None, priority=None):
+        self.calls.append(('matchlist', size))
+        return {'data': self.newest(size)}, None
+
+    async def iter_matches(self, name, tag, region, since=None, mode=None, priority=None):
+        self.calls.append(('lifetime', since))
+        for match in self.newest(len(self.matches)):
+            yield {'meta': {'id': match['metadata']['matchid'], 'started_at': match['metadata']['game_start']}}
+
+    async def get_matches(self, match_ids, priority=None):
+        self.calls.append(('matches', tuple(match_ids)))
+        by_id = {match['metadata']['matchid']: match for match in self.matches}
+        return {match_id: {'data': by_id[match_id]} for match_id in match_ids if match_id not in self.missing}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MatchStore(str(tmp_path / 'matches.sqlite3'))
+    yield store
+    store.close()
+
+
+def refresh(client, store, **kwargs) -> int:
+    ingestor = MatchIngestor(client, store, probe_size=3, batch_size=10, **kwargs)
+    return asyncio.run(ingestor.refresh_player('Player', 'EU1', 'eu'))
+
+
+def stored_ids(store) -> list:
+    return [row['match_id'] for row in store.player_matches(PUUID)]
+
+
+def test_first_refresh_stores_short_history_whole(store):
+    client = FakeHenrik(5)
+
+    assert refresh(client, store) == 5
+    # Пробник не нашел сохраненных матчей - догружается пачка; 5 < 10, значит это вся история
+    assert client.calls == [('matchlist', 3), ('matchlist', 10)]
+    assert stored_ids(store) == ['m4', 'm3', 'm2', 'm1', 'm0']
+    assert store.get_ingest_state(PUUID)['last_match_id'] == 'm4'
+    assert store.count_player_matches('puuid-rival') == 5
+
+
+def test_probe_hit_costs_one_small_request(store):
+    client = FakeHenrik(5)
+    refresh(client, store)
+    client.matches += [make_match(5)]
+    client.calls.clear()
+
+    assert refresh(client, store) == 1
+    assert client.calls == [('matchlist', 3)]
+    assert stored_ids(store)[0] == 'm5'
+
+    client.calls.clear()
+    assert refresh(client, store) == 0
+    assert client.calls == [('matchlist', 3)]
+
+
+def test_gap_beyond_batch_is_filled_from_lifetime_list(store):
+    client = FakeHenrik(5)
+    refresh(client, store)
+    client.matches += [make_match(index) for index in range(5, 20)]
+    client.calls.clear()
+
+    assert refresh(client, store) == 15
+    gap_ids = tuple(f"m{index}" for index in range(9, 4, -1))
+    assert client.calls == [('matchlist', 3), ('matchlist', 10), ('lifetime', 1_700_000_000 + 4 * 3600),
+                            ('matches', gap_ids)]
+    assert stored_ids(store) == [f"m{index}" for index in range(19, -1, -1)]
+    assert store.get_ingest_state(PUUID)['last_match_id'] == 'm19'
+
+
+def test_unreachable_gap_stores_nothing(store):
+    client = FakeHenrik(5)
+    refresh(client, store)
+    client.matches += [make_match(index) for index in range(5, 20)]
+    client.missing = {'m7'}
+
+    assert refresh(client, store) == 0
+    # Дыры в истории нет: состояние прежнее, следующее обновление повторит попытку
+    assert stored_ids(store) == ['m4', 'm3', 'm2', 'm1', 'm0']
+    assert store.get_ingest_state(PUUID)['last_match_id'] == 'm4'
+
+    client.missing = set()
+    assert refresh(client, store) == 15
+
+
+def test_reingest_is_idempotent(store):
+    client = FakeHenrik(5)
+    refresh(client, store)
+    store.set_ingest_state(PUUID, None, 0)
+
+    # Состояние потеряно: те же матчи приходят снова и не дублируются
+    assert refresh(client, store) == 5
+    assert store.count_player_matches(PUUID) == 5
+    assert store.add_matches(client.matches) == 0
+
+
+def test_player_match_queries_filter_and_order(store):
+    store.add_matches([make_match(index) for index in range(6)])
+
+    assert [row['match_id'] for row in store.player_matches(PUUID, map_name='Lotus')] == ['m5', 'm3', 'm1']
+    assert [row['match_id'] for row in store.player_matches(PUUID, limit=2)] == ['m5', 'm4']
+    window = store.player_matches(PUUID, since=1_700_000_000 + 3600, until=1_700_000_000 + 3 * 3600)
+    assert [row['match_id'] for row in window] == ['m2', 'm1']
+    assert store.player_matches('puuid-rival', agent='Sage', mode='Competitive')[0]['won'] == 0
+    row = store.player_matches(PUUID, limit=1)[0]
+    assert (row['kills'], row['won'], row['rounds_won'], row['damage_made']) == (25, 1, 13, 3000)
+    assert store.has_match('m0') and not store.has_match('m9')
+
+
+def test_schema_is_created_once_with_query_indexes(tmp_path):
+    path = str(tmp_path / 'matches.sqlite3')
+    MatchStore(path).close()
+    store = MatchStore(path)
+    try:
+        indexes = {row[0] for row in store._conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        journal = store._conn.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        store.close()
+
+    assert {'idx_pm_puuid_started', 'idx_pm_puuid_map', 'idx_pm_puuid_agent', 'idx_pm_match'} <= indexes
+    assert journal == 'wal'
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import bot.handlers.inline as inline
+import bot.utils.job_queue as job_queue
+from bot.utils.card_cache import get_card_cache
+from bot.utils.load_shedding import get_load_shedder
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Заглушка источников; возвращает журнал запрошенных name#tag"""
+    calls = []
+
+    async def fetch(riot_id, tagline, deadline=None):
+        calls.append(f"{riot_id}#{tagline}")
+        return {'riot_id': riot_id, 'summary': {}}
+
+    monkeypatch.setattr(inline, 'fetch_profile_stats', fetch)
+    monkeypatch.setattr(inline, 'stats_caption', lambda riot_id, tagline, stats: f"{riot_id}#{tagline}")
+    monkeypatch.setattr(inline, 'INLINE_DEBOUNCE', 0.05)
+    monkeypatch.setattr(inline, 'CARD_STORAGE_CHAT_ID', 0)
+    return calls
+
+
+def test_typing_is_debounced_to_the_last_query(fetches):
+    async def scenario():
+        for query in ('Pla', 'Play', 'Player'):
+            inline.schedule_render(None, 7, query, 'EU1')
+            await asyncio.sleep(0.01)
+        # Пока задача не завершилась, ссылка на нее держится
+        assert 7 in inline._user_tasks
+        await inline._user_tasks[7]
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert fetches == ['Player#EU1']
+    assert get_card_cache().get('Player', 'EU1')[1] == 'Player#EU1'
+    assert 7 not in inline._user_tasks
+
+
+def test_without_storage_chat_answer_promises_summary_not_card(monkeypatch):
+    monkeypatch.setattr(inline, 'CARD_STORAGE_CHAT_ID', 0)
+    results, hit = inline.build_results('Nobody', 'NA1')
+
+    assert not hit
+    assert results[0].description == "Сводка собирается..."
+    assert "Карточка" not in results[0].input_message_content.message_text
+
+    monkeypatch.setattr(inline, 'CARD_STORAGE_CHAT_ID', -100)
+    results, _ = inline.build_results('Nobody', 'NA1')
+    assert results[0].description == "Карточка готовится..."
+
+
+def test_inline_render_uses_own_queue_and_keeps_shedder_metrics(fetches, monkeypatch):
+    monkeypatch.setattr(inline, 'CARD_STORAGE_CHAT_ID', -100)
+    rendered = []
+
+    async def render(bot, riot_id, tagline):
+        rendered.append(riot_id)
+
+    monkeypatch.setattr(inline, 'render_for_inline', render)
+    monkeypatch.setattr(job_queue, '_inline_queue', None)
+    profile_queue = inline.get_profile_queue()
+    chosen = dict(get_load_shedder().chosen)
+
+    async def scenario():
+        inline.schedule_render(None, 8, 'Player', 'EU1')
+        await inline._user_tasks[8]
+        await inline.get_inline_queue().close()
+
+    asyncio.run(scenario())
+
+    assert rendered == ['Player']
+    assert inline.get_inline_queue().finished == 1
+    assert profile_queue.finished == 0
+    assert get_load_shedder().chosen == chosen
@@ -0,0 +1,166 @@
+import asyncio
+import gc
+
+import pytest
+
+from api.clients.deadline import Deadline, DeadlineExceeded
+from bot.utils.job_queue import JobQueue, JobReplaced, QueueFull
+
+
+def run_with_loop_errors(scenario):
+    """Запустить сценарий и вернуть его результат вместе с ошибками, ушедшими в обработчик loop"""
+    errors = []
+
+    async def main():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        try:
+            return await scenario()
+        finally:
+            gc.collect()
+            await asyncio.sleep(0)
+
+    return asyncio.run(main()), errors
+
+
+def test_jobs_run_and_return_results():
+    async def scenario():
+        queue = JobQueue(workers=2, deadline=1.0)
+
+        async def work(value):
+            await asyncio.sleep(0.01)
+            return value * 2
+
+        jobs = [await queue.submit(key, lambda key=key: work(key)) for key in range(4)]
+        results = [await job.result() for job in jobs]
+        await queue.close()
+        return results, queue.metrics()
+
+    (results, metrics), errors = run_with_loop_errors(scenario)
+
+    assert results == [0, 2, 4, 6]
+    assert metrics['finished'] == 4
+    assert errors == []
+
+
+def test_same_key_replaces_pending_job_in_place():
+    async def scenario():
+        queue = JobQueue(workers=1, deadline=1.0)
+        release = asyncio.Event()
+        started = []
+
+        async def work(label):
+            started.append(label)
+            if label == 'blocker':
+                await release.wait()
+            return label
+
+        blocker = await queue.submit('other', lambda: work('blocker'))
+        await asyncio.sleep(0)
+        first = await queue.submit('user', lambda: work('first'))
+        behind = await queue.submit('third', lambda: work('behind'))
+        second = await queue.submit('user', lambda: work('second'))
+        positions = queue.position(second), queue.position(behind), queue.position(first)
+
+        release.set()
+        results = [await job.result() for job in (blocker, second, behind)]
+        with pytest.raises(JobReplaced):
+            await first.result()
+        await queue.close()
+        return started, positions, results, queue.replaced
+
+    (started, positions, results, replaced), errors = run_with_loop_errors(scenario)
+
+    # Новая задача заняла место прежней, а не встала за 'third'
+    assert positions == (1, 2, 0)
+    assert started == ['blocker', 'second', 'behind']
+    assert results == ['blocker', 'second', 'behind']
+    assert replaced == 1
+    assert errors == []
+
+
+def test_queue_full_rejects_new_keys_but_allows_replacement():
+    async def scenario():
+        queue = JobQueue(workers=1, deadline=1.0, max_size=2)
+        release = asyncio.Event()
+        await queue.submit('running', release.wait)
+        await asyncio.sleep(0)
+        await queue.submit('a', release.wait)
+        await queue.submit('b', release.wait)
+
+        with pytest.raises(QueueFull):
+            await queue.submit('c', release.wait)
+        replacement = await queue.submit('a', release.wait)
+        queued = queue.queued
+
+        release.set()
+        await replacement.result()
+        await queue.close()
+        return queued
+
+    queued, errors = run_with_loop_errors(scenario)
+
+    assert queued == 2
+    assert errors == []
+
+
+def test_job_past_its_deadline_is_not_started():
+    async def scenario():
+        queue = JobQueue(workers=1, deadline=5.0)
+        started = []
+
+        async def slow():
+            await asyncio.sleep(0.15)
+
+        async def record(label):
+            started.append(label)
+
+        await queue.submit('slow', slow)
+        await asyncio.sleep(0)
+        # Отправитель не ждет результата - как обработчик, сдавшийся по своему дедлайну
+        await queue.submit('late', lambda: record('late'), deadline=Deadline(0.05))
+        await asyncio.sleep(0.3)
+        # Следующая задача освобождает воркер от истекшей, и ее future собирается сборщиком мусора
+        await (await queue.submit('next', lambda: record('next'))).result()
+        gc.collect()
+        metrics = queue.metrics()
+        await queue.close()
+        return started, metrics
+
+    (started, metrics), errors = run_with_loop_errors(scenario)
+
+    assert started == ['next']
+    assert metrics['timed_out'] == 1
+    assert metrics['finished'] == 3
+    # Исключение истекшей задачи помечено полученным: loop не сообщает о "never retrieved"
+    assert errors == []
+
+
+def test_expired_job_result_raises_deadline_exceeded():
+    async def scenario():
+        queue = JobQueue(workers=1, deadline=5.0)
+        await queue.submit('slow', lambda: asyncio.sleep(0.1))
+        await asyncio.sleep(0)
+        job = await queue.submit('late', lambda: asyncio.sleep(0), deadline=Deadline(0.02))
+        try:
+            await job.result()
+        finally:
+            await queue.close()
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+
+
+def test_running_job_cancelled_by_queue_deadline():
+    async def scenario():
+        queue = JobQueue(workers=1, deadline=0.05)
+        job = await queue.submit('hang', lambda: asyncio.sleep(10))
+        await asyncio.sleep(0.15)
+        metrics = queue.metrics()
+        await queue.close()
+        return job.future.done(), metrics
+
+    (done, metrics), errors = run_with_loop_errors(scenario)
+
+    assert done
+    assert metrics['timed_out'] == 1
+    assert errors == []
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import time
+
+from bot.utils.load_shedding import LoadShedder
+
+
+def shedder() -> LoadShedder:
+    return LoadShedder(lite_depth=4, text_depth=12, lite_latency=20.0, text_latency=40.0, latency_ttl=60.0, alpha=0.5)
+
+
+def test_mode_follows_queue_depth():
+    load = shedder()
+
+    assert [load.choose(queued) for queued in (0, 3, 4, 11, 12, 50)] == ['full', 'full', 'lite', 'lite', 'text', 'text']
+    assert load.metrics()['chosen'] == {'full': 2, 'lite': 2, 'text': 2}
+
+
+def test_mode_follows_smoothed_render_latency():
+    load = shedder()
+    load.record_render(10.0)
+    assert load.choose(0) == 'full'
+
+    load.record_render(30.0)
+    assert load.render_latency == 20.0
+    assert load.choose(0) == 'lite'
+
+    load.record_render(80.0)
+    assert load.choose(0) == 'text'
+    assert load.metrics()['render_latency'] == 50.0
+
+
+def test_stale_latency_stops_shedding(monkeypatch):
+    load = shedder()
+    load.record_render(100.0)
+    assert load.choose(0) == 'text'
+
+    # Полных рендеров в режиме text нет, поэтому замер устаревает и режим возвращается
+    real = time.monotonic
+    monkeypatch.setattr(time, 'monotonic', lambda: real() + 61)
+    assert load.choose(0) == 'full'
+    assert load.metrics()['render_latency'] == 0.0
+
+
+def test_mode_probe_is_not_counted():
+    load = shedder()
+
+    assert load.mode(20) == 'text'
+    assert load.metrics()['chosen'] == {'full': 0, 'lite': 0, 'text': 0}
+
+
+def test_health_reports_chosen_modes(monkeypatch):
+    import bot.aiogram_run as aiogram_run
+    import bot.utils.load_shedding as load_shedding
+
+    load = shedder()
+    load.choose(0)
+    load.choose(5)
+    monkeypatch.setattr(load_shedding, '_shedder', load)
+
+    response = asyncio.run(aiogram_run.health(None))
+    body = json.loads(response.body)
+
+    assert body['status'] == 'ok'
+    assert body['load_shedding']['chosen'] == {'full': 1, 'lite': 1, 'text': 0}
+    assert body['profile_queue']['queued'] == 0
+    assert 'inline_queue' in body
@@ -0,0 +1,84 @@
+import numpy as np
+
+from api.storage.files import read_meta, write_meta
+from api.storage.mmr_series import DAY, MMRSeries, MMRSeriesStore
+
+START = 1_700_000_000 - 1_700_000_000 % DAY
+
+
+def point(day: int, hour: int, elo: int, change: int, season: str = 'e9a1') -> dict:
+    return {'timestamp': START + day * DAY + hour * 3600, 'elo': elo, 'rr': elo % 100, 'tier': elo // 100,
+            'change': change, 'season': season}
+
+
+def assert_levels_equal(left: dict, right: dict):
+    assert left.keys() == right.keys()
+    for name in left:
+        np.testing.assert_array_equal(left[name], right[name], err_msg=name)
+
+
+def test_stored_levels_match_full_recompute_across_appends(tmp_path):
+    store = MMRSeriesStore(str(tmp_path))
+    batches = [
+        [point(0, 1, 1000, 20), point(0, 2, 1015, 15)],
+        # Продолжает открытую группу дня 0 и открывает день 1
+        [point(0, 5, 1000, -15), point(1, 3, 1020, 20)],
+        [point(1, 4, 1040, 20), point(3, 1, 1030, -10, 'e9a2'), point(3, 2, 1030, 0, 'e9a2')],
+    ]
+    for batch in batches:
+        store.append('p1', batch)
+        series = store.load('p1')
+        recomputed = MMRSeries(series.columns, series.seasons)
+        for level in MMRSeriesStore.STORED_LEVELS:
+            assert_levels_equal(series.level(level), recomputed.level(level))
+
+    day = store.load('p1').level('day')
+    assert day['games'].tolist() == [3, 2, 2]
+    assert day['change'].tolist() == [20, 40, -10]
+    assert store.load('p1').level('act')['games'].tolist() == [5, 2]
+    # Закрытые группы лежат на диске, открытая досчитывается при загрузке
+    assert (tmp_path / 'p1' / 'day_games.bin').stat().st_size == 2 * 4
+
+
+def test_series_written_before_stored_levels_is_folded_on_next_append(tmp_path):
+    store = MMRSeriesStore(str(tmp_path))
+    store.append('p1', [point(0, 1, 1000, 20), point(1, 1, 1020, 20)])
+    directory = str(tmp_path / 'p1')
+    meta = read_meta(directory, {})
+    del meta['levels']
+    write_meta(directory, meta)
+    store = MMRSeriesStore(str(tmp_path))
+
+    store.append('p1', [point(2, 1, 1040, 20)])
+
+    assert store.load('p1').level('day')['games'].tolist() == [1, 1, 1]
+
+
+def test_loaded_series_cache_is_bounded(tmp_path):
+    store = MMRSeriesStore(str(tmp_path), cache_size=2)
+    for puuid in ('a', 'b', 'c'):
+        store.append(puuid, [point(0, 1, 1000, 20)])
+        store.load(puuid)
+
+    assert len(store._loaded) == 2
+    assert 'a' not in store._loaded
+
+
+def test_trend_streak_skips_zero_rr_games():
+    changes = [-10, 20, 15, 0, 18, 0]
+    columns = {
+        'timestamp': np.arange(len(changes), dtype=np.int64) + START,
+        'elo': np.full(len(changes), 1000, dtype=np.int32),
+        'rr': np.zeros(len(changes), dtype=np.int16),
+        'tier': np.zeros(len(changes), dtype=np.int16),
+        'change': np.asarray(changes, dtype=np.int16),
+        'season': np.zeros(len(changes), dtype=np.int32),
+    }
+
+    trend = MMRSeries(columns, ['e9a1']).trend()
+
+    assert trend['streak'] == 3
+    assert (trend['wins'], trend['losses'], trend['games']) == (3, 1, 6)
+
+    columns['change'] = np.zeros(len(changes), dtype=np.int16)
+    assert MMRSeries(columns, ['e9a1']).trend()['streak'] == 0
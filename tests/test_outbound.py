@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetUpdates, SendMessage
+
+from bot.middlewares.outbound import OutboundRateLimiter
+
+
+def shift_clock(monkeypatch, seconds: float):
+    real = time.monotonic
+    monkeypatch.setattr(time, 'monotonic', lambda: real() + seconds)
+
+
+def limiter_middleware(**kwargs) -> OutboundRateLimiter:
+    return OutboundRateLimiter(global_rate=100.0, chat_rate=100.0, group_per_minute=600.0, chat_burst=3, **kwargs)
+
+
+def test_idle_chat_limiter_expires(monkeypatch):
+    middleware = limiter_middleware()
+    limiter = middleware._chat_limiter(42)
+
+    shift_clock(monkeypatch, OutboundRateLimiter.CHAT_IDLE_TTL + 1)
+
+    assert middleware._chat_limiter(42) is not limiter
+
+
+def test_blocked_chat_limiter_outlives_idle_ttl(monkeypatch):
+    middleware = limiter_middleware()
+    limiter = middleware._chat_limiter(42)
+    limiter.block_for(300)
+    middleware._chat_limiter(42)
+
+    shift_clock(monkeypatch, 200)
+
+    # Блокировка на 300 с не теряется вместе с записью кэша через 60 с
+    assert middleware._chat_limiter(42) is limiter
+    assert limiter.blocked_until > time.monotonic()
+
+
+def test_retry_after_blocks_chat_and_retries():
+    async def scenario():
+        middleware = limiter_middleware(max_retries=2)
+        method = SendMessage(chat_id=42, text='hi')
+        calls = []
+
+        async def make_request(bot, request):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise TelegramRetryAfter(request, 'Too Many Requests', retry_after=1)
+            return 'ok'
+
+        result = await middleware(make_request, None, method)
+        return middleware, result, calls
+
+    middleware, result, calls = asyncio.run(scenario())
+
+    assert result == 'ok'
+    assert calls[1] - calls[0] >= 0.95
+    assert middleware.retried == 1
+    # Блок лег на чат, а не на весь бот
+    assert middleware.global_.blocked_until == 0.0
+
+
+def test_retries_exhausted_reraise():
+    async def scenario():
+        middleware = limiter_middleware(max_retries=0)
+
+        async def make_request(bot, request):
+            raise TelegramRetryAfter(request, 'Too Many Requests', retry_after=30)
+
+        try:
+            await middleware(make_request, None, SendMessage(chat_id=-100, text='hi'))
+        except TelegramRetryAfter:
+            return middleware
+        raise AssertionError("TelegramRetryAfter не проброшен")
+
+    middleware = asyncio.run(scenario())
+
+    assert middleware.failed == 1
+
+
+def test_get_updates_bypasses_limits():
+    async def scenario():
+        middleware = limiter_middleware()
+        middleware.global_.block_for(60)
+
+        async def make_request(bot, request):
+            return 'updates'
+
+        return await asyncio.wait_for(middleware(make_request, None, GetUpdates()), 1.0)
+
+    assert asyncio.run(scenario()) == 'updates'
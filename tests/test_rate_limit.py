@@ -0,0 +1,208 @@
+import asyncio
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+
+from api.clients.rate_limit import Priority, RateLimiter, parse_retry_after
+
+
+def blocked_for(limiter: RateLimiter) -> float:
+    return limiter.blocked_until - time.monotonic()
+
+
+def test_burst_is_granted_without_waiting():
+    async def scenario():
+        limiter = RateLimiter('test', rate=1.0, burst=3)
+        waits = [await limiter.acquire() for _ in range(3)]
+        return limiter, waits
+
+    limiter, waits = asyncio.run(scenario())
+
+    assert waits == [0.0, 0.0, 0.0]
+    assert limiter.granted == 3
+    assert limiter.throttled == 0
+
+
+def test_waiters_served_by_priority_then_fifo():
+    async def scenario():
+        limiter = RateLimiter('test', rate=50.0, burst=1)
+        await limiter.acquire()
+        order = []
+
+        async def waiter(label, priority):
+            await limiter.acquire(priority)
+            order.append(label)
+
+        tasks = []
+        for label, priority in (('bg1', Priority.BACKGROUND), ('bg2', Priority.BACKGROUND),
+                                ('ui1', Priority.INTERACTIVE), ('ui2', Priority.INTERACTIVE)):
+            tasks.append(asyncio.ensure_future(waiter(label, priority)))
+            await asyncio.sleep(0)
+        metrics = limiter.metrics()
+        await asyncio.gather(*tasks)
+        return order, metrics
+
+    order, metrics = asyncio.run(scenario())
+
+    assert order == ['ui1', 'ui2', 'bg1', 'bg2']
+    assert metrics['queue_depth'] == 4
+    assert metrics['queue_interactive'] == 2
+    assert metrics['queue_background'] == 2
+
+
+def test_cancelled_waiter_does_not_take_a_token():
+    async def scenario():
+        limiter = RateLimiter('test', rate=10.0, burst=1)
+        await limiter.acquire()
+        cancelled = asyncio.ensure_future(limiter.acquire(Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        survivor = asyncio.ensure_future(limiter.acquire(Priority.BACKGROUND))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        waited = await asyncio.wait_for(survivor, 1.0)
+        return limiter, cancelled, waited
+
+    limiter, cancelled, waited = asyncio.run(scenario())
+
+    assert cancelled.cancelled()
+    # Один интервал токена (0.1 с), а не два
+    assert waited < 0.18
+    assert limiter.metrics()['queue_depth'] == 0
+    assert limiter.granted == 2
+
+
+def test_block_for_delays_queue():
+    async def scenario():
+        limiter = RateLimiter('test', rate=100.0, burst=5)
+        limiter.block_for(0.15)
+        return await limiter.acquire()
+
+    waited = asyncio.run(scenario())
+
+    assert waited >= 0.14
+
+
+def test_block_for_never_shortens_a_block():
+    limiter = RateLimiter('test', rate=1.0, burst=1)
+    limiter.block_for(10)
+    limiter.block_for(1)
+
+    assert blocked_for(limiter) > 9
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('5', 5.0),
+    ('0.5', 0.5),
+    ('-3', 0.0),
+    ('', None),
+    (None, None),
+    ('soon', None),
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    value = formatdate(time.time() + 30, usegmt=True)
+
+    assert 28 <= parse_retry_after(value) <= 30
+
+
+def test_retry_after_header_blocks():
+    limiter = RateLimiter('test', rate=1.0, burst=1)
+
+    assert limiter.update_from_headers(429, {'Retry-After': '7'}) == 7.0
+    assert 6 < blocked_for(limiter) <= 7
+
+
+def test_429_without_retry_after_uses_token_interval():
+    limiter = RateLimiter('test', rate=0.2, burst=1)
+
+    assert limiter.update_from_headers(429, {}) == 5.0
+
+
+def test_success_without_headers_does_not_block():
+    limiter = RateLimiter('test', rate=1.0, burst=1)
+
+    assert limiter.update_from_headers(200, {}) is None
+    assert limiter.blocked_until == 0.0
+
+
+def test_exhausted_ratelimit_blocks_until_reset_seconds():
+    limiter = RateLimiter('test', rate=1.0, burst=1)
+
+    paused = limiter.update_from_headers(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '12'})
+
+    assert paused == 12.0
+    assert 11 < blocked_for(limiter) <= 12
+
+
+def test_exhausted_ratelimit_blocks_until_reset_timestamp():
+    limiter = RateLimiter('test', rate=1.0, burst=1)
+
+    paused = limiter.update_from_headers(200, {'X-RateLimit-Remaining': '0',
+                                               'X-RateLimit-Reset': str(int(time.time()) + 20)})
+
+    assert 18 <= paused <= 20
+
+
+def test_longer_of_retry_after_and_reset_wins():
+    limiter = RateLimiter('test', rate=1.0, burst=1)
+
+    paused = limiter.update_from_headers(429, {'Retry-After': '3', 'X-RateLimit-Remaining': '0',
+                                               'X-RateLimit-Reset': '8'})
+
+    assert paused == 8.0
+
+
+def test_remaining_caps_local_tokens():
+    limiter = RateLimiter('test', rate=1.0, burst=10)
+
+    assert limiter.update_from_headers(200, {'X-RateLimit-Remaining': '2', 'X-RateLimit-Reset': '60'}) is None
+    assert limiter.tokens == 2.0
+    assert limiter.blocked_until == 0.0
+
+
+def test_malformed_ratelimit_headers_are_ignored():
+    limiter = RateLimiter('test', rate=1.0, burst=10)
+
+    assert limiter.update_from_headers(200, {'X-RateLimit-Remaining': 'n/a', 'X-RateLimit-Reset': '60'}) is None
+    assert limiter.tokens == 10.0
+
+
+def test_acquire_blocking_from_worker_thread():
+    async def scenario():
+        limiter = RateLimiter('test', rate=20.0, burst=1)
+        loop = asyncio.get_running_loop()
+        first = await asyncio.to_thread(limiter.acquire_blocking, loop)
+        second = await asyncio.to_thread(limiter.acquire_blocking, loop, Priority.BACKGROUND)
+        return limiter, first, second
+
+    limiter, first, second = asyncio.run(scenario())
+
+    assert first is True and second is True
+    assert limiter.granted == 2
+    assert limiter.throttled == 1
+
+
+def test_acquire_blocking_cancelled_by_event():
+    async def scenario():
+        limiter = RateLimiter('test', rate=1.0, burst=1)
+        limiter.block_for(60)
+        loop = asyncio.get_running_loop()
+        cancel_event = threading.Event()
+        call = asyncio.ensure_future(asyncio.to_thread(limiter.acquire_blocking, loop, Priority.INTERACTIVE, cancel_event))
+        await asyncio.sleep(0.05)
+        cancel_event.set()
+        result = await asyncio.wait_for(call, 2.0)
+        await asyncio.sleep(0)
+        return limiter, result
+
+    limiter, result = asyncio.run(scenario())
+
+    assert result is False
+    assert limiter.metrics()['queue_depth'] == 0
+    assert limiter.granted == 0
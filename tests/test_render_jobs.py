@@ -0,0 +1,196 @@
+import asyncio
+import json
+import threading
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+import api.services.render_jobs as render_jobs
+import utils.card_generator as CardGen
+from api.clients.deadline import Deadline, DeadlineExceeded
+from utils.browser_pool import BrowserPool
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Заглушки источников и рендера; возвращает журнал вызовов"""
+    calls = []
+
+    async def fetch(riot_id, tagline, deadline=None):
+        calls.append(('fetch', riot_id))
+        await asyncio.sleep(0.01)
+        return None if riot_id == 'nobody' else {'riot_id': riot_id, 'summary': {}}
+
+    async def generate(stats_source, riot_id, tagline, deadline=None):
+        calls.append(('browser', riot_id))
+        stats = await stats_source
+        await asyncio.sleep(0.02)
+        calls.append(('rendered', riot_id))
+        return f"png:{riot_id}".encode() if stats else None
+
+    monkeypatch.setattr(render_jobs, 'fetch_profile_stats', fetch)
+    monkeypatch.setattr(CardGen, 'generate_profile_card_pipelined', generate)
+    return calls
+
+
+def test_local_backend_fetches_and_reports_stats_before_card(pipeline):
+    async def scenario():
+        events = []
+
+        async def on_stats(stats):
+            events.append(('stats', stats['riot_id']))
+
+        card = await render_jobs.LocalRenderBackend().submit('Player', 'EU1', Deadline(5), on_stats=on_stats)
+        events.append(('card', card['image']))
+        return events, card
+
+    events, card = asyncio.run(scenario())
+
+    assert events == [('stats', 'Player'), ('card', b'png:Player')]
+    assert card['stats'] == {'riot_id': 'Player', 'summary': {}}
+    # Браузер берется, пока статистика еще собирается
+    assert set(pipeline[:2]) == {('fetch', 'Player'), ('browser', 'Player')}
+
+
+@pytest.fixture
+def render_service(monkeypatch):
+    """Бот и воркер рендера на общем fakeredis; возвращает фабрику (бэкенд бота, задача воркера, стоп)"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(render_jobs.aioredis, 'from_url', lambda url: fakeredis.aioredis.FakeRedis(server=server))
+
+    def start():
+        bot_side = render_jobs.RedisRenderBackend('redis://fake')
+        worker_side = render_jobs.RedisRenderBackend('redis://fake')
+        monkeypatch.setattr(render_jobs, '_backend', worker_side)
+        stop = asyncio.Event()
+
+        async def next_job(poll_timeout):
+            # fakeredis с redis-py теряет отмену посреди команды, поэтому воркер
+            # опрашивает список и сам завершается по флагу
+            if stop.is_set():
+                raise asyncio.CancelledError
+            item = await worker_side.redis.rpop(render_jobs.JOBS_KEY)
+            if item is None:
+                await asyncio.sleep(0.01)
+            return json.loads(item) if item else None
+
+        monkeypatch.setattr(worker_side, 'next_job', next_job)
+        return bot_side, asyncio.ensure_future(render_jobs.run_render_worker(1)), stop
+
+    return start
+
+
+def test_redis_worker_fetches_renders_and_streams_stats(pipeline, render_service):
+    async def scenario():
+        bot_side, worker, stop = render_service()
+        events = []
+
+        async def on_stats(stats):
+            # Статистику бот видит до того, как воркер дорендерил карточку
+            events.append(('stats', stats['riot_id'], ('rendered', 'Player') in pipeline))
+
+        try:
+            card = await bot_side.submit('Player', 'EU1', Deadline(5), on_stats=on_stats)
+            missing = await bot_side.submit('nobody', 'EU1', Deadline(5))
+        finally:
+            stop.set()
+            await asyncio.gather(worker, return_exceptions=True)
+        return events, card, missing
+
+    events, card, missing = asyncio.run(scenario())
+
+    assert events == [('stats', 'Player', False)]
+    assert card == {'image': b'png:Player', 'stats': {'riot_id': 'Player', 'summary': {}}}
+    assert missing is None
+    assert [call for call in pipeline if call[0] == 'fetch'] == [('fetch', 'Player'), ('fetch', 'nobody')]
+
+
+def test_redis_worker_skips_jobs_expired_in_queue(pipeline, render_service):
+    async def scenario():
+        bot_side, worker, stop = render_service()
+        try:
+            # Бот уже сдался: дедлайн задачи истек, пока она лежала в очереди
+            await bot_side.redis.lpush(render_jobs.JOBS_KEY, json.dumps(
+                {'id': 'stale', 'riot_id': 'Old', 'tagline': 'EU1', 'deadline': 0, 'notify': False}))
+            card = await bot_side.submit('Player', 'EU1', Deadline(5))
+        finally:
+            stop.set()
+            await asyncio.gather(worker, return_exceptions=True)
+        return card, await bot_side.redis.exists(f"{render_jobs.RESULT_PREFIX}stale")
+
+    card, stale_result = asyncio.run(scenario())
+
+    assert card['image'] == b'png:Player'
+    assert stale_result == 0
+    assert ('fetch', 'Old') not in pipeline
+
+
+class FakeDriver:
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def quit(self):
+        self.closed.set()
+
+
+@pytest.fixture
+def browsers(monkeypatch):
+    """Пул на один браузер без Chrome: скриншот висит, пока браузер не закроют"""
+    pool = BrowserPool(size=1)
+    drivers = []
+
+    def launch():
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    def capture(driver, html, deadline=None):
+        if driver.closed.wait(0.05 if html == 'fast' else 2):
+            raise RuntimeError("invalid session id")
+        return b'png'
+
+    monkeypatch.setattr(pool, '_launch', launch)
+    monkeypatch.setattr(CardGen, 'get_browser_pool', lambda: pool)
+    monkeypatch.setattr(CardGen, 'build_card_html', lambda stats, riot_id, tagline: stats['html'])
+    monkeypatch.setattr(CardGen, 'capture_card', capture)
+    return pool, drivers
+
+
+def test_deadline_during_capture_closes_browser_as_broken(browsers):
+    pool, drivers = browsers
+
+    async def scenario():
+        stats = asyncio.get_running_loop().create_future()
+        stats.set_result({'html': 'slow'})
+        with pytest.raises(DeadlineExceeded):
+            await Deadline(0.2).run(CardGen.generate_profile_card_pipelined(stats, 'Player', 'EU1'), stage='render')
+        # Слот свободен сразу, не дожидаясь потока скриншота
+        await asyncio.wait_for(pool._slots.acquire(), 0.1)
+        pool._slots.release()
+
+    asyncio.run(scenario())
+
+    assert drivers[0].closed.wait(1)
+    assert (pool.discarded, pool.metrics()['idle']) == (1, 0)
+
+
+def test_cancel_while_waiting_for_stats_returns_warm_browser(browsers):
+    pool, drivers = browsers
+
+    async def scenario():
+        stats = asyncio.get_running_loop().create_future()
+        render = asyncio.ensure_future(CardGen.generate_profile_card_pipelined(stats, 'Player', 'EU1'))
+        while not drivers:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        render.cancel()
+        await asyncio.gather(render, return_exceptions=True)
+
+        # Браузер не понадобился, но он цел - следующий рендер берет его из пула
+        stats = asyncio.get_running_loop().create_future()
+        stats.set_result({'html': 'fast'})
+        return await CardGen.generate_profile_card_pipelined(stats, 'Player', 'EU1')
+
+    assert asyncio.run(scenario()) == b'png'
+    assert len(drivers) == 1 and not drivers[0].closed.is_set()
+    assert (pool.reused, pool.discarded, pool.metrics()['idle']) == (1, 0, 1)
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.clients.egress import EgressPool, EgressSession
+from api.clients.scraper_pool import ScraperPool, ScraperPoolFull, interruptible_sleep
+
+
+@pytest.fixture
+def pool(tmp_path):
+    egress = EgressPool([EgressSession(f"s{index}", jar_path=str(tmp_path / f"jar_{index}.json")) for index in range(2)])
+    pool = ScraperPool(egress, max_workers=1, max_queue=2)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def test_full_queue_rejects_new_work_until_it_drains(pool):
+    gate = threading.Event()
+
+    def blocked(session, cancel_event):
+        gate.wait(5)
+        return session.name
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(blocked))
+        while pool.running == 0:
+            await asyncio.sleep(0.01)
+        queued = [asyncio.ensure_future(pool.run(blocked)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        # Поток занят, две задачи ждут - очередь max_queue=2 заполнена
+        assert (pool.metrics()['running'], pool.metrics()['queue_depth']) == (1, 2)
+        with pytest.raises(ScraperPoolFull):
+            await pool.run(blocked)
+        with pytest.raises(ScraperPoolFull):
+            await pool.run(blocked)
+        gate.set()
+        await asyncio.gather(running, *queued)
+        return await pool.run(blocked)
+
+    assert asyncio.run(scenario()) in ('s0', 's1')
+    metrics = pool.metrics()
+    assert (metrics['rejected'], metrics['completed'], metrics['queue_depth'], metrics['running']) == (2, 4, 0, 0)
+    assert metrics['max_queue_depth'] == 2
+
+
+def test_timeout_sets_cancel_event_of_running_task(pool):
+    started = threading.Event()
+
+    def slow(session, cancel_event):
+        started.set()
+        interruptible_sleep(cancel_event, 5)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(slow, timeout=0.1)
+
+    began = time.monotonic()
+    asyncio.run(scenario())
+    pool.shutdown(wait=True)
+
+    assert started.is_set()
+    assert time.monotonic() - began < 2
+    metrics = pool.metrics()
+    # Поток вышел по cancel_event, а не дождался 5 секунд сна
+    assert (metrics['cancelled'], metrics['failed'], metrics['running']) == (1, 0, 0)
+
+
+def test_cancelled_queued_task_never_runs(pool):
+    gate = threading.Event()
+    ran = []
+
+    def blocked(session, cancel_event):
+        gate.wait(5)
+
+    def queued(session, cancel_event):
+        ran.append(session.name)
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(blocked))
+        while pool.running == 0:
+            await asyncio.sleep(0.01)
+        waiting = asyncio.ensure_future(pool.run(queued))
+        await asyncio.sleep(0.01)
+        assert pool.metrics()['queue_depth'] == 1
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        # Отмененная корутина сразу снимает задачу из очереди
+        assert pool.metrics()['queue_depth'] == 0
+        gate.set()
+        await running
+
+    asyncio.run(scenario())
+    pool.shutdown(wait=True)
+
+    assert ran == []
+    metrics = pool.metrics()
+    assert (metrics['cancelled'], metrics['completed'], metrics['queue_depth']) == (1, 1, 0)
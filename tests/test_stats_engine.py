@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from api.analytics.stats_engine import MatchArrays, StatsEngine, synthetic_arrays
+
+
+def row(started_at: int, agent: str, map_name: str, season: str, won: int, kills: int, deaths: int,
+        headshots: int = 1, bodyshots: int = 3, tier: int = 12) -> dict:
+    return {'started_at': started_at, 'agent': agent, 'map': map_name, 'season_id': season, 'mode': 'Competitive',
+            'won': won, 'kills': kills, 'deaths': deaths, 'assists': 2, 'score': 200 * kills, 'tier': tier,
+            'rounds_played': 20, 'rounds_won': 13 if won else 7, 'headshots': headshots, 'bodyshots': bodyshots,
+            'legshots': 0, 'damage_made': 150 * kills, 'attack_kills': kills // 2, 'attack_deaths': deaths // 2,
+            'defense_kills': kills - kills // 2, 'defense_deaths': deaths - deaths // 2}
+
+
+ROWS = [
+    row(100, 'Jett', 'Bind', 'e9a1', 1, 20, 10),
+    row(200, 'Jett', 'Lotus', 'e9a2', 0, 10, 0),
+    row(300, 'Sage', 'Bind', 'e9a2', 1, 15, 5, headshots=0, bodyshots=0, tier=15),
+]
+
+
+def test_grouped_bincount_matches_row_by_row_sums():
+    arrays = synthetic_arrays(500, seed=7)
+    engine = StatsEngine()
+
+    grouped = engine.grouped(arrays, 'agent')
+
+    codes = arrays.columns['agent']
+    for code in range(len(arrays.dictionaries['agent'])):
+        mask = codes == code
+        assert grouped['matches'][code] == mask.sum()
+        for name in StatsEngine.SUM_COLUMNS:
+            assert grouped[name][code] == arrays.columns[name][mask].astype(np.int64).sum(), name
+
+
+def test_group_stats_derived_metrics_by_hand():
+    stats = {group['name']: group for group in StatsEngine().group_stats(MatchArrays.from_rows(ROWS), 'agent')}
+
+    jett = stats['Jett']
+    assert (jett['matches_played'], jett['matches_won'], jett['win_rate']) == (2, 1, 50.0)
+    assert jett['kd_ratio'] == pytest.approx(30 / 10)
+    assert jett['headshot_percentage'] == pytest.approx(2 / 8 * 100)
+    assert jett['damage_per_round'] == pytest.approx(150 * 30 / 40)
+    # Без смертей K/D равен числу убийств, без выстрелов HS% равен нулю
+    assert stats['Sage']['headshot_percentage'] == 0.0
+    assert list(stats) == ['Jett', 'Sage']
+
+
+def test_summarize_current_season_uses_latest_match():
+    summary = StatsEngine().summarize(MatchArrays.from_rows(ROWS), riot_id='Player#EU1')
+
+    season = summary['current_season']
+    assert season['season_name'] == 'e9a2'
+    assert (season['matches_played'], season['kills'], season['deaths']) == (2, 25, 5)
+    # Ранг - по тиру последнего матча (15 - Platinum 1)
+    assert season['rank'] == 'Platinum 1'
+    assert [agent['name'] for agent in summary['top_agents']] == ['Jett', 'Sage']
+    assert StatsEngine().summarize(MatchArrays.from_rows(ROWS), season=None)['current_season']['matches_played'] == 3
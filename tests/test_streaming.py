@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from api.clients.streaming import MatchListStreamParser, extract_player_view
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'v3_matches.json')
+
+
+def load_fixture() -> bytes:
+    with open(FIXTURE, 'rb') as f:
+        return f.read()
+
+
+def parse_in_chunks(payload: bytes, size: int, **kwargs) -> list:
+    parser = MatchListStreamParser(**kwargs)
+    items = []
+    for start in range(0, len(payload), size):
+        items.extend(parser.feed(payload[start:start + size]))
+    items.extend(parser.close())
+    return items
+
+
+def without_rounds(match: dict) -> dict:
+    return {**match, 'rounds': None}
+
+
+@pytest.mark.parametrize('size', [1, 7, 100, 4096, 1 << 20])
+def test_recorded_payload_matches_json_loads(size):
+    payload = load_fixture()
+    expected = json.loads(payload)['data']
+
+    items = parse_in_chunks(payload, size)
+
+    assert items == [without_rounds(match) for match in expected]
+
+
+@pytest.mark.parametrize('name, tag', [('Порше', 'RU1'), ('quote"man', 'q\\1'), ('porsche enjoyer', 'ild')])
+def test_player_view_same_as_full_parse(name, tag):
+    payload = load_fixture()
+    expected = [extract_player_view(match, name, tag) for match in json.loads(payload)['data']]
+
+    views = [extract_player_view(match, name, tag) for match in parse_in_chunks(payload, 513)]
+
+    assert views == expected
+    assert all(view and view['player']['name'] == name for view in views)
+
+
+def test_every_split_inside_strings_and_escapes():
+    match = {
+        'metadata': {'matchid': 'a"b\\c', 'map': 'Ascent \\"quoted\\"', 'note': 'ф✨ ] } [ {'},
+        'players': {'all_players': [{'name': '\\', 'tag': '"', 'stats': {'kills': 1}}]},
+        'rounds': [{'text': 'end ]}"', 'nested': [[1, [2]]]}],
+    }
+    payload = json.dumps({'status': 200, 'data': [match, match]}).encode('utf-8')
+    raw = json.dumps({'data': [match]}, ensure_ascii=False).encode('utf-8')
+
+    for data in (payload, raw):
+        count = len(json.loads(data)['data'])
+        for split in range(1, len(data)):
+            parser = MatchListStreamParser()
+            items = parser.feed(data[:split]) + parser.feed(data[split:]) + parser.close()
+            assert items == [without_rounds(match)] * count, split
+
+
+def test_rounds_skipped_only_at_top_level():
+    match = {
+        'metadata': {'matchid': 'm1', 'rounds': [1, 2, 3]},
+        'note': 'rounds',
+        'rounds': [{'player_stats': [{'damage_events': [{'damage': 10}]}]}],
+        'kills': [{'round': 0}],
+    }
+    payload = json.dumps({'data': [match]}).encode('utf-8')
+
+    item, = parse_in_chunks(payload, 3)
+
+    assert item['rounds'] is None
+    assert item['metadata']['rounds'] == [1, 2, 3]
+    assert item['note'] == 'rounds'
+    assert item['kills'] == [{'round': 0}]
+
+
+def test_custom_skip_keys():
+    match = {'rounds': [1], 'kills': [{'round': 0}], 'players': {'all_players': []}}
+    payload = json.dumps({'data': [match]}).encode('utf-8')
+
+    item, = parse_in_chunks(payload, 5, skip_keys=('kills', 'players'))
+
+    assert item == {'rounds': [1], 'kills': None, 'players': None}
+
+
+def test_nested_arrays_and_empty_containers():
+    match = {'a': [[], [[1, [2, [3]]]], {}], 'b': {'c': [[{'d': []}]]}, 'rounds': [[[]], [[{}]]], 'e': []}
+    payload = json.dumps({'status': 200, 'data': [match, [], {}]}).encode('utf-8')
+
+    items = parse_in_chunks(payload, 2)
+
+    assert items == [without_rounds(match), [], {}]
+
+
+def test_null_and_empty_data():
+    assert parse_in_chunks(b'{"status": 404, "data": null}', 4) == []
+    assert parse_in_chunks(b'{"status": 200, "data": [ ]}', 4) == []
+
+
+def test_truncated_payload_raises_on_close():
+    payload = json.dumps({'data': [{'metadata': {'matchid': 'm1'}}, {'metadata': {}}]}).encode('utf-8')
+    parser = MatchListStreamParser()
+
+    items = parser.feed(payload[:-20])
+
+    assert items == [{'metadata': {'matchid': 'm1'}}]
+    with pytest.raises(ValueError):
+        parser.close()
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from aiogram.filters import CommandObject
+from aiogram.types import Chat, Message, User
+
+from bot.middlewares.throttling import ThrottlingMiddleware, TokenBuckets
+from bot.utils.validation import validate_riot_id
+
+
+def make_message(user_id=1, chat_id=1, text='/profile Player#EU1'):
+    return Message(
+        message_id=1, date=datetime.now(), text=text,
+        chat=Chat(id=chat_id, type='private'),
+        from_user=User(id=user_id, is_bot=False, first_name='test'),
+    )
+
+
+def command(args):
+    return CommandObject(prefix='/', command='profile', args=args)
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    sent = []
+
+    async def answer(self, text, **kwargs):
+        sent.append(text)
+
+    monkeypatch.setattr(Message, 'answer', answer)
+    return sent
+
+
+@pytest.fixture
+def middleware():
+    return ThrottlingMiddleware(
+        user=TokenBuckets(per_minute=1, burst=2),
+        chat=TokenBuckets(per_minute=10, burst=10),
+        global_=TokenBuckets(per_minute=60, burst=20),
+        validate=validate_riot_id,
+    )
+
+
+def call(middleware, message, args):
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event)
+        return 'ok'
+
+    result = asyncio.run(middleware(handler, message, {'command': command(args)}))
+    return result, handled
+
+
+def test_token_buckets_refill():
+    buckets = TokenBuckets(per_minute=60, burst=2)
+    buckets.consume('k', now=0)
+    buckets.consume('k', now=0)
+    assert buckets.wait_time('k', now=0) == pytest.approx(1.0)
+    assert buckets.wait_time('k', now=0.5) == pytest.approx(0.5)
+    assert buckets.wait_time('k', now=1) == 0
+
+
+def test_invalid_args_pass_without_token(middleware, answers):
+    for args in (None, 'no-tag', 'ab#1'):
+        result, handled = call(middleware, make_message(), args)
+        assert result == 'ok' and len(handled) == 1
+    assert middleware.allowed == 0 and middleware.rejected == 0
+    assert len(middleware.user) == 0
+
+    # Весь бюджет остался для правильного запроса
+    for _ in range(2):
+        assert call(middleware, make_message(), 'Player#EU1')[0] == 'ok'
+    assert middleware.allowed == 2
+    assert answers == []
+
+
+def test_burst_rejected_with_single_warning(middleware, answers):
+    results = [call(middleware, make_message(), 'Player#EU1')[0] for _ in range(4)]
+
+    assert results == ['ok', 'ok', None, None]
+    assert middleware.metrics()['rejected'] == 2
+    assert len(answers) == 1 and answers[0].startswith('⏳')
+
+    # Другой пользователь в другом чате не задет чужим лимитом
+    assert call(middleware, make_message(user_id=2, chat_id=2), 'Player#EU1')[0] == 'ok'
+
+
+def test_without_validator_every_message_is_charged(answers):
+    middleware = ThrottlingMiddleware(user=TokenBuckets(per_minute=1, burst=1))
+
+    assert call(middleware, make_message(), None)[0] == 'ok'
+    assert call(middleware, make_message(), None)[0] is None
+    assert len(answers) == 1
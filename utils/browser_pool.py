@@ -0,0 +1,165 @@
+import asyncio
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional
+
+from decouple import config
+from jinja2 import Template
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_PATH = os.path.join(PROJECT_ROOT, 'templates', 'enhanced_profile_card.html')
+
+
+def build_chrome_options():
+    """Опции headless Chrome для скриншота карточки"""
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--window-size=1300,1000')  # Увеличиваем для 1200x900 карточки
+    chrome_options.add_argument('--hide-scrollbars')
+    chrome_options.add_argument('--disable-web-security')
+    chrome_options.add_argument('--force-device-scale-factor=1')
+    chrome_options.add_argument('--disable-extensions')
+
+    # Дополнительные опции для Docker
+    chrome_options.add_argument('--disable-features=VizDisplayCompositor')
+    # Порт выбирает Chrome: при нескольких воркерах фиксированный порт конфликтует
+    chrome_options.add_argument('--remote-debugging-port=0')
+    chrome_options.add_argument('--no-first-run')
+    chrome_options.add_argument('--disable-default-apps')
+
+    # Если в Docker, используем переменные окружения
+    if os.getenv('CHROME_OPTIONS'):
+        for option in os.getenv('CHROME_OPTIONS').split():
+            chrome_options.add_argument(option)
+    return chrome_options
+
+
+class BrowserPool:
+    """Пул прогретых headless Chrome для рендера карточек.
+
+    Браузер заранее открыт на "оболочке" шаблона - его head со стилями и
+    шрифтами без body, - так что рендер только подставляет body с данными.
+    checkout() запускается до того, как данные готовы: запуск Chrome и
+    загрузка шрифтов идут параллельно со сбором статистики. Браузер
+    переиспользуется max_uses раз, затем пересоздается.
+    """
+
+    def __init__(self, size: int = 2, max_uses: int = 50):
+        self.size = size
+        self.max_uses = max_uses
+        self._idle: List = []
+        self._uses: Dict[int, int] = {}
+        self._slots = asyncio.Semaphore(size)
+        self._shell_path: Optional[str] = None
+        self.launched = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def _shell(self) -> str:
+        if self._shell_path is None:
+            with open(TEMPLATE_PATH, 'r', encoding='utf-8') as f:
+                html = Template(f.read()).render()
+            shell = re.sub(r'<body\b.*</body>', '<body></body>', html, flags=re.S)
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as f:
+                f.write(shell)
+                self._shell_path = f.name
+        return self._shell_path
+
+    def _launch(self):
+        """Блокирующая часть: запуск Chrome и переход на оболочку шаблона"""
+        from selenium import webdriver
+
+        driver = webdriver.Chrome(options=build_chrome_options())
+        try:
+            driver.set_window_size(1300, 1000)
+            driver.get(f'file://{self._shell().replace(os.sep, "/")}')
+        except Exception:
+            driver.quit()
+            raise
+        self.launched += 1
+        return driver
+
+    def _quit(self, driver):
+        self._uses.pop(id(driver), None)
+        self.discarded += 1
+        # quit блокирует до завершения Chrome - не держим им event loop
+        asyncio.get_running_loop().run_in_executor(None, driver.quit)
+
+    def _quit_launched(self, launch: asyncio.Future):
+        if not launch.cancelled() and launch.exception() is None:
+            self._quit(launch.result())
+
+    async def acquire(self):
+        await self._slots.acquire()
+        try:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+            launch = asyncio.ensure_future(asyncio.to_thread(self._launch))
+            try:
+                return await asyncio.shield(launch)
+            except asyncio.CancelledError:
+                # Поток запуска не прервать - браузер закроется, когда стартует
+                launch.add_done_callback(self._quit_launched)
+                raise
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def checkout(self) -> asyncio.Task:
+        """Начать выдачу браузера в фоне; результат - драйвер для release()"""
+        return asyncio.ensure_future(self.acquire())
+
+    def release(self, driver, broken: bool = False):
+        """Вернуть браузер в пул; сломанный или отработавший max_uses закрывается"""
+        uses = self._uses.get(id(driver), 0) + 1
+        if broken or uses >= self.max_uses:
+            self._quit(driver)
+        else:
+            self._uses[id(driver)] = uses
+            self._idle.append(driver)
+        self._slots.release()
+
+    def abandon(self, checkout: asyncio.Task):
+        """Отказаться от выдачи, начатой checkout(), если драйвер так и не понадобился"""
+        if not checkout.done():
+            checkout.cancel()
+        elif not checkout.cancelled() and checkout.exception() is None:
+            self.release(checkout.result())
+
+    async def close(self):
+        drivers, self._idle = self._idle, []
+        for driver in drivers:
+            await asyncio.to_thread(driver.quit)
+        if self._shell_path and os.path.exists(self._shell_path):
+            os.unlink(self._shell_path)
+            self._shell_path = None
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            'size': self.size,
+            'idle': len(self._idle),
+            'launched': self.launched,
+            'reused': self.reused,
+            'discarded': self.discarded,
+        }
+
+
+_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """Общий для процесса пул браузеров"""
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool(
+            size=config('BROWSER_POOL_SIZE', default=2, cast=int),
+            max_uses=config('BROWSER_MAX_USES', default=50, cast=int),
+        )
+    return _pool
@@ -5,9 +5,11 @@ import tempfile
 from jinja2 import Template
 from html2image import Html2Image
 from PIL import Image, ImageOps
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Awaitable, Optional
 import asyncio
-from api.clients.trackerggapi import TrackerGGAPI
+from api.clients.deadline import Deadline, DeadlineExceeded
+from api.services.federation import fetch_profile_stats
+from utils.browser_pool import TEMPLATE_PATH, build_chrome_options, get_browser_pool
 
 def get_rank_image_path(rank_name, tier_level=None):
     rank_mapping = {
@@ -59,8 +61,91 @@ def sanitize_filename(name: str) -> str:
     name = name.replace(' ', '_')
     return re.sub(r'[<>:"/\\|?*\0]', '', name)
 
-async def generate_enhanced_profile_card_selenium(enhanced_stats: dict, riot_id: str, tagline: str, output_filename: str = None):
-    """Генерация карточки через selenium (рекомендуемый метод)"""
+
+def build_card_html(enhanced_stats: dict, riot_id: str, tagline: str) -> str:
+    """HTML карточки по шаблону enhanced_profile_card.html"""
+    with open(TEMPLATE_PATH, 'r', encoding='utf-8') as f:
+        template_content = f.read()
+
+    template = Template(template_content)
+    print("📄 HTML шаблон загружен")
+
+    # Подготавливаем данные для шаблона с безопасным извлечением
+    current_rank = enhanced_stats.get('current_rank') if enhanced_stats else None
+    peak_rank = enhanced_stats.get('peak_rank') if enhanced_stats else None
+    
+    rank_name, tier_level = parse_rank_info(current_rank)
+    peak_rank_name, peak_tier_level = parse_rank_info(peak_rank)
+    
+    # Отладочная информация
+    current_rank_image = get_rank_image_path(rank_name, tier_level)
+    peak_rank_image = get_rank_image_path(peak_rank_name, peak_tier_level)
+    
+    print(f"🔍 Current rank: {rank_name} (tier {tier_level}) -> {current_rank_image}")
+    print(f"🔍 Peak rank: {peak_rank_name} (tier {peak_tier_level}) -> {peak_rank_image}")
+    print(f"🔍 Files exist: current={os.path.exists(current_rank_image)}, peak={os.path.exists(peak_rank_image)}")
+    print(f"🔍 Player name: {riot_id}#{tagline}")
+    print(f"🔍 Stats: Matches={enhanced_stats.get('matches_played', 0)}, Win Rate={enhanced_stats.get('win_rate', '0%')}")
+    print(f"🔍 Combat: K/D={enhanced_stats.get('kd_ratio', 0.0)}, Kills={enhanced_stats.get('kills', 0)}")
+
+    # Формируем полные названия рангов с номерами
+    full_current_rank = f"{rank_name} {tier_level}" if tier_level and rank_name != "Unranked" else rank_name
+    full_peak_rank = f"{peak_rank_name} {peak_tier_level}" if peak_tier_level and peak_rank_name != "Unranked" else peak_rank_name
+    
+    template_data = {
+        'PLAYER_NAME': f"{riot_id}#{tagline}",  # Добавляем имя игрока
+        'RIOT_ID': riot_id,
+        'TAGLINE': tagline,
+        'REGION': enhanced_stats.get('region', 'N/A'),
+        'LEVEL': enhanced_stats.get('account_level', 'N/A'),
+        'CURRENT_RANK': full_current_rank,  # Теперь включает номер
+        'CURRENT_TIER_LEVEL': tier_level,
+        'CURRENT_RR': enhanced_stats.get('current_rr', 0),
+        'CURRENT_MMR': enhanced_stats.get('current_rr', 0),  # Добавляем для совместимости с шаблоном
+        'PEAK_RANK': full_peak_rank,  # Теперь включает номер
+        'PEAK_TIER_LEVEL': peak_tier_level,
+        'CURRENT_RANK_IMAGE': current_rank_image,  # Используем переменную
+        'PEAK_RANK_IMAGE': peak_rank_image,  # Используем переменную
+        'MATCHES': enhanced_stats.get('matches_played', 0),  # Исправлено имя поля
+        'WINS': enhanced_stats.get('matches_won', 0),  # Исправлено имя поля
+        'LOSSES': enhanced_stats.get('matches_lost', 0),  # Исправлено имя поля
+        'WIN_RATE': str(enhanced_stats.get('win_rate', '0%')).replace('%', ''),  # Убираем % для числового значения
+        'WINRATE': str(enhanced_stats.get('win_rate', '0%')).replace('%', ''),  # Добавляем для совместимости с шаблоном
+        'KILLS': enhanced_stats.get('kills', 0),
+        'DEATHS': enhanced_stats.get('deaths', 0),
+        'ASSISTS': enhanced_stats.get('assists', 0),
+        'KD': enhanced_stats.get('kd_ratio', 0.0),  # Исправлено имя поля
+        'DAMAGE_PER_ROUND': enhanced_stats.get('damage_per_round', 0),
+        'HEADSHOT_PCT': enhanced_stats.get('headshot_pct', 0),
+        'MVPS': enhanced_stats.get('mvps', 0),
+        'MATCH_MVPS': enhanced_stats.get('match_mvps', 0),
+        'TEAM_MVPS': enhanced_stats.get('team_mvps', 0),
+        'FAVORITE_AGENT': enhanced_stats.get('favorite_agent', 'Unknown'),
+        'FAVORITE_AGENT_ROLE': enhanced_stats.get('favorite_agent_role', 'Unknown'),
+        'AGENT_MATCHES': enhanced_stats.get('agent_matches', 0),
+        'TIME_PLAYED': enhanced_stats.get('time_played', '0h'),
+        'MATCHES_DURATION': enhanced_stats.get('matches_duration', 'N/A'),
+    }
+
+    return template.render(**template_data)
+
+
+# Потолок ожидания готовности страницы (шрифты, картинки); с дедлайном - не больше его остатка
+PAGE_READY_TIMEOUT = 8.0
+PAGE_READY_SCRIPT = (
+    "return document.readyState === 'complete'"
+    " && (!document.fonts || document.fonts.status === 'loaded')"
+    " && Array.from(document.images).every(img => img.complete);"
+)
+
+
+async def generate_enhanced_profile_card_selenium(enhanced_stats: dict, riot_id: str, tagline: str, output_filename: str = None,
+                                                  deadline: Optional[Deadline] = None):
+    """Генерация карточки через selenium (рекомендуемый метод).
+
+    С deadline загрузка и ожидание страницы ограничены остатком бюджета, а при
+    отмене корутины Chrome закрывается, не дожидаясь скриншота.
+    """
     try:
         print(f"🎯 Начинаем генерацию карточки для {riot_id}#{tagline}")
         
@@ -69,81 +154,20 @@ async def generate_enhanced_profile_card_selenium(enhanced_stats: dict, riot_id:
             print(f"❌ Неверные данные enhanced_stats: {enhanced_stats}")
             return None
             
+        if deadline is not None and deadline.expired:
+            print(f"⏱️ Нет времени на рендер карточки {riot_id}#{tagline}")
+            return None
+            
         print(f"✅ Enhanced stats валидны, ключей: {len(enhanced_stats.keys())}")
         print(f"🔍 Ключи данных: {list(enhanced_stats.keys())[:10]}...")  # Показываем первые 10
             
         from selenium import webdriver
-        from selenium.webdriver.chrome.options import Options
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
         
         print("🔧 Настройка selenium...")
         project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        template_path = os.path.join(project_root, 'templates', 'enhanced_profile_card.html')
-        
-        with open(template_path, 'r', encoding='utf-8') as f:
-            template_content = f.read()
-
-        template = Template(template_content)
-        print("📄 HTML шаблон загружен")
-
-        # Подготавливаем данные для шаблона с безопасным извлечением
-        current_rank = enhanced_stats.get('current_rank') if enhanced_stats else None
-        peak_rank = enhanced_stats.get('peak_rank') if enhanced_stats else None
-        
-        rank_name, tier_level = parse_rank_info(current_rank)
-        peak_rank_name, peak_tier_level = parse_rank_info(peak_rank)
-        
-        # Отладочная информация
-        current_rank_image = get_rank_image_path(rank_name, tier_level)
-        peak_rank_image = get_rank_image_path(peak_rank_name, peak_tier_level)
-        
-        print(f"🔍 Current rank: {rank_name} (tier {tier_level}) -> {current_rank_image}")
-        print(f"🔍 Peak rank: {peak_rank_name} (tier {peak_tier_level}) -> {peak_rank_image}")
-        print(f"🔍 Files exist: current={os.path.exists(current_rank_image)}, peak={os.path.exists(peak_rank_image)}")
-        print(f"🔍 Player name: {riot_id}#{tagline}")
-        print(f"🔍 Stats: Matches={enhanced_stats.get('matches_played', 0)}, Win Rate={enhanced_stats.get('win_rate', '0%')}")
-        print(f"🔍 Combat: K/D={enhanced_stats.get('kd_ratio', 0.0)}, Kills={enhanced_stats.get('kills', 0)}")
-
-        # Формируем полные названия рангов с номерами
-        full_current_rank = f"{rank_name} {tier_level}" if tier_level and rank_name != "Unranked" else rank_name
-        full_peak_rank = f"{peak_rank_name} {peak_tier_level}" if peak_tier_level and peak_rank_name != "Unranked" else peak_rank_name
-        
-        template_data = {
-            'PLAYER_NAME': f"{riot_id}#{tagline}",  # Добавляем имя игрока
-            'RIOT_ID': riot_id,
-            'TAGLINE': tagline,
-            'REGION': enhanced_stats.get('region', 'N/A'),
-            'LEVEL': enhanced_stats.get('account_level', 'N/A'),
-            'CURRENT_RANK': full_current_rank,  # Теперь включает номер
-            'CURRENT_TIER_LEVEL': tier_level,
-            'CURRENT_RR': enhanced_stats.get('current_rr', 0),
-            'CURRENT_MMR': enhanced_stats.get('current_rr', 0),  # Добавляем для совместимости с шаблоном
-            'PEAK_RANK': full_peak_rank,  # Теперь включает номер
-            'PEAK_TIER_LEVEL': peak_tier_level,
-            'CURRENT_RANK_IMAGE': current_rank_image,  # Используем переменную
-            'PEAK_RANK_IMAGE': peak_rank_image,  # Используем переменную
-            'MATCHES': enhanced_stats.get('matches_played', 0),  # Исправлено имя поля
-            'WINS': enhanced_stats.get('matches_won', 0),  # Исправлено имя поля
-            'LOSSES': enhanced_stats.get('matches_lost', 0),  # Исправлено имя поля
-            'WIN_RATE': enhanced_stats.get('win_rate', '0%').replace('%', ''),  # Убираем % для числового значения
-            'WINRATE': enhanced_stats.get('win_rate', '0%').replace('%', ''),  # Добавляем для совместимости с шаблоном
-            'KILLS': enhanced_stats.get('kills', 0),
-            'DEATHS': enhanced_stats.get('deaths', 0),
-            'ASSISTS': enhanced_stats.get('assists', 0),
-            'KD': enhanced_stats.get('kd_ratio', 0.0),  # Исправлено имя поля
-            'DAMAGE_PER_ROUND': enhanced_stats.get('damage_per_round', 0),
-            'HEADSHOT_PCT': enhanced_stats.get('headshot_pct', 0),
-            'MVPS': enhanced_stats.get('mvps', 0),
-            'MATCH_MVPS': enhanced_stats.get('match_mvps', 0),
-            'TEAM_MVPS': enhanced_stats.get('team_mvps', 0),
-            'FAVORITE_AGENT': enhanced_stats.get('favorite_agent', 'Unknown'),
-            'FAVORITE_AGENT_ROLE': enhanced_stats.get('favorite_agent_role', 'Unknown'),
-            'AGENT_MATCHES': enhanced_stats.get('agent_matches', 0),
-            'TIME_PLAYED': enhanced_stats.get('time_played', '0h'),
-            'MATCHES_DURATION': enhanced_stats.get('matches_duration', 'N/A'),
-        }
-
-        # Рендерим HTML
-        rendered_html = template.render(**template_data)
+        rendered_html = build_card_html(enhanced_stats, riot_id, tagline)
         
         # Генерируем имя файла
         if not output_filename:
@@ -151,70 +175,78 @@ async def generate_enhanced_profile_card_selenium(enhanced_stats: dict, riot_id:
             output_filename = f"{safe_name}_enhanced.png"
         
         # Настройки Chrome для selenium
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1300,1000')  # Увеличиваем для 1200x900 карточки
-        chrome_options.add_argument('--hide-scrollbars')
-        chrome_options.add_argument('--disable-web-security')
-        chrome_options.add_argument('--force-device-scale-factor=1')
-        chrome_options.add_argument('--disable-extensions')
-        
-        # Дополнительные опции для Docker
-        chrome_options.add_argument('--disable-features=VizDisplayCompositor')
-        chrome_options.add_argument('--remote-debugging-port=9222')
-        chrome_options.add_argument('--no-first-run')
-        chrome_options.add_argument('--disable-default-apps')
-        
-        # Если в Docker, используем переменные окружения
-        if os.getenv('CHROME_OPTIONS'):
-            for option in os.getenv('CHROME_OPTIONS').split():
-                chrome_options.add_argument(option)
+        chrome_options = build_chrome_options()
         
         # Создаем временный HTML файл
         with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as f:
             f.write(rendered_html)
             temp_html_path = f.name
         
-        try:
-            # Запускаем Chrome
-            driver = webdriver.Chrome(options=chrome_options)
-            driver.set_window_size(1300, 1000)  # Увеличиваем для 1200x900 карточки
+        browser = {}
+        
+        def stage_timeout(cap: float) -> float:
+            if deadline is None:
+                return cap
+            timeout = deadline.timeout(cap)
+            if timeout <= 0:
+                raise DeadlineExceeded("Нет времени на рендер карточки")
+            return timeout
+        
+        def render_card() -> str:
+            """Блокирующая часть: Chrome, загрузка страницы, скриншот"""
+            try:
+                # Запускаем Chrome
+                driver = webdriver.Chrome(options=chrome_options)
+                browser['driver'] = driver
+                driver.set_window_size(1300, 1000)  # Увеличиваем для 1200x900 карточки
+                driver.set_page_load_timeout(stage_timeout(30.0))
             
-            # Загружаем HTML файл
-            driver.get(f'file://{temp_html_path.replace(os.sep, "/")}')
+                # Загружаем HTML файл
+                driver.get(f'file://{temp_html_path.replace(os.sep, "/")}')
             
-            # Ждем загрузки
-            driver.implicitly_wait(5)
-            time.sleep(3)
+                # Ждем готовности страницы вместо фиксированной паузы
+                try:
+                    WebDriverWait(driver, stage_timeout(PAGE_READY_TIMEOUT), poll_frequency=0.1).until(
+                        lambda d: d.execute_script(PAGE_READY_SCRIPT)
+                    )
+                except TimeoutException:
+                    print("⚠️ Selenium: страница не догрузилась, снимаем как есть")
             
-            # Находим элемент карточки и делаем скриншот только его
-            try:
-                card_element = driver.find_element("css selector", ".card")
-                screenshot = card_element.screenshot_as_png
-                print(f"✅ Selenium: карточка {riot_id}#{tagline}")
-            except Exception as e:
-                print(f"⚠️ Selenium: не удалось найти элемент .card: {e}")
-                screenshot = driver.get_screenshot_as_png()
-                print("✅ Selenium: скриншот всей страницы")
+                # Находим элемент карточки и делаем скриншот только его
+                try:
+                    card_element = driver.find_element("css selector", ".card")
+                    screenshot = card_element.screenshot_as_png
+                    print(f"✅ Selenium: карточка {riot_id}#{tagline}")
+                except Exception as e:
+                    print(f"⚠️ Selenium: не удалось найти элемент .card: {e}")
+                    screenshot = driver.get_screenshot_as_png()
+                    print("✅ Selenium: скриншот всей страницы")
             
-            # Сохраняем изображение
-            output_path = os.path.join(project_root, output_filename)
+                # Сохраняем изображение
+                output_path = os.path.join(project_root, output_filename)
             
-            with open(output_path, 'wb') as f:
-                f.write(screenshot)
+                with open(output_path, 'wb') as f:
+                    f.write(screenshot)
             
-            print(f"✅ Selenium карточка создана: {output_path}")
-            return output_path
+                print(f"✅ Selenium карточка создана: {output_path}")
+                return output_path
             
-        finally:
-            if 'driver' in locals():
-                driver.quit()
-            # Удаляем временный файл
-            if os.path.exists(temp_html_path):
-                os.unlink(temp_html_path)
+            finally:
+                if 'driver' in locals():
+                    driver.quit()
+                # Удаляем временный файл
+                if os.path.exists(temp_html_path):
+                    os.unlink(temp_html_path)
+
+        # Selenium блокирует поток - выполняем его вне event loop, чтобы воркеры очереди работали параллельно
+        try:
+            return await asyncio.to_thread(render_card)
+        except asyncio.CancelledError:
+            # Поток не прервать, но закрытый браузер завершит его на ближайшем вызове
+            driver = browser.get('driver')
+            if driver is not None:
+                asyncio.get_running_loop().run_in_executor(None, driver.quit)
+            raise
                 
     except ImportError:
         print("❌ selenium не установлен. Используйте: pip install selenium")
@@ -223,23 +255,91 @@ async def generate_enhanced_profile_card_selenium(enhanced_stats: dict, riot_id:
         print(f"❌ Ошибка selenium: {e}")
         return None
 
-async def generate_enhanced_profile_card(riot_id: str, tagline: str, output_filename: str = None):
+INJECT_BODY_SCRIPT = (
+    "const doc = new DOMParser().parseFromString(arguments[0], 'text/html');"
+    "document.body.replaceWith(document.adoptNode(doc.body));"
+)
+
+
+def capture_card(driver, html: str, deadline: Optional[Deadline] = None) -> bytes:
+    """Блокирующая часть: подставить body карточки в прогретую страницу и снять скриншот"""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    timeout = PAGE_READY_TIMEOUT if deadline is None else deadline.timeout(PAGE_READY_TIMEOUT)
+    if timeout <= 0:
+        raise DeadlineExceeded("Нет времени на рендер карточки")
+
+    # Стили и шрифты уже загружены оболочкой, остается дождаться картинок рангов
+    driver.execute_script(INJECT_BODY_SCRIPT, html)
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.05).until(
+            lambda d: d.execute_script(PAGE_READY_SCRIPT)
+        )
+    except TimeoutException:
+        print("⚠️ Selenium: страница не догрузилась, снимаем как есть")
+    return driver.find_element("css selector", ".card").screenshot_as_png
+
+
+async def generate_profile_card_pipelined(stats_source: Awaitable[Optional[Dict]], riot_id: str, tagline: str,
+                                          deadline: Optional[Deadline] = None) -> Optional[bytes]:
+    """Карточка, рендер которой перекрывается со сбором статистики.
+
+    Браузер из пула берется сразу, пока stats_source еще ждет источники; когда
+    данные приходят, в уже открытую страницу подставляется body. Возвращает
+    PNG-байты или None, если данных нет или рендер не удался.
+    """
+    pool = get_browser_pool()
+    checkout = pool.checkout()
+    driver = None
+    broken = True
+    try:
+        stats = await stats_source
+        if not stats:
+            print(f"❌ Не удалось получить статистику для {riot_id}#{tagline}")
+            return None
+        html = build_card_html(stats, riot_id, tagline)
+
+        driver = await (checkout if deadline is None else deadline.run(checkout, stage='browser'))
+        image = await asyncio.to_thread(capture_card, driver, html, deadline)
+        broken = False
+        print(f"✅ Selenium: карточка {riot_id}#{tagline}")
+        return image
+    except ImportError:
+        print("❌ selenium не установлен. Используйте: pip install selenium")
+        return None
+    except asyncio.TimeoutError:
+        raise
+    except Exception as e:
+        print(f"❌ Ошибка selenium: {e}")
+        return None
+    finally:
+        if driver is None:
+            pool.abandon(checkout)
+        else:
+            # При отмене поток скриншота еще держит драйвер - закрытие браузера его прервет
+            pool.release(driver, broken)
+
+
+async def generate_enhanced_profile_card(riot_id: str, tagline: str, output_filename: str = None,
+                                         deadline: Optional[Deadline] = None):
     """
-    Генерация расширенной карточки профиля с данными из Tracker.gg
+    Генерация расширенной карточки профиля с данными из Henrik и Tracker.gg
     Сначала пытается использовать selenium, затем html2image как fallback
     
     Args:
         riot_id: Riot ID игрока
         tagline: Тег игрока 
         output_filename: Имя выходного файла (опционально)
+        deadline: Общий бюджет времени запроса (опционально)
     
     Returns:
         str: Путь к созданной карточке или None в случае ошибки
     """
     try:
         # Получаем расширенную статистику
-        api = TrackerGGAPI()
-        enhanced_stats = await api.get_enhanced_player_stats(riot_id, tagline)
+        # Источники опрашиваются параллельно, карточка строится из успевших ответить
+        enhanced_stats = await fetch_profile_stats(riot_id, tagline, deadline)
         
         if not enhanced_stats:
             print(f"❌ Не удалось получить статистику для {riot_id}#{tagline}")
@@ -250,7 +350,7 @@ async def generate_enhanced_profile_card(riot_id: str, tagline: str, output_file
         print(f"📊 Данные enhanced_stats получены: {bool(enhanced_stats)}")
         
         selenium_result = await generate_enhanced_profile_card_selenium(
-            enhanced_stats, riot_id, tagline, output_filename
+            enhanced_stats, riot_id, tagline, output_filename, deadline=deadline
         )
         
         if selenium_result:
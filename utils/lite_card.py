@@ -0,0 +1,63 @@
+import io
+import os
+from typing import Dict
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.card_generator import get_rank_image_path, parse_rank_info
+
+WIDTH, HEIGHT = 1000, 520
+BACKGROUND = (15, 25, 35)
+ACCENT = (255, 70, 85)
+TEXT = (236, 232, 225)
+MUTED = (140, 150, 160)
+
+
+def _font(size: int):
+    return ImageFont.load_default(size=size)
+
+
+def render_lite_card(stats: Dict, riot_id: str, tagline: str) -> bytes:
+    """Упрощенная карточка средствами PIL: без браузера, десятки миллисекунд.
+
+    Используется, когда очередь полного рендера перегружена.
+    """
+    image = Image.new('RGB', (WIDTH, HEIGHT), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, WIDTH, 8), fill=ACCENT)
+
+    draw.text((40, 40), f"{riot_id}#{tagline}", font=_font(48), fill=TEXT)
+    subtitle = f"Region: {str(stats.get('region') or 'N/A').upper()}    Level: {stats.get('account_level') or 'N/A'}"
+    draw.text((40, 105), subtitle, font=_font(24), fill=MUTED)
+
+    rank_name, tier_level = parse_rank_info(stats.get('current_rank'))
+    rank_image_path = get_rank_image_path(rank_name, tier_level)
+    if os.path.exists(rank_image_path):
+        with Image.open(rank_image_path) as rank_image:
+            rank_image = rank_image.convert('RGBA')
+            rank_image.thumbnail((150, 150))
+            image.paste(rank_image, (WIDTH - 40 - rank_image.width, 40), rank_image)
+    rank_label = f"{rank_name} {tier_level}" if rank_name != "Unranked" else rank_name
+    draw.text((WIDTH - 230, 200), rank_label, font=_font(26), fill=TEXT)
+    if stats.get('current_rr') not in (None, ''):
+        draw.text((WIDTH - 230, 235), f"{stats.get('current_rr')} RR", font=_font(22), fill=MUTED)
+
+    cells = (
+        ('Matches', stats.get('matches_played')),
+        ('Win Rate', stats.get('win_rate')),
+        ('K/D', stats.get('kd_ratio')),
+        ('ADR', stats.get('damage_per_round')),
+        ('Headshot %', stats.get('headshot_pct')),
+        ('Peak Rank', stats.get('peak_rank')),
+        ('Agent', stats.get('favorite_agent')),
+        ('Kills', stats.get('kills')),
+    )
+    for index, (label, value) in enumerate(cells):
+        x = 40 + (index % 4) * 230
+        y = 300 + (index // 4) * 100
+        draw.text((x, y), label, font=_font(20), fill=MUTED)
+        draw.text((x, y + 28), str(value if value not in (None, '') else '-'), font=_font(32), fill=TEXT)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=False)
+    return buffer.getvalue()